@@ -0,0 +1,146 @@
+"""
+Compares CPU time and wire size of the available compression codecs on
+representative envelopes.
+
+Usage:
+
+    python scripts/benchmark_compression.py [--iterations N]
+
+zstd and brotli are only benchmarked if `zstandard` and `brotli` are
+installed.
+"""
+
+import argparse
+import random
+import time
+import uuid
+
+from sentry_sdk.compression import available_codecs, get_codec
+from sentry_sdk.envelope import Envelope
+
+LEVELS = {
+    "gzip": (1, 6, 9),
+    "deflate": (1, 6, 9),
+    "zstd": (1, 3, 10),
+    "br": (1, 4, 11),
+}
+
+
+def make_error_envelope():
+    frames = [
+        {
+            "filename": "app/module_%d.py" % i,
+            "function": "handler_%d" % i,
+            "lineno": i * 10,
+            "context_line": "    result = do_something(arg_%d)" % i,
+            "vars": {"arg_%d" % i: "x" * 50, "count": i, "items": list(range(10))},
+        }
+        for i in range(30)
+    ]
+    envelope = Envelope(headers={"event_id": uuid.uuid4().hex})
+    envelope.add_event(
+        {
+            "event_id": uuid.uuid4().hex,
+            "level": "error",
+            "exception": {
+                "values": [{"type": "ValueError", "stacktrace": {"frames": frames}}]
+            },
+            "breadcrumbs": {
+                "values": [
+                    {"category": "query", "message": "SELECT * FROM t WHERE id = %s"}
+                ]
+                * 100
+            },
+        }
+    )
+    return envelope
+
+
+def make_transaction_envelope():
+    spans = [
+        {
+            "span_id": uuid.uuid4().hex[:16],
+            "op": random.choice(["db", "http.client", "cache.get"]),
+            "description": "SELECT * FROM table_%d WHERE id = %%s" % i,
+            "start_timestamp": 1700000000.0 + i,
+            "timestamp": 1700000000.5 + i,
+        }
+        for i in range(500)
+    ]
+    envelope = Envelope(headers={"event_id": uuid.uuid4().hex})
+    envelope.add_transaction({"type": "transaction", "spans": spans})
+    return envelope
+
+
+def make_profile_envelope():
+    envelope = Envelope(headers={"event_id": uuid.uuid4().hex})
+    envelope.add_profile(
+        {
+            "profile": {
+                "samples": [
+                    {
+                        "elapsed_since_start_ns": i * 10000,
+                        "stack_id": i % 50,
+                        "thread_id": "1",
+                    }
+                    for i in range(5000)
+                ],
+                "stacks": [list(range(i, i + 20)) for i in range(50)],
+                "frames": [
+                    {"function": "f_%d" % i, "module": "app.m_%d" % (i % 10)}
+                    for i in range(100)
+                ],
+            }
+        }
+    )
+    return envelope
+
+
+def make_session_envelope():
+    envelope = Envelope()
+    envelope.add_session({"sid": uuid.uuid4().hex, "status": "ok", "init": True})
+    return envelope
+
+
+ENVELOPES = [
+    ("error", make_error_envelope),
+    ("transaction", make_transaction_envelope),
+    ("profile", make_profile_envelope),
+    ("session", make_session_envelope),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    print(
+        "%-12s %-8s %5s %10s %10s %7s %12s"
+        % ("envelope", "codec", "level", "raw", "wire", "ratio", "cpu/iter")
+    )
+    for envelope_name, make_envelope in ENVELOPES:
+        data = make_envelope().serialize()
+        for codec_name in available_codecs():
+            codec = get_codec(codec_name)
+            for level in LEVELS.get(codec_name, (codec.default_level,)):
+                start = time.process_time()
+                for _ in range(args.iterations):
+                    compressed = codec.compress(data, level)
+                elapsed = (time.process_time() - start) / args.iterations
+                print(
+                    "%-12s %-8s %5d %10d %10d %6.1f%% %10.3fms"
+                    % (
+                        envelope_name,
+                        codec_name,
+                        level,
+                        len(data),
+                        len(compressed),
+                        100.0 * len(compressed) / len(data),
+                        elapsed * 1000,
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main()
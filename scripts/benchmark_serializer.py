@@ -0,0 +1,149 @@
+"""
+Measures how fast the serializer classifies and serializes the nodes of a
+deeply nested exception event, comparing the path states against the path
+inspection the serializer used before them.
+
+Usage:
+
+    python scripts/benchmark_serializer.py [--iterations N]
+"""
+
+import argparse
+import time
+
+from sentry_sdk.serializer import _ROOT_PATH_STATE, serialize
+
+
+def make_deep_exception_event():
+    frames = [
+        {
+            "function": "f%s" % i,
+            "vars": {"a": i, "b": [1, 2, {"c": "d"}], "e": {"f": {"g": "h"}}},
+        }
+        for i in range(30)
+    ]
+    return {
+        "exception": {"values": [{"stacktrace": {"frames": frames}}]},
+        "threads": {"values": [{"stacktrace": {"frames": frames}}]},
+        "stacktrace": {"frames": frames},
+        "breadcrumbs": {"values": [{"data": {"foo": [1, 2]}}] * 20},
+        "request": {"data": {"foo": {"bar": "baz"}}, "headers": {"a": "b"}},
+        "extra": {"foo": {"bar": [1, 2, 3]}},
+        "contexts": {"trace": {"op": "foo"}},
+    }
+
+
+def count_nodes(obj):
+    if isinstance(obj, dict):
+        return 1 + sum(count_nodes(v) for v in obj.values())
+    if isinstance(obj, list):
+        return 1 + sum(count_nodes(v) for v in obj)
+    return 1
+
+
+def should_repr_strings(path):
+    # path inspection as the serializer did it before path states
+    try:
+        p0 = path[0]
+        if p0 == "stacktrace" and path[1] == "frames" and path[3] == "vars":
+            return True
+
+        if (
+            p0 in ("threads", "exception")
+            and path[1] == "values"
+            and path[3] == "stacktrace"
+            and path[4] == "frames"
+            and path[6] == "vars"
+        ):
+            return True
+    except IndexError:
+        return None
+
+    return False
+
+
+def is_request_body(path):
+    try:
+        if path[0] == "request" and path[1] == "data":
+            return True
+    except IndexError:
+        return None
+
+    return False
+
+
+def is_databag(path):
+    try:
+        rv = should_repr_strings(path)
+        if rv in (True, None):
+            return rv
+
+        rv = is_request_body(path)
+        if rv in (True, None):
+            return rv
+
+        p0 = path[0]
+        if p0 == "breadcrumbs" and path[1] == "values":
+            path[2]
+            return True
+
+        if p0 == "extra":
+            return True
+
+    except IndexError:
+        return None
+
+    return False
+
+
+def walk_path_inspection(obj, path=None):
+    # every node inspects the whole path from the root, which the
+    # serializer kept as a stack of segments
+    if path is None:
+        path = []
+    should_repr_strings(path), is_databag(path), is_request_body(path)
+    if isinstance(obj, dict):
+        items = obj.items()
+    elif isinstance(obj, list):
+        items = enumerate(obj)
+    else:
+        return
+    for k, v in items:
+        path.append(k)
+        walk_path_inspection(v, path)
+        path.pop()
+
+
+def walk_path_states(obj, state=_ROOT_PATH_STATE):
+    # every node only looks up its own segment, starting from its parent
+    state.should_repr_strings, state.is_databag, state.is_request_body
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            walk_path_states(v, state.next(k))
+    elif isinstance(obj, list):
+        for i, v in enumerate(obj):
+            walk_path_states(v, state.next(i))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    event = make_deep_exception_event()
+    nodes = count_nodes(event)
+
+    for name, run in (
+        ("path inspection", lambda: walk_path_inspection(event)),
+        ("path states", lambda: walk_path_states(event)),
+        ("serialize", lambda: serialize(event)),
+    ):
+        start = time.process_time()
+        for _ in range(args.iterations):
+            run()
+        elapsed = max(time.process_time() - start, 1e-9)
+        print("%-16s %10d nodes/sec" % (name, nodes * args.iterations / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""
+An HTTP transport for applications that run on an asyncio event loop.
+
+This module is Python 3 only and requires ``httpcore`` with asyncio support,
+which can be installed with ``pip install sentry-sdk[asyncio]``.
+"""
+
+import asyncio
+import ssl
+
+import certifi
+import urllib3
+
+from sentry_sdk.envelope import Envelope
+from sentry_sdk.transport import HttpTransport
+from sentry_sdk.utils import capture_internal_exceptions, logger
+from sentry_sdk._types import TYPE_CHECKING
+
+try:
+    import httpcore
+except ImportError:
+    httpcore = None  # type: ignore
+
+if TYPE_CHECKING:
+    from typing import Any
+    from typing import AsyncIterator
+    from typing import Awaitable
+    from typing import Callable
+    from typing import Dict
+    from typing import Iterable
+    from typing import Optional
+    from typing import Set
+    from typing import Tuple
+    from typing import Union
+
+    from sentry_sdk._types import Event, EndpointType
+    from sentry_sdk.transport import EnvelopeBody
+    from sentry_sdk.utils import Dsn
+
+
+async def _iter_async(
+    chunks,  # type: Iterable[bytes]
+):
+    # type: (...) -> AsyncIterator[bytes]
+    for chunk in chunks:
+        yield chunk
+
+
+class AsyncHttpTransport(HttpTransport):
+    """An HTTP transport that sends envelopes from the running event loop.
+
+    Envelopes are sent as tasks on the event loop with a non-blocking HTTP
+    client instead of going through a background thread.  Rate limits and
+    client reports are shared with :py:class:`HttpTransport`.  Anything
+    captured while no event loop is running (e.g. during interpreter
+    shutdown) falls back to the threaded behavior of the base class.
+
+    `flush` cannot block the event loop it is called from, so code running
+    on the loop should use ``await client.flush_async()`` instead.
+    """
+
+    def __init__(
+        self,
+        options,  # type: Dict[str, Any]
+    ):
+        # type: (...) -> None
+        if httpcore is None:
+            raise ImportError(
+                "AsyncHttpTransport requires httpcore. Please install `sentry-sdk[asyncio]`."
+            )
+
+        HttpTransport.__init__(self, options)
+        assert self.parsed_dsn is not None
+        self._loop = None  # type: Optional[asyncio.AbstractEventLoop]
+        self._tasks = set()  # type: Set[asyncio.Future[None]]
+        self._killed = False
+        self._queue_size = options["transport_queue_size"]
+        self._async_pool = self._make_async_pool(
+            self.parsed_dsn,
+            http_proxy=options["http_proxy"],
+            https_proxy=options["https_proxy"],
+            ca_certs=options["ca_certs"],
+            proxy_headers=options["proxy_headers"],
+        )
+
+    def _get_loop(self):
+        # type: () -> Optional[Tuple[asyncio.AbstractEventLoop, bool]]
+        """Returns the event loop to send on and whether we are currently
+        running inside of it, or `None` if there is no usable loop.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if loop is not None:
+            self._loop = loop
+            return loop, True
+
+        loop = self._loop
+        if loop is not None and loop.is_running() and not loop.is_closed():
+            return loop, False
+
+        return None
+
+    def _start_task(
+        self,
+        make_coroutine,  # type: Callable[[], Awaitable[None]]
+    ):
+        # type: (...) -> None
+        task = asyncio.ensure_future(make_coroutine())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _get_queue_load(self):
+        # type: () -> float
+        # envelopes go through the worker thread if there is no event loop
+        return max(
+            HttpTransport._get_queue_load(self),
+            min(1.0, float(len(self._tasks)) / max(1, self._queue_size)),
+        )
+
+    def _submit(
+        self,
+        make_coroutine,  # type: Callable[[], Awaitable[None]]
+    ):
+        # type: (...) -> Optional[bool]
+        """Schedules a coroutine on the event loop.
+
+        Returns `None` if there is no event loop to run on, otherwise whether
+        the coroutine was accepted.
+        """
+        loop_info = self._get_loop()
+        if loop_info is None or self._killed:
+            return None
+
+        if len(self._tasks) >= self._queue_size:
+            return False
+
+        loop, in_loop = loop_info
+        if in_loop:
+            self._start_task(make_coroutine)
+        else:
+            loop.call_soon_threadsafe(self._start_task, make_coroutine)
+        return True
+
+    async def _send_request_async(
+        self,
+        body,  # type: Union[bytes, EnvelopeBody]
+        headers,  # type: Dict[str, str]
+        endpoint_type="store",  # type: EndpointType
+        envelope=None,  # type: Optional[Envelope]
+    ):
+        # type: (...) -> None
+        try:
+            response = await self._async_pool.request(
+                "POST",
+                str(self._auth.get_api_url(endpoint_type)),
+                content=body if isinstance(body, bytes) else _iter_async(body),
+                headers=self._get_request_headers(headers),
+            )
+        except Exception:
+            self._handle_request_error(envelope)
+            raise
+
+        # Wrap the response so that rate limit and status handling is shared
+        # with the threaded transport.
+        self._handle_response(
+            urllib3.HTTPResponse(
+                body=response.content,
+                headers=dict(
+                    (key.decode("latin-1"), value.decode("latin-1"))
+                    for key, value in response.headers
+                ),
+                status=response.status,
+                preload_content=False,
+            ),
+            envelope,
+        )
+
+    async def _send_event_async(
+        self,
+        event,  # type: Event
+    ):
+        # type: (...) -> None
+        with capture_internal_exceptions():
+            request = self._serialize_event(event)
+            if request is not None:
+                body, headers = request
+                await self._send_request_async(body, headers=headers)
+            self._flush_client_reports()
+
+    async def _send_envelope_async(
+        self,
+        envelope,  # type: Envelope
+    ):
+        # type: (...) -> None
+        with capture_internal_exceptions():
+            parts = self._prepare_envelopes(envelope)
+            sent = 0
+            try:
+                for part in parts:
+                    body, headers = self._serialize_envelope(part)
+                    sent += 1
+                    await self._send_request_async(
+                        body,
+                        headers=headers,
+                        endpoint_type="envelope",
+                        envelope=part,
+                    )
+            except Exception:
+                self._handle_unsent_envelopes(parts[sent:])
+                raise
+            self._flush_client_reports()
+
+    def capture_event(
+        self,
+        event,  # type: Event
+    ):
+        # type: (...) -> None
+        submitted = self._submit(lambda: self._send_event_async(event))
+        if submitted is None:
+            HttpTransport.capture_event(self, event)
+        elif not submitted:
+            self.on_dropped_event("full_queue")
+            self.record_lost_event("queue_overflow", data_category="error")
+
+    def capture_envelope(
+        self,
+        envelope,  # type: Envelope
+    ):
+        # type: (...) -> None
+        submitted = self._submit(lambda: self._send_envelope_async(envelope))
+        if submitted is None:
+            HttpTransport.capture_envelope(self, envelope)
+        elif not submitted:
+            self._on_queue_overflow(envelope)
+
+    async def _flush_async(
+        self,
+        timeout,  # type: float
+        callback=None,  # type: Optional[Any]
+    ):
+        # type: (...) -> None
+        self._flush_client_reports(force=True)
+
+        pending = set(self._tasks)
+        pending.discard(asyncio.current_task())
+        if not pending:
+            return
+
+        initial_timeout = min(0.1, timeout)
+        _, pending = await asyncio.wait(pending, timeout=initial_timeout)
+        if pending:
+            logger.debug("%d event(s) pending on flush", len(pending))
+            if callback is not None:
+                callback(len(pending), timeout)
+
+            _, pending = await asyncio.wait(pending, timeout=timeout - initial_timeout)
+            if pending:
+                logger.error("flush timed out, dropped %s events", len(pending))
+
+    async def flush_async(
+        self,
+        timeout,  # type: float
+        callback=None,  # type: Optional[Any]
+    ):
+        # type: (...) -> None
+        """Waits for the envelopes captured so far to be sent without
+        blocking the event loop.  This is what `Client.flush_async` uses.
+        """
+        if self._worker.is_alive:
+            # something was captured without a running event loop
+            await asyncio.get_running_loop().run_in_executor(
+                None, HttpTransport.flush, self, timeout, callback
+            )
+
+        if timeout > 0:
+            logger.debug("Flushing HTTP transport")
+            await self._flush_async(timeout, callback)
+
+    def flush(
+        self,
+        timeout,  # type: float
+        callback=None,  # type: Optional[Any]
+    ):
+        # type: (...) -> None
+        if self._worker.is_alive:
+            # something was captured without a running event loop
+            HttpTransport.flush(self, timeout, callback)
+
+        loop_info = self._get_loop()
+        if loop_info is None or timeout <= 0:
+            return
+
+        loop, in_loop = loop_info
+        if in_loop:
+            # Waiting here would block the very loop the envelopes are sent
+            # on.  They are still sent, and `kill` lets them finish.
+            logger.debug(
+                "Cannot flush from within the event loop, use `await client.flush_async()`"
+            )
+            return
+
+        logger.debug("Flushing HTTP transport")
+        future = asyncio.run_coroutine_threadsafe(
+            self._flush_async(timeout, callback), loop
+        )
+        try:
+            future.result(timeout)
+        except Exception:
+            logger.debug("flush on event loop did not finish", exc_info=True)
+
+    async def _close_async(self):
+        # type: () -> None
+        pending = set(self._tasks)
+        pending.discard(asyncio.current_task())
+        if pending:
+            await asyncio.wait(pending)
+        await self._async_pool.aclose()
+
+    def kill(self):
+        # type: () -> None
+        HttpTransport.kill(self)
+
+        # Envelopes captured from now on go through the worker thread.  The
+        # ones still being sent on the event loop are not cancelled, the
+        # connections are only closed once they are done.
+        self._killed = True
+        loop_info = self._get_loop()
+        if loop_info is not None:
+            loop, in_loop = loop_info
+            if in_loop:
+                self._start_task(self._close_async)
+            else:
+                loop.call_soon_threadsafe(self._start_task, self._close_async)
+
+    def _make_async_pool(
+        self,
+        parsed_dsn,  # type: Dsn
+        http_proxy,  # type: Optional[str]
+        https_proxy,  # type: Optional[str]
+        ca_certs,  # type: Optional[Any]
+        proxy_headers,  # type: Optional[Dict[str, str]]
+    ):
+        # type: (...) -> Any
+        opts = {
+            "ssl_context": ssl.create_default_context(
+                cafile=ca_certs or certifi.where()
+            ),
+        }  # type: Dict[str, Any]
+
+        socket_options = self._get_pool_options(ca_certs).get("socket_options")
+        if socket_options is not None:
+            opts["socket_options"] = socket_options
+
+        proxy = self._get_proxy(parsed_dsn, http_proxy, https_proxy)
+        if proxy:
+            if proxy.startswith("socks"):
+                try:
+                    # Check if the socksio dependency is available
+                    import socksio  # type: ignore  # noqa: F401
+                except ImportError:
+                    logger.warning(
+                        "You have configured a SOCKS proxy (%s) but support for SOCKS proxies is not installed. Disabling proxy support. Please add `httpcore[socks]` to your dependencies.",
+                        proxy,
+                    )
+                else:
+                    opts.pop("socket_options", None)
+                    return httpcore.AsyncSOCKSProxy(proxy, **opts)
+            else:
+                if proxy_headers:
+                    opts["proxy_headers"] = proxy_headers
+                return httpcore.AsyncHTTPProxy(proxy, **opts)
+
+        return httpcore.AsyncConnectionPool(**opts)
@@ -8,6 +8,11 @@ if TYPE_CHECKING:
     from typing import Optional, Union, Callable
 
 
+# Relay rejects attachments larger than this, so there is no point in
+# reading and sending them.
+MAX_ATTACHMENT_SIZE = 100 * 1024 * 1024
+
+
 class Attachment(object):
     def __init__(
         self,
@@ -34,7 +39,10 @@ class Attachment(object):
 
     def to_envelope_item(self):
         # type: () -> Item
-        """Returns an envelope item for this attachment."""
+        """Returns an envelope item for this attachment.  Attachments that
+        were added with a path are not read here, the file is streamed when
+        the envelope is sent.
+        """
         payload = None  # type: Union[None, PayloadRef, bytes]
         if self.bytes is not None:
             if callable(self.bytes):
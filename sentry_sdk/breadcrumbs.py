@@ -0,0 +1,213 @@
+from sentry_sdk._compat import iteritems, utc_from_timestamp
+from sentry_sdk.consts import DEFAULT_MAX_BREADCRUMBS
+from sentry_sdk.utils import capture_internal_exceptions
+from sentry_sdk._types import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from typing import Any
+    from typing import Callable
+    from typing import Iterable
+    from typing import Iterator
+    from typing import List
+    from typing import Optional
+    from typing import Tuple
+    from typing import Union
+
+    from sentry_sdk._types import Breadcrumb
+
+    # The time a breadcrumb was added, if it still has to be completed when
+    # it is read, and the breadcrumb.
+    BreadcrumbRecord = Tuple[Optional[float], Breadcrumb]
+
+
+class DeferredValue(object):
+    """A breadcrumb value that is only computed by calling `func(*args)`
+    when the breadcrumb is read, for example a log message that still has
+    to be formatted.
+
+    Integrations have to make sure that the result does not change until
+    then, e.g. by only deferring work on immutable arguments, and that
+    `args` do not keep large objects such as frames alive.  `func` is
+    called every time the breadcrumb is read.
+    """
+
+    __slots__ = ("func", "args")
+
+    def __init__(
+        self,
+        func,  # type: Callable[..., Any]
+        *args  # type: Any
+    ):
+        # type: (...) -> None
+        self.func = func
+        self.args = args
+
+    def resolve(self):
+        # type: () -> Any
+        with capture_internal_exceptions():
+            return self.func(*self.args)
+        return None
+
+    def __repr__(self):
+        # type: () -> str
+        return "<%s %r>" % (self.__class__.__name__, self.func)
+
+
+def resolve_deferred_values(
+    crumb,  # type: Breadcrumb
+):
+    # type: (...) -> None
+    """Replaces the `DeferredValue`s of a breadcrumb with their results."""
+    for key, value in iteritems(crumb):
+        if isinstance(value, DeferredValue):
+            crumb[key] = value.resolve()
+
+
+def _materialize(record):
+    # type: (BreadcrumbRecord) -> Breadcrumb
+    timestamp, crumb = record
+    if timestamp is None:
+        return crumb
+
+    # Copies of a scope share their breadcrumbs, so the breadcrumb is
+    # completed in a new dict that nobody else can be reading.
+    rv = {}  # type: Breadcrumb
+    for key, value in iteritems(crumb):
+        if isinstance(value, DeferredValue):
+            value = value.resolve()
+        rv[key] = value
+    if rv.get("timestamp") is None:
+        rv["timestamp"] = utc_from_timestamp(timestamp)
+    if rv.get("type") is None:
+        rv["type"] = "default"
+    return rv
+
+
+class BreadcrumbBuffer(object):
+    """Holds the latest `maxlen` breadcrumbs of a scope.
+
+    The breadcrumbs are kept in a ring buffer that is allocated once, so
+    adding a breadcrumb to a full buffer just replaces the oldest one.
+    Breadcrumbs that are added with the time they were added at are only
+    given their `timestamp` and `type`, and their `DeferredValue`s are only
+    computed, when they are read.  For most breadcrumbs that never happens.
+
+    The buffer is not thread safe, but using it from multiple threads at
+    once never raises.
+    """
+
+    __slots__ = ("_records", "_start", "_len", "maxlen")
+
+    def __init__(
+        self,
+        maxlen=DEFAULT_MAX_BREADCRUMBS,  # type: int
+    ):
+        # type: (...) -> None
+        self.maxlen = maxlen
+        self.clear()
+
+    def clear(self):
+        # type: () -> None
+        # allocated when the first breadcrumb is added
+        self._records = []  # type: List[Optional[BreadcrumbRecord]]
+        self._start = 0
+        self._len = 0
+
+    def __len__(self):
+        # type: () -> int
+        return self._len
+
+    def __bool__(self):
+        # type: () -> bool
+        return self._len > 0
+
+    __nonzero__ = __bool__
+
+    def _append_record(self, record):
+        # type: (BreadcrumbRecord) -> None
+        records = self._records
+        if not records:
+            if self.maxlen <= 0:
+                return
+            records = self._records = [None] * self.maxlen
+
+        capacity = len(records)
+        if self._len < capacity:
+            records[(self._start + self._len) % capacity] = record
+            self._len += 1
+        else:
+            records[self._start] = record
+            self._start = (self._start + 1) % capacity
+
+    def append(
+        self,
+        crumb,  # type: Breadcrumb
+        timestamp=None,  # type: Optional[float]
+    ):
+        # type: (...) -> None
+        """Adds a breadcrumb, replacing the oldest one if the buffer is full.
+
+        If `timestamp` is given, the breadcrumb is completed with that time
+        (in seconds since the epoch) and the default type, and its deferred
+        values are computed, once it is read.
+        The breadcrumb must not be changed by anybody else after that.
+        """
+        self._append_record((timestamp, crumb))
+
+    def extend(
+        self,
+        crumbs,  # type: Union[BreadcrumbBuffer, Iterable[Breadcrumb]]
+    ):
+        # type: (...) -> None
+        if isinstance(crumbs, BreadcrumbBuffer):
+            for record in crumbs._iter_records():
+                self._append_record(record)
+        else:
+            for crumb in crumbs:
+                self._append_record((None, crumb))
+
+    def resize(
+        self,
+        maxlen,  # type: int
+    ):
+        # type: (...) -> None
+        """Changes the size of the buffer, keeping the latest breadcrumbs."""
+        if maxlen == self.maxlen:
+            return
+        records = list(self._iter_records())
+        self.maxlen = maxlen
+        self.clear()
+        for record in records[-maxlen:] if maxlen > 0 else ():
+            self._append_record(record)
+
+    def _iter_records(self):
+        # type: () -> Iterator[BreadcrumbRecord]
+        records = self._records
+        start = self._start
+        capacity = len(records)
+        for i in range(min(self._len, capacity)):
+            record = records[(start + i) % capacity]
+            if record is not None:
+                yield record
+
+    def __iter__(self):
+        # type: () -> Iterator[Breadcrumb]
+        for record in self._iter_records():
+            yield _materialize(record)
+
+    def __copy__(self):
+        # type: () -> BreadcrumbBuffer
+        rv = object.__new__(self.__class__)  # type: BreadcrumbBuffer
+        rv.maxlen = self.maxlen
+        rv._records = list(self._records)
+        rv._start = self._start
+        rv._len = self._len
+        return rv
+
+    def __repr__(self):
+        # type: () -> str
+        return "<%s len=%s maxlen=%s>" % (
+            self.__class__.__name__,
+            self._len,
+            self.maxlen,
+        )
@@ -28,8 +28,14 @@ from sentry_sdk.utils import (
     handle_in_app,
     is_gevent,
     logger,
+    set_json_backend,
+    _get_installed_modules,
+)
+from sentry_sdk.serializer import (
+    encode_static_fragments,
+    serialize,
+    serialize_to_json,
 )
-from sentry_sdk.serializer import serialize
 from sentry_sdk.tracing import trace, has_tracing_enabled
 from sentry_sdk.transport import HttpTransport, make_transport
 from sentry_sdk.consts import (
@@ -43,6 +49,7 @@ from sentry_sdk.integrations import _DEFAULT_INTEGRATIONS, setup_integrations
 from sentry_sdk.utils import ContextVar
 from sentry_sdk.sessions import SessionFlusher
 from sentry_sdk.envelope import Envelope
+from sentry_sdk.attachments import MAX_ATTACHMENT_SIZE
 from sentry_sdk.profiler import has_profiling_enabled, Profile, setup_profiler
 from sentry_sdk.scrubber import EventScrubber
 from sentry_sdk.monitor import Monitor
@@ -52,16 +59,18 @@ from sentry_sdk._types import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from typing import Any
+    from typing import Awaitable
     from typing import Callable
     from typing import Dict
     from typing import Optional
     from typing import Sequence
+    from typing import Tuple
     from typing import Type
     from typing import Union
 
     from sentry_sdk.integrations import Integration
     from sentry_sdk.scope import Scope
-    from sentry_sdk._types import Event, Hint
+    from sentry_sdk._types import Event, EventDataCategory, Hint
     from sentry_sdk.session import Session
 
 
@@ -258,6 +267,7 @@ class _Client(object):
         try:
             _client_init_debug.set(self.options["debug"])
             self.transport = make_transport(self.options)
+            self._static_fragments = None  # type: Optional[Dict[str, Tuple[Any, str]]]
 
             self.monitor = None
             if self.transport:
@@ -268,6 +278,8 @@ class _Client(object):
 
             self.metrics_aggregator = None  # type: Optional[MetricsAggregator]
             experiments = self.options.get("_experiments", {})
+            set_json_backend(experiments.get("json_backend"))
+
             if experiments.get("enable_metrics", True):
                 # Context vars are not working correctly on Python <=3.6
                 # with gevent.
@@ -346,13 +358,49 @@ class _Client(object):
         """Returns the configured DSN as string."""
         return self.options["dsn"]
 
+    def _get_sdk_info(self):
+        # type: () -> Dict[str, Any]
+        sdk_info = dict(SDK_INFO)
+        sdk_info["integrations"] = sorted(self.integrations.keys())
+        return sdk_info
+
+    def _get_static_fragments(self):
+        # type: () -> Dict[str, Tuple[Any, str]]
+        """Returns the encoded values that `_prepare_event` (and the modules
+        integration) put into every event, so that they don't have to be
+        serialized again for each one.
+        """
+        if self._static_fragments is None:
+            fragments = {
+                "sdk": self._get_sdk_info(),
+                "platform": "python",
+            }  # type: Dict[str, Any]
+            for key in "release", "environment", "server_name", "dist":
+                if self.options[key] is not None:
+                    fragments[key] = text_type(self.options[key]).strip()
+            if "modules" in self.integrations:
+                fragments["modules"] = _get_installed_modules()
+
+            self._static_fragments = encode_static_fragments(
+                fragments,
+                max_request_body_size=self.options.get("max_request_body_size"),
+                max_value_length=self.options.get("max_value_length"),
+            )
+
+        return self._static_fragments
+
     def _prepare_event(
         self,
         event,  # type: Event
         hint,  # type: Hint
         scope,  # type: Optional[Scope]
+        serialize=True,  # type: bool
     ):
         # type: (...) -> Optional[Event]
+        """Applies the scope and the client options to the event.  Unless
+        `serialize` is `False` the event is serialized and run through the
+        `before_send` hooks, see `_serialize_event`.
+        """
 
         if event.get("timestamp") is None:
             event["timestamp"] = datetime_utcnow()
@@ -400,9 +448,7 @@ class _Client(object):
             if event.get(key) is None and self.options[key] is not None:
                 event[key] = text_type(self.options[key]).strip()  # type: ignore[literal-required]
         if event.get("sdk") is None:
-            sdk_info = dict(SDK_INFO)
-            sdk_info["integrations"] = sorted(self.integrations.keys())
-            event["sdk"] = sdk_info
+            event["sdk"] = self._get_sdk_info()
 
         if event.get("platform") is None:
             event["platform"] = "python"
@@ -419,14 +465,34 @@ class _Client(object):
             if event_scrubber and not self.options["send_default_pii"]:
                 event_scrubber.scrub_event(event)
 
+        if event is None or not serialize:
+            return event
+
+        return self._serialize_event(event, hint)
+
+    def _has_before_send(
+        self,
+        event,  # type: Event
+    ):
+        # type: (...) -> bool
+        if event.get("type") == "transaction":
+            return self.options["before_send_transaction"] is not None
+        return self.options["before_send"] is not None
+
+    def _serialize_event(
+        self,
+        event,  # type: Event
+        hint,  # type: Hint
+    ):
+        # type: (...) -> Optional[Event]
         # Postprocess the event here so that annotated types do
         # generally not surface in before_send
-        if event is not None:
-            event = serialize(
-                event,
-                max_request_body_size=self.options.get("max_request_body_size"),
-                max_value_length=self.options.get("max_value_length"),
-            )
+        event = serialize(
+            event,
+            max_request_body_size=self.options.get("max_request_body_size"),
+            max_value_length=self.options.get("max_value_length"),
+            max_event_bytes=self.options["_experiments"].get("max_event_bytes"),
+        )
 
         before_send = self.options["before_send"]
         if (
@@ -508,6 +574,72 @@ class _Client(object):
 
         return True
 
+    def _should_use_envelope_endpoint(
+        self,
+        event,  # type: Event
+        hint,  # type: Hint
+    ):
+        # type: (...) -> bool
+        # If tracing is enabled all events should go to /envelope endpoint.
+        # If no tracing is enabled only transactions, events with attachments, and checkins should go to the /envelope endpoint.
+        return (
+            has_tracing_enabled(self.options)
+            or event.get("type") in ("transaction", "check_in")
+            or bool(hint.get("attachments"))
+            or bool(self.spotlight)
+        )
+
+    def _is_rate_limited(
+        self,
+        event,  # type: Event
+        hint,  # type: Hint
+    ):
+        # type: (...) -> bool
+        """Checks with the transport whether the event would be discarded
+        because of rate limits anyway, so that no work is spent on it.
+        """
+        if self.transport is None or self.spotlight:
+            return False
+
+        ty = event.get("type")
+        if ty == "transaction":
+            data_category = "transaction"  # type: EventDataCategory
+        elif ty == "check_in":
+            data_category = "monitor"
+        else:
+            data_category = "error"
+
+        # Everything that would end up in the envelope has to be rate
+        # limited, the transport would send the rest otherwise.
+        data_categories = [data_category]
+        if isinstance(event.get("profile"), Profile):
+            data_categories.append("profile")
+        attachments = hint.get("attachments") or ()
+        if attachments:
+            data_categories.append("attachment")
+
+        if not all(self.transport.is_rate_limited(c) for c in data_categories):
+            return False
+
+        logger.debug("Discarding %s event because of rate limits", data_category)
+        for data_category in data_categories:
+            if data_category != "attachment":
+                self.transport.record_lost_event(
+                    "ratelimit_backoff", data_category=data_category
+                )
+        for attachment in attachments:
+            self.transport.record_lost_event(
+                "ratelimit_backoff", item=attachment.to_envelope_item()
+            )
+        return True
+
+    def _get_max_attachment_size(self):
+        # type: () -> int
+        max_attachment_bytes = self.options["_experiments"].get("max_attachment_bytes")
+        if max_attachment_bytes is None:
+            return MAX_ATTACHMENT_SIZE
+        return int(max_attachment_bytes)
+
     def _should_sample_error(
         self,
         event,  # type: Event
@@ -616,19 +748,39 @@ class _Client(object):
         if hint is None:
             hint = {}
         event_id = event.get("event_id")
-        hint = dict(hint or ())  # type: Hint
+        hint = dict(hint or ())
 
         if event_id is None:
             event["event_id"] = event_id = uuid.uuid4().hex
         if not self._should_capture(event, hint, scope):
             return None
 
+        if self._is_rate_limited(event, hint):
+            # the session still has to know about the error
+            session = scope._session if scope else None
+            if session:
+                self._update_session_from_event(session, event)
+            return event_id
+
         profile = event.pop("profile", None)
 
-        event_opt = self._prepare_event(event, hint, scope)
+        event_opt = self._prepare_event(event, hint, scope, serialize=False)
         if event_opt is None:
             return None
 
+        # Without before_send hooks nobody gets to see the serialized dict,
+        # so the event is written straight to JSON once it is about to be
+        # sent.  Profiles need the serialized transaction though.
+        defer_serialization = (
+            self._should_use_envelope_endpoint(event_opt, hint)
+            and not self._has_before_send(event_opt)
+            and not isinstance(profile, Profile)
+        )
+        if not defer_serialization:
+            event_opt = self._serialize_event(event_opt, hint)
+            if event_opt is None:
+                return None
+
         # whenever we capture an event we also check if the session needs
         # to be updated based on that information.
         session = scope._session if scope else None
@@ -645,22 +797,12 @@ class _Client(object):
         ):
             return None
 
-        tracing_enabled = has_tracing_enabled(self.options)
         attachments = hint.get("attachments")
 
         trace_context = event_opt.get("contexts", {}).get("trace") or {}
         dynamic_sampling_context = trace_context.pop("dynamic_sampling_context", {})
 
-        # If tracing is enabled all events should go to /envelope endpoint.
-        # If no tracing is enabled only transactions, events with attachments, and checkins should go to the /envelope endpoint.
-        should_use_envelope_endpoint = (
-            tracing_enabled
-            or is_transaction
-            or is_checkin
-            or bool(attachments)
-            or bool(self.spotlight)
-        )
-        if should_use_envelope_endpoint:
+        if self._should_use_envelope_endpoint(event_opt, hint):
             headers = {
                 "event_id": event_opt["event_id"],
                 "sent_at": format_timestamp(datetime_utcnow()),
@@ -671,17 +813,36 @@ class _Client(object):
 
             envelope = Envelope(headers=headers)
 
+            payload = event_opt  # type: Union[Event, bytes]
+            if defer_serialization:
+                payload = serialize_to_json(
+                    event_opt,
+                    max_request_body_size=self.options.get("max_request_body_size"),
+                    max_value_length=self.options.get("max_value_length"),
+                    static_fragments=self._get_static_fragments(),
+                    max_event_bytes=self.options["_experiments"].get("max_event_bytes"),
+                )
+
             if is_transaction:
                 if isinstance(profile, Profile):
                     envelope.add_profile(profile.to_json(event_opt, self.options))
-                envelope.add_transaction(event_opt)
+                envelope.add_transaction(payload)
             elif is_checkin:
-                envelope.add_checkin(event_opt)
+                envelope.add_checkin(payload)
             else:
-                envelope.add_event(event_opt)
+                envelope.add_event(payload)
 
             for attachment in attachments or ():
-                envelope.add_item(attachment.to_envelope_item())
+                item = attachment.to_envelope_item()
+                if item.payload.get_size() > self._get_max_attachment_size():
+                    logger.debug(
+                        "Discarding attachment %s because it is too large",
+                        attachment.filename,
+                    )
+                    if self.transport is not None:
+                        self.transport.record_lost_event("too_large", item=item)
+                    continue
+                envelope.add_item(item)
 
             if self.spotlight:
                 self.spotlight.capture_envelope(envelope)
@@ -766,6 +927,37 @@ class _Client(object):
                 self.metrics_aggregator.flush()
             self.transport.flush(timeout=timeout, callback=callback)
 
+    def flush_async(
+        self,
+        timeout=None,  # type: Optional[float]
+        callback=None,  # type: Optional[Callable[[int, float], None]]
+    ):
+        # type: (...) -> Awaitable[None]
+        """
+        Wait for the current events to be sent from code running on an asyncio
+        event loop, which :py:meth:`Client.flush` must not block::
+
+            await client.flush_async()
+
+        Arguments have the same semantics as :py:meth:`Client.flush`. Transports
+        that do not send on the event loop are flushed in the loop's default
+        executor. Python 3 only.
+        """
+        import asyncio
+
+        transport_flush_async = getattr(self.transport, "flush_async", None)
+        if transport_flush_async is None:
+            return asyncio.get_event_loop().run_in_executor(
+                None, self.flush, timeout, callback
+            )
+
+        if timeout is None:
+            timeout = self.options["shutdown_timeout"]
+        self.session_flusher.flush()
+        if self.metrics_aggregator is not None:
+            self.metrics_aggregator.flush()
+        return transport_flush_async(timeout, callback)
+
     def __enter__(self):
         # type: () -> _Client
         return self
@@ -0,0 +1,162 @@
+"""
+Compression codecs for request bodies sent by the transport.
+
+gzip and deflate are always available.  zstd and brotli are used if the
+``zstandard`` or ``brotli`` packages are installed.
+"""
+
+import zlib
+
+from sentry_sdk._compat import string_types
+from sentry_sdk._types import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from typing import Any
+    from typing import Dict
+    from typing import Iterable
+    from typing import Iterator
+    from typing import Optional
+    from typing import Sequence
+    from typing import Union
+
+
+class Codec(object):
+    """Base class for compression codecs.
+
+    `name` is sent as the `Content-Encoding` of the request.
+    """
+
+    name = None  # type: Optional[str]
+    default_level = None  # type: Optional[int]
+
+    def compressobj(self, level):
+        # type: (int) -> Any
+        """Returns an object with `compress(data)` and `flush()` methods."""
+        raise NotImplementedError()
+
+    def compress_chunks(
+        self,
+        chunks,  # type: Iterable[bytes]
+        level=None,  # type: Optional[int]
+    ):
+        # type: (...) -> Iterator[bytes]
+        if level is None:
+            level = self.default_level
+            assert level is not None, "%r has no default level" % (self,)
+        compressor = self.compressobj(level)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    def compress(
+        self,
+        data,  # type: bytes
+        level=None,  # type: Optional[int]
+    ):
+        # type: (...) -> bytes
+        return b"".join(self.compress_chunks((data,), level))
+
+
+class GzipCodec(Codec):
+    name = "gzip"
+    default_level = 9
+
+    def compressobj(self, level):
+        # type: (int) -> Any
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+class DeflateCodec(Codec):
+    name = "deflate"
+    default_level = 9
+
+    def compressobj(self, level):
+        # type: (int) -> Any
+        return zlib.compressobj(level)
+
+
+class _BrotliCompressor(object):
+    def __init__(self, compressor):
+        # type: (Any) -> None
+        self._compressor = compressor
+
+    def compress(self, data):
+        # type: (bytes) -> bytes
+        return self._compressor.process(data)
+
+    def flush(self):
+        # type: () -> bytes
+        return self._compressor.finish()
+
+
+class BrotliCodec(Codec):
+    name = "br"
+    default_level = 4
+
+    def __init__(self):
+        # type: () -> None
+        import brotli  # type: ignore
+
+        self._brotli = brotli
+
+    def compressobj(self, level):
+        # type: (int) -> Any
+        return _BrotliCompressor(self._brotli.Compressor(quality=level))
+
+
+class ZstdCodec(Codec):
+    name = "zstd"
+    default_level = 3
+
+    def __init__(self):
+        # type: () -> None
+        import zstandard
+
+        self._zstandard = zstandard
+
+    def compressobj(self, level):
+        # type: (int) -> Any
+        return self._zstandard.ZstdCompressor(level=level).compressobj()
+
+
+_codecs = {}  # type: Dict[str, Codec]
+
+
+def register_codec(codec):
+    # type: (Codec) -> None
+    """Makes a codec available under its `name`."""
+    assert codec.name is not None
+    _codecs[codec.name] = codec
+
+
+def get_codec(names):
+    # type: (Union[str, Sequence[str]]) -> Optional[Codec]
+    """Returns the first available codec out of the given names, in order
+    of preference.
+    """
+    if isinstance(names, string_types):
+        return _codecs.get(names)  # type: ignore
+
+    for name in names:
+        codec = _codecs.get(name)
+        if codec is not None:
+            return codec
+
+    return None
+
+
+def available_codecs():
+    # type: () -> Sequence[str]
+    return sorted(_codecs)
+
+
+register_codec(GzipCodec())
+register_codec(DeflateCodec())
+
+for _codec_cls in (ZstdCodec, BrotliCodec):
+    try:
+        register_codec(_codec_cls())
+    except ImportError:
+        pass
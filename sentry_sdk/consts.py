@@ -39,6 +39,9 @@ if TYPE_CHECKING:
         {
             "attach_explain_plans": dict[str, Any],
             "max_spans": Optional[int],
+            "max_event_bytes": Optional[int],
+            "max_attachment_bytes": Optional[int],
+            "json_backend": Optional[str],
             "record_sql_params": Optional[bool],
             # TODO: Remove these 2 profiling related experiments
             "profiles_sample_rate": Optional[float],
@@ -46,6 +49,18 @@ if TYPE_CHECKING:
             "otel_powered_performance": Optional[bool],
             "transport_zlib_compression_level": Optional[int],
             "transport_num_pools": Optional[int],
+            "transport_num_workers": Optional[int],
+            "transport_queue_lane_sizes": Optional[Dict[str, int]],
+            "transport_compression_algo": Optional[Union[str, List[str]]],
+            "transport_compression_threshold": Optional[int],
+            "transport_compression_levels": Optional[Dict[str, int]],
+            "transport_adaptive_compression": Optional[bool],
+            "transport_batching": Optional[bool],
+            "transport_batch_max_items": Optional[int],
+            "transport_batch_max_bytes": Optional[int],
+            "transport_max_envelope_bytes": Optional[int],
+            "transport_spool_dir": Optional[str],
+            "transport_spool_max_size": Optional[int],
             "enable_metrics": Optional[bool],
             "metrics_summary_sample_rate": Optional[float],
             "should_summarize_metric": Optional[Callable[[str, MetricTags], bool]],
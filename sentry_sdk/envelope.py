@@ -1,11 +1,17 @@
 import io
-import json
 import mimetypes
+import os
+import sys
 
 from sentry_sdk._compat import text_type, PY2
 from sentry_sdk._types import TYPE_CHECKING
 from sentry_sdk.session import Session
-from sentry_sdk.utils import json_dumps, capture_internal_exceptions
+from sentry_sdk.utils import (
+    capture_internal_exception,
+    capture_internal_exceptions,
+    json_dumps,
+    json_loads,
+)
 
 if TYPE_CHECKING:
     from typing import Any
@@ -14,16 +20,22 @@ if TYPE_CHECKING:
     from typing import Dict
     from typing import List
     from typing import Iterator
+    from typing import Callable
 
     from sentry_sdk._types import Event, EventDataCategory
 
+    # `bytes` is shadowed by the property of `_BufferPayloadRef`
+    _Bytes = bytes
+
+
+# Size of the chunks in which file backed payloads are read when an envelope
+# is serialized.
+STREAM_CHUNK_SIZE = 64 * 1024
+
 
 def parse_json(data):
     # type: (Union[bytes, text_type]) -> Any
-    # on some python 3 versions this needs to be bytes
-    if not PY2 and isinstance(data, bytes):
-        data = data.decode("utf-8", "replace")
-    return json.loads(data)
+    return json_loads(data)
 
 
 class Envelope(object):
@@ -42,6 +54,18 @@ class Envelope(object):
             items = list(items)
         self.items = items
 
+    def get_size(self):
+        # type: (...) -> int
+        """Returns the size of the serialized envelope in bytes.  Item sizes
+        are remembered once computed, so this is cheap to call again after
+        more items were added.
+        """
+        return (
+            len(json_dumps(self.headers))
+            + 1
+            + sum(item.get_size() for item in self.items)
+        )
+
     @property
     def description(self):
         # type: (...) -> str
@@ -51,16 +75,18 @@ class Envelope(object):
         )
 
     def add_event(
-        self, event  # type: Event
+        self,
+        event,  # type: Union[Event, bytes]
     ):
         # type: (...) -> None
-        self.add_item(Item(payload=PayloadRef(json=event), type="event"))
+        self.add_item(Item(payload=_json_payload(event), type="event"))
 
     def add_transaction(
-        self, transaction  # type: Event
+        self,
+        transaction,  # type: Union[Event, bytes]
     ):
         # type: (...) -> None
-        self.add_item(Item(payload=PayloadRef(json=transaction), type="transaction"))
+        self.add_item(Item(payload=_json_payload(transaction), type="transaction"))
 
     def add_profile(
         self, profile  # type: Any
@@ -69,10 +95,11 @@ class Envelope(object):
         self.add_item(Item(payload=PayloadRef(json=profile), type="profile"))
 
     def add_checkin(
-        self, checkin  # type: Any
+        self,
+        checkin,  # type: Any
     ):
         # type: (...) -> None
-        self.add_item(Item(payload=PayloadRef(json=checkin), type="check_in"))
+        self.add_item(Item(payload=_json_payload(checkin), type="check_in"))
 
     def add_session(
         self, session  # type: Union[Session, Any]
@@ -89,7 +116,8 @@ class Envelope(object):
         self.add_item(Item(payload=PayloadRef(json=sessions), type="sessions"))
 
     def add_item(
-        self, item  # type: Item
+        self,
+        item,  # type: Item
     ):
         # type: (...) -> None
         self.items.append(item)
@@ -114,14 +142,21 @@ class Envelope(object):
         # type: (...) -> Iterator[Item]
         return iter(self.items)
 
+    def serialize_iter(self):
+        # type: (...) -> Iterator[bytes]
+        """Serializes the envelope lazily, yielding it in chunks."""
+        yield json_dumps(self.headers)
+        yield b"\n"
+        for item in self.items:
+            for chunk in item.serialize_iter():
+                yield chunk
+
     def serialize_into(
         self, f  # type: Any
     ):
         # type: (...) -> None
-        f.write(json_dumps(self.headers))
-        f.write(b"\n")
-        for item in self.items:
-            item.serialize_into(f)
+        for chunk in self.serialize_iter():
+            f.write(chunk)
 
     def serialize(self):
         # type: (...) -> bytes
@@ -131,24 +166,20 @@ class Envelope(object):
 
     @classmethod
     def deserialize_from(
-        cls, f  # type: Any
+        cls,
+        f,  # type: Any
     ):
         # type: (...) -> Envelope
-        headers = parse_json(f.readline())
-        items = []
-        while 1:
-            item = Item.deserialize_from(f)
-            if item is None:
-                break
-            items.append(item)
-        return cls(headers=headers, items=items)
+        reader = EnvelopeReader(f)
+        return cls(headers=reader.headers, items=list(reader))
 
     @classmethod
     def deserialize(
-        cls, bytes  # type: bytes
+        cls,
+        bytes,  # type: bytes
     ):
         # type: (...) -> Envelope
-        return cls.deserialize_from(io.BytesIO(bytes))
+        return cls.deserialize_from(bytes)
 
     def __repr__(self):
         # type: (...) -> str
@@ -171,15 +202,46 @@ class PayloadRef(object):
         # type: (...) -> bytes
         if self.bytes is None:
             if self.path is not None:
+                # Files can be big (think core dumps), so their contents are
+                # not cached on the payload.  Prefer `iter_bytes`.
                 with capture_internal_exceptions():
                     with open(self.path, "rb") as f:
-                        self.bytes = f.read()
+                        return f.read()
+                return b""
             elif self.json is not None:
                 self.bytes = json_dumps(self.json)
             else:
                 self.bytes = b""
         return self.bytes
 
+    def get_size(self):
+        # type: (...) -> int
+        """Returns the size of the payload without loading files."""
+        if self.bytes is None and self.path is not None:
+            with capture_internal_exceptions():
+                return os.path.getsize(self.path)
+            return 0
+        return len(self.get_bytes())
+
+    def iter_bytes(self):
+        # type: (...) -> Iterator[bytes]
+        """Yields the payload in chunks.  Files are read incrementally and
+        are not cached on the payload.
+        """
+        if self.bytes is not None or self.path is None:
+            yield self.get_bytes()
+            return
+
+        try:
+            with open(self.path, "rb") as f:
+                while True:
+                    chunk = f.read(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+        except Exception:
+            capture_internal_exception(sys.exc_info())
+
     @property
     def inferred_content_type(self):
         # type: (...) -> str
@@ -199,6 +261,119 @@ class PayloadRef(object):
         return "<Payload %r>" % (self.inferred_content_type,)
 
 
+class _SerializedJsonPayloadRef(PayloadRef):
+    """A JSON payload that has already been serialized.  It is only parsed
+    again if somebody asks for `json`, and then serialized again from `json`
+    as the caller may have changed it.
+    """
+
+    def __init__(
+        self,
+        bytes,  # type: bytes
+    ):
+        # type: (...) -> None
+        self._json = None  # type: Optional[Any]
+        PayloadRef.__init__(self, bytes=bytes)
+
+    @property
+    def json(self):
+        # type: (...) -> Any
+        if self._json is None and self.bytes is not None:
+            self._json = parse_json(self.bytes)
+            self.bytes = None
+        return self._json
+
+    @json.setter
+    def json(self, value):
+        # type: (Any) -> None
+        self._json = value
+        self.bytes = None
+
+    @property
+    def inferred_content_type(self):
+        # type: (...) -> str
+        return "application/json"
+
+
+class _BufferPayloadRef(PayloadRef):
+    """A payload read from an envelope.  If the envelope was read from a
+    buffer it is a `memoryview` of that buffer, which is only copied if
+    somebody asks for `bytes`.  JSON payloads are parsed the first time
+    `json` is accessed and from then on serialized from `json`, as the
+    caller may have changed it.
+    """
+
+    def __init__(
+        self,
+        data,  # type: Union[bytes, memoryview]
+        is_json=False,  # type: bool
+    ):
+        # type: (...) -> None
+        self.view = memoryview(data)  # type: Optional[memoryview]
+        self.path = None
+        self.is_json = is_json
+        self._bytes = (
+            data if isinstance(data, bytes) else None
+        )  # type: Optional[_Bytes]
+        self._json = None  # type: Optional[Any]
+
+    @property
+    def bytes(self):
+        # type: (...) -> Optional[_Bytes]
+        if self._bytes is None and self.view is not None:
+            self._bytes = self.view.tobytes()
+        return self._bytes
+
+    @bytes.setter
+    def bytes(self, value):
+        # type: (Optional[_Bytes]) -> None
+        self._bytes = value
+        # the buffer no longer holds the payload
+        self.view = None
+
+    @property
+    def json(self):
+        # type: (...) -> Any
+        if self._json is None and self.is_json and self.bytes is not None:
+            self._json = parse_json(self.bytes)
+            self.bytes = None
+        return self._json
+
+    @json.setter
+    def json(self, value):
+        # type: (Any) -> None
+        self._json = value
+        self.bytes = None
+
+    def get_size(self):
+        # type: (...) -> int
+        if self._bytes is None and self.view is not None:
+            return len(self.view)
+        return len(self.get_bytes())
+
+    def iter_bytes(self):
+        # type: (...) -> Iterator[_Bytes]
+        if PY2 or self._bytes is not None or self.view is None:
+            yield self.get_bytes()
+        else:
+            yield self.view  # type: ignore
+
+    @property
+    def inferred_content_type(self):
+        # type: (...) -> str
+        if self.is_json:
+            return "application/json"
+        return "application/octet-stream"
+
+
+def _json_payload(data):
+    # type: (Any) -> PayloadRef
+    """Wraps JSON data, or JSON that is already serialized to bytes."""
+    if isinstance(data, bytes):
+        return _SerializedJsonPayloadRef(data)
+    return PayloadRef(json=data)
+
+
 class Item(object):
     def __init__(
         self,
@@ -230,6 +405,7 @@ class Item(object):
             headers["content_type"] = payload.inferred_content_type
 
         self.payload = payload
+        self._size = None  # type: Optional[int]
 
     def __repr__(self):
         # type: (...) -> str
@@ -271,6 +447,20 @@ class Item(object):
         # type: (...) -> bytes
         return self.payload.get_bytes()
 
+    def get_size(self):
+        # type: (...) -> int
+        """Returns the size of the serialized item, including its headers.
+
+        The size is computed on the first call and not updated afterwards,
+        so it is only approximate for items that are changed later on.
+        """
+        if self._size is None:
+            headers = dict(self.headers)
+            length = self.payload.get_size()
+            headers["length"] = length
+            self._size = len(json_dumps(headers)) + length + 2
+        return self._size
+
     def get_event(self):
         # type: (...) -> Optional[Event]
         """
@@ -286,17 +476,34 @@ class Item(object):
             return self.payload.json
         return None
 
+    def serialize_iter(self):
+        # type: (...) -> Iterator[bytes]
+        """Serializes the item lazily, yielding it in chunks."""
+        headers = dict(self.headers)
+        length = self.payload.get_size()
+        headers["length"] = length
+        yield json_dumps(headers)
+        yield b"\n"
+
+        remaining = length
+        for chunk in self.payload.iter_bytes():
+            if len(chunk) > remaining:
+                chunk = chunk[:remaining]
+            if chunk:
+                remaining -= len(chunk)
+                yield chunk
+        if remaining:
+            # The file shrank (or could not be read) after we announced its
+            # length. Pad it so that the rest of the envelope stays readable.
+            yield b"\0" * remaining
+        yield b"\n"
+
     def serialize_into(
         self, f  # type: Any
     ):
         # type: (...) -> None
-        headers = dict(self.headers)
-        bytes = self.get_bytes()
-        headers["length"] = len(bytes)
-        f.write(json_dumps(headers))
-        f.write(b"\n")
-        f.write(bytes)
-        f.write(b"\n")
+        for chunk in self.serialize_iter():
+            f.write(chunk)
 
     def serialize(self):
         # type: (...) -> bytes
@@ -306,30 +513,114 @@ class Item(object):
 
     @classmethod
     def deserialize_from(
-        cls, f  # type: Any
+        cls,
+        f,  # type: Any
     ):
         # type: (...) -> Optional[Item]
-        line = f.readline().rstrip()
-        if not line:
-            return None
-        headers = parse_json(line)
-        length = headers.get("length")
-        if length is not None:
-            payload = f.read(length)
-            f.readline()
-        else:
-            # if no length was specified we need to read up to the end of line
-            # and remove it (if it is present, i.e. not the very last char in an eof terminated envelope)
-            payload = f.readline().rstrip(b"\n")
-        if headers.get("type") in ("event", "transaction", "metric_buckets"):
-            rv = cls(headers=headers, payload=PayloadRef(json=parse_json(payload)))
-        else:
-            rv = cls(headers=headers, payload=payload)
-        return rv
+        return _read_item(f.readline, f.read)
 
     @classmethod
     def deserialize(
-        cls, bytes  # type: bytes
+        cls,
+        bytes,  # type: bytes
     ):
         # type: (...) -> Optional[Item]
         return cls.deserialize_from(io.BytesIO(bytes))
+
+
+# Items whose payload is parsed as JSON (when it is accessed)
+_JSON_ITEM_TYPES = frozenset(("event", "transaction", "metric_buckets"))
+
+
+def _to_bytes(data):
+    # type: (Union[bytes, memoryview]) -> bytes
+    if isinstance(data, memoryview):
+        return data.tobytes()
+    return data
+
+
+def _read_item(
+    readline,  # type: Callable[[], Union[bytes, memoryview]]
+    read,  # type: Callable[[int], Union[bytes, memoryview]]
+):
+    # type: (...) -> Optional[Item]
+    line = _to_bytes(readline()).rstrip()
+    if not line:
+        return None
+    headers = parse_json(line)
+    length = headers.get("length")
+    if length is not None:
+        payload = read(length)
+        readline()
+    else:
+        # if no length was specified we need to read up to the end of line
+        # and remove it (if it is present, i.e. not the very last char in an eof terminated envelope)
+        payload = readline()
+        if payload[-1:] == b"\n":
+            payload = payload[:-1]
+    return Item(
+        headers=headers,
+        payload=_BufferPayloadRef(
+            payload, is_json=headers.get("type") in _JSON_ITEM_TYPES
+        ),
+    )
+
+
+class EnvelopeReader(object):
+    """Reads an envelope item by item.
+
+    `source` is either a buffer (`bytes`, `bytearray` or an `mmap`) or a
+    binary file-like object with `readline` and `read`, like an open file
+    or `socket.makefile("rb")`.  The headers are read right away, the items
+    only while iterating over the reader.
+
+    Payloads read from a buffer are `memoryview`s of it, so a memory-mapped
+    file has to stay open while they are in use.  JSON payloads are only
+    parsed once their `json` is accessed.
+    """
+
+    def __init__(
+        self,
+        source,  # type: Any
+    ):
+        # type: (...) -> None
+        self._stream = None  # type: Any
+        if hasattr(source, "find"):
+            self._buffer = source
+            self._view = memoryview(source)
+            self._offset = 0
+        else:
+            self._stream = source
+
+        self.headers = parse_json(_to_bytes(self._readline()))
+
+    def _readline(self):
+        # type: () -> Union[bytes, memoryview]
+        if self._stream is not None:
+            return self._stream.readline()
+
+        end = self._buffer.find(b"\n", self._offset)
+        end = len(self._view) if end < 0 else end + 1
+        rv = self._view[self._offset : end]
+        self._offset = end
+        return rv
+
+    def _read(
+        self,
+        length,  # type: int
+    ):
+        # type: (...) -> Union[bytes, memoryview]
+        if self._stream is not None:
+            return self._stream.read(length)
+
+        rv = self._view[self._offset : self._offset + length]
+        self._offset += len(rv)
+        return rv
+
+    def __iter__(self):
+        # type: () -> Iterator[Item]
+        while True:
+            item = _read_item(self._readline, self._read)
+            if item is None:
+                return
+            yield item
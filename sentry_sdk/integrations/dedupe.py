@@ -21,7 +21,6 @@ class DedupeIntegration(Integration):
     @staticmethod
     def setup_once():
         # type: () -> None
-        @add_global_event_processor
         def processor(event, hint):
             # type: (Event, Optional[Hint]) -> Optional[Event]
             if hint is None:
@@ -41,3 +40,5 @@ class DedupeIntegration(Integration):
                 return None
             integration._last_seen.set(exc)
             return event
+
+        add_global_event_processor(processor, event_types=("error",))
@@ -174,7 +174,6 @@ class DjangoIntegration(Integration):
 
         signals.got_request_exception.connect(_got_request_exception)
 
-        @add_global_event_processor
         def process_django_templates(event, hint):
             # type: (Event, Optional[Hint]) -> Optional[Event]
             if hint is None:
@@ -217,6 +216,8 @@ class DjangoIntegration(Integration):
 
             return event
 
+        add_global_event_processor(process_django_templates, event_types=("error",))
+
         @add_global_repr_processor
         def _django_queryset_repr(value, hint):
             # type: (Any, Dict[str, Any]) -> Union[NotImplementedType, str]
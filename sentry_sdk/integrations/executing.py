@@ -24,7 +24,6 @@ class ExecutingIntegration(Integration):
     def setup_once():
         # type: () -> None
 
-        @add_global_event_processor
         def add_executing_info(event, hint):
             # type: (Event, Optional[Hint]) -> Optional[Event]
             if Hub.current.get_integration(ExecutingIntegration) is None:
@@ -66,3 +65,5 @@ class ExecutingIntegration(Integration):
                     sentry_frame["function"] = source.code_qualname(frame.f_code)
 
             return event
+
+        add_global_event_processor(add_executing_info, event_types=("error",))
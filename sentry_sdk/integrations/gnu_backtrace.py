@@ -40,12 +40,13 @@ class GnuBacktraceIntegration(Integration):
     @staticmethod
     def setup_once():
         # type: () -> None
-        @add_global_event_processor
         def process_gnu_backtrace(event, hint):
             # type: (Event, dict[str, Any]) -> Event
             with capture_internal_exceptions():
                 return _process_gnu_backtrace(event, hint)
 
+        add_global_event_processor(process_gnu_backtrace, event_types=("error",))
+
 
 def _process_gnu_backtrace(event, hint):
     # type: (Event, dict[str, Any]) -> Event
@@ -4,6 +4,7 @@ import logging
 from fnmatch import fnmatch
 
 from sentry_sdk.hub import Hub
+from sentry_sdk.breadcrumbs import DeferredValue
 from sentry_sdk.utils import (
     to_string,
     event_from_exception,
@@ -11,7 +12,12 @@ from sentry_sdk.utils import (
     capture_internal_exceptions,
 )
 from sentry_sdk.integrations import Integration
-from sentry_sdk._compat import iteritems, utc_from_timestamp
+from sentry_sdk._compat import (
+    iteritems,
+    number_types,
+    string_types,
+    utc_from_timestamp,
+)
 
 from sentry_sdk._types import TYPE_CHECKING
 
@@ -45,6 +51,10 @@ _IGNORED_LOGGERS = set(
     ["sentry_sdk.errors", "urllib3.connectionpool", "urllib3.connection"]
 )
 
+# Log messages with arguments of these types are only formatted when the
+# breadcrumb is sent, as the message cannot change until then.
+_IMMUTABLE_ARG_TYPES = string_types + number_types + (bytes, type(None))
+
 
 def ignore_logger(
     name,  # type: str
@@ -270,7 +280,6 @@ class BreadcrumbHandler(_BaseHandler):
     def emit(self, record):
         # type: (LogRecord) -> Any
         with capture_internal_exceptions():
-            self.format(record)
             return self._emit(record)
 
     def _emit(self, record):
@@ -288,7 +297,42 @@ class BreadcrumbHandler(_BaseHandler):
             "type": "log",
             "level": self._logging_to_event_level(record),
             "category": record.name,
-            "message": record.message,
-            "timestamp": utc_from_timestamp(record.created),
+            "message": self._message_from_record(record),
+            "timestamp": DeferredValue(utc_from_timestamp, record.created),
             "data": self._extra_from_record(record),
         }
+
+    def _message_from_record(self, record):
+        # type: (LogRecord) -> Any
+        message = record.__dict__.get("message")
+        if message is not None:
+            # another handler formatted the record already
+            return message
+
+        # Only the message and its arguments are kept for formatting later,
+        # never the record itself, which would keep tracebacks and frames
+        # alive for as long as the breadcrumb.
+        msg = record.msg
+        args = record.args
+        if (
+            not record.exc_info
+            and not getattr(record, "stack_info", None)
+            and type(record).getMessage is logging.LogRecord.getMessage
+            and isinstance(msg, string_types)
+            and (
+                not args
+                or isinstance(args, tuple)
+                and all(isinstance(arg, _IMMUTABLE_ARG_TYPES) for arg in args)
+            )
+        ):
+            return DeferredValue(_format_message, msg, args)
+
+        return record.getMessage()
+
+
+def _format_message(msg, args):
+    # type: (str, Any) -> str
+    # the same as `LogRecord.getMessage`
+    if args:
+        msg = msg % args
+    return msg
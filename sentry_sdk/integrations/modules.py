@@ -18,14 +18,12 @@ class ModulesIntegration(Integration):
     @staticmethod
     def setup_once():
         # type: () -> None
-        @add_global_event_processor
         def processor(event, hint):
             # type: (Event, Any) -> Event
-            if event.get("type") == "transaction":
-                return event
-
             if Hub.current.get_integration(ModulesIntegration) is None:
                 return event
 
             event["modules"] = _get_installed_modules()
             return event
+
+        add_global_event_processor(processor, event_types=("error",))
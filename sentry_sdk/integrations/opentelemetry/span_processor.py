@@ -91,11 +91,12 @@ class SentrySpanProcessor(SpanProcessor):  # type: ignore
 
     def __init__(self):
         # type: () -> None
-        @add_global_event_processor
         def global_event_processor(event, hint):
             # type: (Event, Hint) -> Event
             return link_trace_context_to_error_event(event, self.otel_span_map)
 
+        add_global_event_processor(global_event_processor, event_types=("error",))
+
     def _prune_old_spans(self):
         # type: (SentrySpanProcessor) -> None
         """
@@ -38,7 +38,6 @@ class PureEvalIntegration(Integration):
     def setup_once():
         # type: () -> None
 
-        @add_global_event_processor
         def add_executing_info(event, hint):
             # type: (Event, Optional[Hint]) -> Optional[Event]
             if Hub.current.get_integration(PureEvalIntegration) is None:
@@ -80,6 +79,8 @@ class PureEvalIntegration(Integration):
                     )
             return event
 
+        add_global_event_processor(add_executing_info, event_types=("error",))
+
 
 def pure_eval_frame(frame):
     # type: (FrameType) -> Dict[str, Any]
@@ -1,11 +1,13 @@
 from copy import copy
-from collections import deque
+from functools import partial
 from itertools import chain
 import os
 import sys
+import time
 import uuid
 
 from sentry_sdk.attachments import Attachment
+from sentry_sdk.breadcrumbs import BreadcrumbBuffer, resolve_deferred_values
 from sentry_sdk._compat import datetime_utcnow
 from sentry_sdk.consts import FALSE_VALUES, INSTRUMENTER
 from sentry_sdk._functools import wraps
@@ -37,9 +39,10 @@ if TYPE_CHECKING:
 
     from typing import Any
     from typing import Callable
-    from typing import Deque
     from typing import Dict
+    from typing import FrozenSet
     from typing import Generator
+    from typing import Iterable
     from typing import Iterator
     from typing import List
     from typing import Optional
@@ -67,10 +70,112 @@ if TYPE_CHECKING:
 
 global_event_processors = []  # type: List[EventProcessor]
 
+# Containers that a scope shares with its copies until either of them
+# changes them, see `Scope._mutable`.
+_SHAREABLE_CONTAINERS = frozenset(
+    (
+        "_transaction_info",
+        "_tags",
+        "_contexts",
+        "_extras",
+        "_breadcrumbs",
+        "_event_processors",
+        "_error_processors",
+        "_attachments",
+    )
+)
+
+# Containers whose contents decide what `Scope._get_apply_plan` includes.
+_APPLY_PLAN_CONTAINERS = frozenset(("_transaction_info", "_tags", "_extras"))
+
+
+# Types of events that global event processors run for, by default all of
+# them.  Check-ins are not passed to event processors at all.
+EVENT_PROCESSOR_EVENT_TYPES = frozenset(("error", "transaction"))
 
-def add_global_event_processor(processor):
-    # type: (EventProcessor) -> None
+# The event types global event processors were limited to, by the `id` of
+# the processor.  Processors that are no longer registered are dropped
+# whenever the lists below are rebuilt.
+_global_event_processor_types = (
+    {}
+)  # type: Dict[int, Tuple[EventProcessor, FrozenSet[str]]]
+
+# Bumped by `add_global_event_processor`.
+_global_event_processors_version = 0
+
+# The global event processors for every event type, see
+# `_get_global_event_processors`, and the version and length of
+# `global_event_processors` they were built for.
+_global_event_processors_by_type = {}  # type: Dict[str, List[EventProcessor]]
+_global_event_processors_built_for = None  # type: Optional[Tuple[int, int]]
+
+
+def add_global_event_processor(
+    processor,  # type: EventProcessor
+    event_types=None,  # type: Optional[Iterable[str]]
+):
+    # type: (...) -> None
+    """Registers an event processor that runs for the events of all scopes.
+
+    :param event_types: Only run the processor for events of these types,
+        `"error"` and/or `"transaction"`.  By default it runs for both.
+    """
+    global _global_event_processors_version
+
+    if event_types is not None:
+        _global_event_processor_types[id(processor)] = (
+            processor,
+            frozenset(event_types),
+        )
     global_event_processors.append(processor)
+    _global_event_processors_version += 1
+
+
+def _get_global_event_processors(event_type):
+    # type: (str) -> List[EventProcessor]
+    """Returns the global event processors that run for events of
+    `event_type`, in the order they were registered.
+
+    The lists are rebuilt whenever a processor is added, or when the length
+    of `global_event_processors` changes because processors were removed
+    from it directly.
+    """
+    global _global_event_processors_built_for
+
+    built_for = (_global_event_processors_version, len(global_event_processors))
+    if built_for != _global_event_processors_built_for:
+        _global_event_processors_by_type.clear()
+        registered_ids = set(id(processor) for processor in global_event_processors)
+        for processor_id in list(_global_event_processor_types):
+            if processor_id not in registered_ids:
+                _global_event_processor_types.pop(processor_id, None)
+        _global_event_processors_built_for = built_for
+
+    processors = _global_event_processors_by_type.get(event_type)
+    if processors is None:
+        processors = []
+        for processor in list(global_event_processors):
+            registered = _global_event_processor_types.get(id(processor))
+            if registered is None or registered[0] is not processor:
+                event_types = EVENT_PROCESSOR_EVENT_TYPES
+            else:
+                event_types = registered[1]
+            if event_type in event_types:
+                processors.append(processor)
+        _global_event_processors_by_type[event_type] = processors
+    return processors
+
+
+def _merge_section(key, values, scope, event, hint, options):
+    # type: (str, Dict[str, Any], Scope, Event, Hint, Optional[Dict[str, Any]]) -> None
+    """A step of `Scope._get_apply_plan` that merges `values` into the
+    section `key` of the event, overwriting what the event has.
+    """
+    section = event.get(key)
+    if section:
+        section.update(values)  # type: ignore
+    else:
+        event[key] = dict(values)  # type: ignore
 
 
 def _attr_setter(fn):
@@ -149,10 +254,14 @@ class Scope(object):
         "_force_auto_session_tracking",
         "_profile",
         "_propagation_context",
+        "_shared",
+        "_apply_plan",
     )
 
     def __init__(self):
         # type: () -> None
+        self._shared = frozenset()  # type: FrozenSet[str]
+        self._apply_plan = None  # type: Optional[List[Callable[..., None]]]
         self._event_processors = []  # type: List[EventProcessor]
         self._error_processors = []  # type: List[ErrorProcessor]
 
@@ -439,6 +548,32 @@ class Scope(object):
 
         self._propagation_context = None
 
+        # the processors are not cleared, so they might still be shared
+        self._shared = self._shared.intersection(
+            ("_event_processors", "_error_processors")
+        )
+        self._apply_plan = None
+
+    def _mutable(self, name):
+        # type: (str) -> Any
+        """Returns the container stored in the attribute `name` for
+        modification.
+
+        Copies of a scope share their containers with the original, so that
+        pushing a scope does not have to copy all tags, breadcrumbs and so
+        on.  The first scope to modify a shared container makes its own copy
+        of it.
+        """
+        assert name in _SHAREABLE_CONTAINERS, name
+        if name in _APPLY_PLAN_CONTAINERS:
+            self._apply_plan = None
+        value = getattr(self, name)
+        if name in self._shared:
+            value = copy(value)
+            setattr(self, name, value)
+            self._shared = self._shared.difference((name,))
+        return value
+
     @_attr_setter
     def level(self, value):
         # type: (LogLevelStr) -> None
@@ -455,6 +590,7 @@ class Scope(object):
         )
 
         self._level = value
+        self._apply_plan = None
 
     def set_level(self, value):
         # type: (LogLevelStr) -> None
@@ -464,12 +600,14 @@ class Scope(object):
         :param value: The level to set.
         """
         self._level = value
+        self._apply_plan = None
 
     @_attr_setter
     def fingerprint(self, value):
         # type: (Optional[List[str]]) -> None
         """When set this overrides the default fingerprint."""
         self._fingerprint = value
+        self._apply_plan = None
 
     @property
     def transaction(self):
@@ -511,6 +649,7 @@ class Scope(object):
             "Assigning to scope.transaction directly is deprecated: use scope.set_transaction_name() instead."
         )
         self._transaction = value
+        self._apply_plan = None
         if self._span and self._span.containing_transaction:
             self._span.containing_transaction.name = value
 
@@ -518,6 +657,7 @@ class Scope(object):
         # type: (str, Optional[str]) -> None
         """Set the transaction name and optionally the transaction source."""
         self._transaction = name
+        self._apply_plan = None
 
         if self._span and self._span.containing_transaction:
             self._span.containing_transaction.name = name
@@ -525,7 +665,7 @@ class Scope(object):
                 self._span.containing_transaction.source = source
 
         if source:
-            self._transaction_info["source"] = source
+            self._mutable("_transaction_info")["source"] = source
 
     @_attr_setter
     def user(self, value):
@@ -537,6 +677,7 @@ class Scope(object):
         # type: (Optional[Dict[str, Any]]) -> None
         """Sets a user for the scope."""
         self._user = value
+        self._apply_plan = None
         if self._session is not None:
             self._session.update(user=value)
 
@@ -556,8 +697,9 @@ class Scope(object):
             transaction = span
             if transaction.name:
                 self._transaction = transaction.name
+                self._apply_plan = None
                 if transaction.source:
-                    self._transaction_info["source"] = transaction.source
+                    self._mutable("_transaction_info")["source"] = transaction.source
 
     @property
     def profile(self):
@@ -579,7 +721,7 @@ class Scope(object):
 
         :param value: Value of the tag to set.
         """
-        self._tags[key] = value
+        self._mutable("_tags")[key] = value
 
     def remove_tag(self, key):
         # type: (str) -> None
@@ -588,7 +730,7 @@ class Scope(object):
 
         :param key: Key of the tag to remove.
         """
-        self._tags.pop(key, None)
+        self._mutable("_tags").pop(key, None)
 
     def set_context(
         self,
@@ -599,14 +741,15 @@ class Scope(object):
         """
         Binds a context at a certain key to a specific value.
         """
-        self._contexts[key] = value
+        self._mutable("_contexts")[key] = value
 
     def remove_context(
-        self, key  # type: str
+        self,
+        key,  # type: str
     ):
         # type: (...) -> None
         """Removes a context."""
-        self._contexts.pop(key, None)
+        self._mutable("_contexts").pop(key, None)
 
     def set_extra(
         self,
@@ -615,19 +758,21 @@ class Scope(object):
     ):
         # type: (...) -> None
         """Sets an extra key to a specific value."""
-        self._extras[key] = value
+        self._mutable("_extras")[key] = value
 
     def remove_extra(
-        self, key  # type: str
+        self,
+        key,  # type: str
     ):
         # type: (...) -> None
         """Removes a specific extra key."""
-        self._extras.pop(key, None)
+        self._mutable("_extras").pop(key, None)
 
     def clear_breadcrumbs(self):
         # type: () -> None
         """Clears breadcrumb buffer."""
-        self._breadcrumbs = deque()  # type: Deque[Breadcrumb]
+        self._breadcrumbs = BreadcrumbBuffer()
+        self._shared = self._shared.difference(("_breadcrumbs",))
 
     def add_attachment(
         self,
@@ -639,7 +784,7 @@ class Scope(object):
     ):
         # type: (...) -> None
         """Adds an attachment to future events sent."""
-        self._attachments.append(
+        self._mutable("_attachments").append(
             Attachment(
                 bytes=bytes,
                 path=path,
@@ -666,31 +811,40 @@ class Scope(object):
         before_breadcrumb = client.options.get("before_breadcrumb")
         max_breadcrumbs = client.options.get("max_breadcrumbs")
 
-        crumb = dict(crumb or ())  # type: Breadcrumb
-        crumb.update(kwargs)
+        if crumb:
+            crumb = dict(crumb)
+            crumb.update(kwargs)
+        else:
+            # a fresh dict that nobody else holds on to
+            crumb = kwargs
         if not crumb:
             return
 
-        hint = dict(hint or ())  # type: Hint
+        breadcrumbs = self._mutable("_breadcrumbs")
+        if breadcrumbs.maxlen != max_breadcrumbs:
+            breadcrumbs.resize(max_breadcrumbs)
+
+        if before_breadcrumb is None:
+            # The timestamp and type are only filled in if the breadcrumb is
+            # ever sent, see `BreadcrumbBuffer`.
+            breadcrumbs.append(crumb, time.time())
+            return
+
+        breadcrumb_hint = dict(hint or ())  # type: Hint
 
+        # before_breadcrumb has to see the final breadcrumb
+        resolve_deferred_values(crumb)
         if crumb.get("timestamp") is None:
             crumb["timestamp"] = datetime_utcnow()
         if crumb.get("type") is None:
             crumb["type"] = "default"
 
-        if before_breadcrumb is not None:
-            new_crumb = before_breadcrumb(crumb, hint)
-        else:
-            new_crumb = crumb
-
+        new_crumb = before_breadcrumb(crumb, breadcrumb_hint)
         if new_crumb is not None:
-            self._breadcrumbs.append(new_crumb)
+            breadcrumbs.append(new_crumb)
         else:
             logger.info("before breadcrumb dropped breadcrumb (%s)", crumb)
 
-        while len(self._breadcrumbs) > max_breadcrumbs:
-            self._breadcrumbs.popleft()
-
     def start_transaction(
         self, transaction=None, instrumenter=INSTRUMENTER.SENTRY, **kwargs
     ):
@@ -1002,21 +1156,23 @@ class Scope(object):
         self._force_auto_session_tracking = None
 
     def add_event_processor(
-        self, func  # type: EventProcessor
+        self,
+        func,  # type: EventProcessor
     ):
         # type: (...) -> None
         """Register a scope local event processor on the scope.
 
         :param func: This function behaves like `before_send.`
         """
-        if len(self._event_processors) > 20:
+        event_processors = self._mutable("_event_processors")
+        if len(event_processors) > 20:
             logger.warning(
                 "Too many event processors on scope! Clearing list to free up some memory: %r",
-                self._event_processors,
+                event_processors,
             )
-            del self._event_processors[:]
+            del event_processors[:]
 
-        self._event_processors.append(func)
+        event_processors.append(func)
 
     def add_error_processor(
         self,
@@ -1044,7 +1200,7 @@ class Scope(object):
                     return real_func(event, exc_info)
                 return event
 
-        self._error_processors.append(func)
+        self._mutable("_error_processors").append(func)
 
     def _apply_level_to_event(self, event, hint, options):
         # type: (Event, Hint, Optional[Dict[str, Any]]) -> None
@@ -1070,7 +1226,9 @@ class Scope(object):
     def _apply_transaction_info_to_event(self, event, hint, options):
         # type: (Event, Hint, Optional[Dict[str, Any]]) -> None
         if event.get("transaction_info") is None and self._transaction_info is not None:
-            event["transaction_info"] = self._transaction_info
+            # the scope keeps changing its own dict, e.g. in
+            # `set_transaction_name`
+            event["transaction_info"] = dict(self._transaction_info)
 
     def _apply_fingerprint_to_event(self, event, hint, options):
         # type: (Event, Hint, Optional[Dict[str, Any]]) -> None
@@ -1112,6 +1270,40 @@ class Scope(object):
                 "replay_id": replay_id,
             }
 
+    def _get_apply_plan(self):
+        # type: () -> List[Callable[..., None]]
+        """Returns the `_apply_*_to_event` methods that have something to
+        apply to events other than check-ins, in the order they have to run.
+
+        The plan is cached until the scope changes, so that events skip
+        everything that is not set on the scope without checking it again.
+        It holds the tags and extra of the scope merged into one dict each,
+        which events without tags or extra of their own get a copy of.
+        Contexts and breadcrumbs are not part of the plan as they are
+        always applied, and the trace context depends on the current span.
+        """
+        plan = self._apply_plan
+        if plan is None:
+            cls = type(self)
+            plan = []
+            if self._level is not None:
+                plan.append(cls._apply_level_to_event)
+            if self._fingerprint is not None:
+                plan.append(cls._apply_fingerprint_to_event)
+            if self._user is not None:
+                plan.append(cls._apply_user_to_event)
+            if self._transaction is not None:
+                plan.append(cls._apply_transaction_name_to_event)
+            if self._transaction_info is not None:
+                plan.append(cls._apply_transaction_info_to_event)
+            # merged once for this version of the scope
+            if self._tags:
+                plan.append(partial(_merge_section, "tags", dict(self._tags)))
+            if self._extras:
+                plan.append(partial(_merge_section, "extra", dict(self._extras)))
+            self._apply_plan = plan
+        return plan
+
     @_disable_capture
     def apply_to_event(
         self,
@@ -1143,13 +1335,8 @@ class Scope(object):
             }
 
         if not is_check_in:
-            self._apply_level_to_event(event, hint, options)
-            self._apply_fingerprint_to_event(event, hint, options)
-            self._apply_user_to_event(event, hint, options)
-            self._apply_transaction_name_to_event(event, hint, options)
-            self._apply_transaction_info_to_event(event, hint, options)
-            self._apply_tags_to_event(event, hint, options)
-            self._apply_extra_to_event(event, hint, options)
+            for apply_fn in self._get_apply_plan():
+                apply_fn(self, event, hint, options)
 
         if not is_transaction and not is_check_in:
             self._apply_breadcrumbs_to_event(event, hint, options)
@@ -1172,7 +1359,10 @@ class Scope(object):
         # run event processors
         if not is_check_in:
             for event_processor in chain(
-                global_event_processors, self._event_processors
+                _get_global_event_processors(
+                    "transaction" if is_transaction else "error"
+                ),
+                self._event_processors,
             ):
                 new_event = event
                 with capture_internal_exceptions():
@@ -1186,6 +1376,7 @@ class Scope(object):
     def update_from_scope(self, scope):
         # type: (Scope) -> None
         """Update the scope with another scope's data."""
+        self._apply_plan = None
         if scope._level is not None:
             self._level = scope._level
         if scope._fingerprint is not None:
@@ -1193,21 +1384,21 @@ class Scope(object):
         if scope._transaction is not None:
             self._transaction = scope._transaction
         if scope._transaction_info is not None:
-            self._transaction_info.update(scope._transaction_info)
+            self._mutable("_transaction_info").update(scope._transaction_info)
         if scope._user is not None:
             self._user = scope._user
         if scope._tags:
-            self._tags.update(scope._tags)
+            self._mutable("_tags").update(scope._tags)
         if scope._contexts:
-            self._contexts.update(scope._contexts)
+            self._mutable("_contexts").update(scope._contexts)
         if scope._extras:
-            self._extras.update(scope._extras)
+            self._mutable("_extras").update(scope._extras)
         if scope._breadcrumbs:
-            self._breadcrumbs.extend(scope._breadcrumbs)
+            self._mutable("_breadcrumbs").extend(scope._breadcrumbs)
         if scope._span:
             self._span = scope._span
         if scope._attachments:
-            self._attachments.extend(scope._attachments)
+            self._mutable("_attachments").extend(scope._attachments)
         if scope._profile:
             self._profile = scope._profile
         if scope._propagation_context:
@@ -1224,16 +1415,17 @@ class Scope(object):
     ):
         # type: (...) -> None
         """Update the scope's attributes."""
+        self._apply_plan = None
         if level is not None:
             self._level = level
         if user is not None:
             self._user = user
         if extras is not None:
-            self._extras.update(extras)
+            self._mutable("_extras").update(extras)
         if contexts is not None:
-            self._contexts.update(contexts)
+            self._mutable("_contexts").update(contexts)
         if tags is not None:
-            self._tags.update(tags)
+            self._mutable("_tags").update(tags)
         if fingerprint is not None:
             self._fingerprint = fingerprint
 
@@ -1245,26 +1437,30 @@ class Scope(object):
         rv._name = self._name
         rv._fingerprint = self._fingerprint
         rv._transaction = self._transaction
-        rv._transaction_info = dict(self._transaction_info)
+        rv._transaction_info = self._transaction_info
         rv._user = self._user
 
-        rv._tags = dict(self._tags)
-        rv._contexts = dict(self._contexts)
-        rv._extras = dict(self._extras)
+        rv._tags = self._tags
+        rv._contexts = self._contexts
+        rv._extras = self._extras
 
-        rv._breadcrumbs = copy(self._breadcrumbs)
-        rv._event_processors = list(self._event_processors)
-        rv._error_processors = list(self._error_processors)
+        rv._breadcrumbs = self._breadcrumbs
+        rv._event_processors = self._event_processors
+        rv._error_processors = self._error_processors
         rv._propagation_context = self._propagation_context
 
         rv._should_capture = self._should_capture
         rv._span = self._span
         rv._session = self._session
         rv._force_auto_session_tracking = self._force_auto_session_tracking
-        rv._attachments = list(self._attachments)
+        rv._attachments = self._attachments
 
         rv._profile = self._profile
 
+        # both scopes have to copy the containers before changing them now
+        rv._shared = self._shared = _SHAREABLE_CONTAINERS
+        rv._apply_plan = self._apply_plan
+
         return rv
 
     def __repr__(self):
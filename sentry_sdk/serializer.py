@@ -1,10 +1,13 @@
 import sys
+import json
 import math
 
 from datetime import datetime
+from json.encoder import encode_basestring_ascii
 
 from sentry_sdk.utils import (
     AnnotatedValue,
+    FrameVars,
     capture_internal_exception,
     disable_capture_event,
     format_timestamp,
@@ -30,6 +33,7 @@ if TYPE_CHECKING:
     from typing import Dict
     from typing import List
     from typing import Optional
+    from typing import Tuple
     from typing import Type
     from typing import Union
 
@@ -74,6 +78,10 @@ MAX_DATABAG_BREADTH = 10
 CYCLE_MARKER = "<cyclic>"
 
 
+# Returned in place of a value once a node has been written out directly.
+_WRITTEN = object()
+
+
 global_repr_processors = []  # type: List[ReprProcessor]
 
 
@@ -82,6 +90,168 @@ def add_global_repr_processor(processor):
     global_repr_processors.append(processor)
 
 
+class _PathState(object):
+    """Where a node is located in the event, as far as trimming and
+    repr'ing is concerned.  The state of a child node is looked up with the
+    segment leading to it, so nodes never need to inspect their full path.
+
+    `should_repr_strings` is `True` within frame variables: there we want to
+    repr() even things that are JSON-serializable to make their type more
+    apparent, e.g. to see the difference between a unicode-string and a
+    bytestring.  `is_databag` is `True` for data that has to be trimmed and
+    `is_request_body` for request bodies.  `None` means "maybe further
+    down", `False` means never.
+
+    Nodes with a `trim_priority` are dropped when an event doesn't fit
+    into its byte budget, the ones with the lowest priority first.
+    """
+
+    __slots__ = (
+        "should_repr_strings",
+        "is_databag",
+        "is_request_body",
+        "transitions",
+        "default",
+        "trim_priority",
+    )
+
+    def __init__(
+        self,
+        should_repr_strings,  # type: Optional[bool]
+        is_databag,  # type: Optional[bool]
+        is_request_body,  # type: Optional[bool]
+        transitions=None,  # type: Optional[Dict[Segment, _PathState]]
+        default=None,  # type: Optional[_PathState]
+        trim_priority=None,  # type: Optional[int]
+    ):
+        # type: (...) -> None
+        self.should_repr_strings = should_repr_strings
+        self.is_databag = is_databag
+        self.is_request_body = is_request_body
+        self.transitions = transitions or {}
+        self.default = self if default is None else default
+        self.trim_priority = trim_priority
+
+    def next(self, segment):
+        # type: (Segment) -> _PathState
+        return self.transitions.get(segment, self.default)
+
+
+def _build_path_states():
+    # type: () -> _PathState
+    outside = _PathState(False, False, False)
+    databag = _PathState(False, True, False)
+    request_body = _PathState(False, True, True)
+    frame_var = _PathState(True, True, False)
+
+    # Trimmed first when over the byte budget: stacktrace.frames.*.vars,
+    # then breadcrumbs.values.*.data, then extra
+    frame_vars = _PathState(True, True, False, default=frame_var, trim_priority=0)
+    breadcrumb_data = _PathState(False, True, False, default=databag, trim_priority=1)
+    extra = _PathState(False, True, False, default=databag, trim_priority=2)
+
+    # stacktrace.frames.*.vars
+    frame = _PathState(None, None, False, {"vars": frame_vars}, outside)
+    frames = _PathState(None, None, False, default=frame)
+    stacktrace = _PathState(None, None, False, {"frames": frames}, outside)
+
+    # (exception|threads).values.*.stacktrace
+    value = _PathState(None, None, False, {"stacktrace": stacktrace}, outside)
+    values = _PathState(None, None, False, default=value)
+    exception = _PathState(None, None, False, {"values": values}, outside)
+
+    # breadcrumbs.values.*
+    breadcrumb = _PathState(False, True, False, {"data": breadcrumb_data}, databag)
+    breadcrumb_values = _PathState(False, None, False, default=breadcrumb)
+    breadcrumbs = _PathState(False, None, False, {"values": breadcrumb_values}, outside)
+
+    # request.data
+    request = _PathState(False, None, None, {"data": request_body}, outside)
+
+    return _PathState(
+        None,
+        None,
+        None,
+        {
+            "stacktrace": stacktrace,
+            "exception": exception,
+            "threads": exception,
+            "breadcrumbs": breadcrumbs,
+            "request": request,
+            "extra": extra,
+        },
+        outside,
+    )
+
+
+_ROOT_PATH_STATE = _build_path_states()
+
+
+# How a value is serialized, decided once per type instead of running the
+# whole isinstance() chain for every node.
+_SCALAR = 0
+_SENTRY_REPR = 1
+_DATETIME = 2
+_MAPPING = 3
+_SEQUENCE = 4
+_OTHER = 5
+
+# Every mock instance comes with its own class, so the cache must not grow
+# without bounds.
+MAX_TYPE_KIND_CACHE_SIZE = 1000
+
+_type_kinds = {}  # type: Dict[type, int]
+
+_NoneType = type(None)
+
+
+def _classify_type(ty):
+    # type: (type) -> int
+    # The order of the checks is the order of the branches in
+    # `_serialize_node_impl`.  issubclass() covers subclasses and
+    # virtual subclasses of the ABCs alike.
+    if ty is _NoneType or issubclass(ty, (bool, number_types)):
+        return _SCALAR
+    if callable(getattr(ty, "__sentry_repr__", None)):
+        return _SENTRY_REPR
+    if issubclass(ty, datetime):
+        return _DATETIME
+    if issubclass(ty, Mapping):
+        return _MAPPING
+    if not issubclass(ty, serializable_str_types) and issubclass(ty, (Set, Sequence)):
+        return _SEQUENCE
+    return _OTHER
+
+
+def _get_type_kind(ty):
+    # type: (type) -> int
+    try:
+        return _type_kinds[ty]
+    except KeyError:
+        pass
+
+    kind = _classify_type(ty)
+    if len(_type_kinds) >= MAX_TYPE_KIND_CACHE_SIZE:
+        _type_kinds.clear()
+    _type_kinds[ty] = kind
+    return kind
+
+
+# Values of these types can't change after creation, so their repr can be
+# reused for equal values (not just the same object) within one event.  The type is part of the memo
+# key because e.g. `1 == True`.  Floats and datetimes are left out as
+# values with different reprs can be equal (`0.0 == -0.0`, timezones).
+_REPR_MEMO_TYPES = frozenset(
+    (type(None), bool)
+    + tuple(ty for ty in number_types if ty is not float)
+    + string_types
+    + (bytes,)
+)
+
+# Maximum number of reprs remembered while serializing a single event.
+MAX_REPR_MEMO_SIZE = 1000
+
+
 class Memo(object):
     __slots__ = ("_ids", "_objs")
 
@@ -114,8 +284,71 @@ class Memo(object):
         self._ids.pop(id(self._objs.pop()), None)
 
 
+def _encode_json_value(value):
+    # type: (Any) -> str
+    """Encodes a leaf value the same way `json_dumps` would."""
+    if value is None:
+        return "null"
+    elif value is True:
+        return "true"
+    elif value is False:
+        return "false"
+    elif isinstance(value, string_types):
+        return encode_basestring_ascii(value)  # type: ignore
+    elif isinstance(value, float):
+        if math.isinf(value) or math.isnan(value):
+            raise ValueError("Out of range float values are not JSON compliant")
+        return float.__repr__(value)
+    elif isinstance(value, int):
+        return int.__repr__(value)
+    # including `long` on Python 2
+    return json.dumps(value, allow_nan=False, separators=(",", ":"))
+
+
 def serialize(event, **kwargs):
     # type: (Event, **Any) -> Event
+    return _serialize(event, None, **kwargs)
+
+
+def serialize_to_json(event, **kwargs):
+    # type: (Event, **Any) -> bytes
+    """Works like `serialize` but writes the event straight to compact JSON
+    instead of building a new dict first.  The result is the same as
+    `json_dumps(serialize(event))` with the standard library JSON backend.
+    """
+    out = []  # type: List[str]
+    _serialize(event, out, **kwargs)
+    return "".join(out).encode("utf-8")
+
+
+def encode_static_fragments(fragments, **kwargs):
+    # type: (Dict[str, Any], **Any) -> Dict[str, Tuple[Any, str]]
+    """Encodes values that are the same for every event once, so that
+    `serialize_to_json` can splice them in when it finds them at the top
+    level of an event (pass the result as `static_fragments`).  Values that
+    would need `_meta` are left out.
+    """
+    rv = {}
+    for key, value in iteritems(fragments):
+        fragment = {key: value}  # type: Any
+        serialized = serialize(fragment, **kwargs)  # type: Mapping[str, Any]
+        if "_meta" not in serialized:
+            rv[key] = (
+                value,
+                json.dumps(serialized[key], allow_nan=False, separators=(",", ":")),
+            )
+    return rv
+
+
+def _is_static_fragment(value, fragment_value):
+    # type: (Any, Any) -> bool
+    return type(value) is type(fragment_value) and (
+        value is fragment_value or value == fragment_value
+    )
+
+
+def _serialize(event, out, **kwargs):
+    # type: (Event, Optional[List[str]], **Any) -> Any
     memo = Memo()
     path = []  # type: List[Segment]
     meta_stack = []  # type: List[Dict[str, Any]]
@@ -124,6 +357,42 @@ def serialize(event, **kwargs):
         kwargs.pop("max_request_body_size", None) == "always"
     )  # type: bool
     max_value_length = kwargs.pop("max_value_length", None)  # type: Optional[int]
+    max_event_bytes = kwargs.pop("max_event_bytes", None)  # type: Optional[int]
+    static_fragments = kwargs.pop(
+        "static_fragments", None
+    )  # type: Optional[Dict[str, Tuple[Any, str]]]
+    if out is None:
+        # there are no encoded values to splice into
+        static_fragments = None
+
+    # With a byte budget, nodes that can be trimmed are only serialized
+    # once the size of the rest of the event is known
+    defer_trimmable = [max_event_bytes is not None]
+    deferred = (
+        []
+    )  # type: List[Tuple[int, int, Any, List[Segment], Dict[str, Any], _PathState, Optional[int]]]
+
+    # where the value of a `_meta` key of the event itself was written
+    meta_range = []  # type: List[int]
+
+    repr_memo = {}  # type: Dict[Any, Tuple[Any, str]]
+
+    def _safe_repr(obj):
+        # type: (Any) -> str
+        # Equal immutable values share their repr.  Anything else is only
+        # reused for the very same object (e.g. `self` in every frame of a
+        # recursion), which the memo keeps alive so its id can't be reused.
+        ty = type(obj)
+        key = (ty, obj) if ty in _REPR_MEMO_TYPES else id(obj)
+        try:
+            return repr_memo[key][1]
+        except KeyError:
+            pass
+
+        rv = safe_repr(obj)
+        if len(repr_memo) < MAX_REPR_MEMO_SIZE:
+            repr_memo[key] = (obj, rv)
+        return rv
 
     def _annotate(**meta):
         # type: (**Any) -> None
@@ -138,84 +407,6 @@ def serialize(event, **kwargs):
 
         meta_stack[-1].setdefault("", {}).update(meta)
 
-    def _should_repr_strings():
-        # type: () -> Optional[bool]
-        """
-        By default non-serializable objects are going through
-        safe_repr(). For certain places in the event (local vars) we
-        want to repr() even things that are JSON-serializable to
-        make their type more apparent. For example, it's useful to
-        see the difference between a unicode-string and a bytestring
-        when viewing a stacktrace.
-
-        For container-types we still don't do anything different.
-        Generally we just try to make the Sentry UI present exactly
-        what a pretty-printed repr would look like.
-
-        :returns: `True` if we are somewhere in frame variables, and `False` if
-            we are in a position where we will never encounter frame variables
-            when recursing (for example, we're in `event.extra`). `None` if we
-            are not (yet) in frame variables, but might encounter them when
-            recursing (e.g.  we're in `event.exception`)
-        """
-        try:
-            p0 = path[0]
-            if p0 == "stacktrace" and path[1] == "frames" and path[3] == "vars":
-                return True
-
-            if (
-                p0 in ("threads", "exception")
-                and path[1] == "values"
-                and path[3] == "stacktrace"
-                and path[4] == "frames"
-                and path[6] == "vars"
-            ):
-                return True
-        except IndexError:
-            return None
-
-        return False
-
-    def _is_databag():
-        # type: () -> Optional[bool]
-        """
-        A databag is any value that we need to trim.
-
-        :returns: Works like `_should_repr_strings()`. `True` for "yes",
-            `False` for :"no", `None` for "maybe soon".
-        """
-        try:
-            rv = _should_repr_strings()
-            if rv in (True, None):
-                return rv
-
-            is_request_body = _is_request_body()
-            if is_request_body in (True, None):
-                return is_request_body
-
-            p0 = path[0]
-            if p0 == "breadcrumbs" and path[1] == "values":
-                path[2]
-                return True
-
-            if p0 == "extra":
-                return True
-
-        except IndexError:
-            return None
-
-        return False
-
-    def _is_request_body():
-        # type: () -> Optional[bool]
-        try:
-            if path[0] == "request" and path[1] == "data":
-                return True
-        except IndexError:
-            return None
-
-        return False
-
     def _serialize_node(
         obj,  # type: Any
         is_databag=None,  # type: Optional[bool]
@@ -224,36 +415,140 @@ def serialize(event, **kwargs):
         segment=None,  # type: Optional[Segment]
         remaining_breadth=None,  # type: Optional[Union[int, float]]
         remaining_depth=None,  # type: Optional[Union[int, float]]
+        path_state=_ROOT_PATH_STATE,  # type: _PathState
     ):
         # type: (...) -> Any
         if segment is not None:
             path.append(segment)
+            path_state = path_state.next(segment)
+
+        # where this node starts in the output, to undo partial writes
+        start = len(out) if out is not None else 0
+        deferred_start = len(deferred)
 
         try:
+            if static_fragments and len(path) == 1:
+                fragment = static_fragments.get(segment)  # type: ignore
+                if fragment is not None and _is_static_fragment(obj, fragment[0]):
+                    out.append(fragment[1])  # type: ignore
+                    return _WRITTEN
+
+            if defer_trimmable[0] and path_state.trim_priority is not None:
+                deferred.append(
+                    (
+                        path_state.trim_priority,
+                        len(deferred),
+                        obj,
+                        list(path),
+                        {
+                            "is_databag": is_databag,
+                            "is_request_body": is_request_body,
+                            "should_repr_strings": should_repr_strings,
+                            "remaining_breadth": remaining_breadth,
+                            "remaining_depth": remaining_depth,
+                        },
+                        path_state,
+                        start if out is not None else None,
+                    )
+                )
+                if out is not None:
+                    out.append("null")
+                    return _WRITTEN
+                return None
+
             with memo.memoize(obj) as result:
                 if result:
-                    return CYCLE_MARKER
+                    rv = CYCLE_MARKER
+                else:
+                    rv = _serialize_node_impl(
+                        obj,
+                        is_databag=is_databag,
+                        is_request_body=is_request_body,
+                        should_repr_strings=should_repr_strings,
+                        remaining_depth=remaining_depth,
+                        remaining_breadth=remaining_breadth,
+                        path_state=path_state,
+                    )
 
-                return _serialize_node_impl(
-                    obj,
-                    is_databag=is_databag,
-                    is_request_body=is_request_body,
-                    should_repr_strings=should_repr_strings,
-                    remaining_depth=remaining_depth,
-                    remaining_breadth=remaining_breadth,
-                )
+            if out is not None and rv is not _WRITTEN:
+                out.append(_encode_json_value(rv))
+            return rv
         except BaseException:
             capture_internal_exception(sys.exc_info())
 
             if is_databag:
-                return "<failed to serialize, use init(debug=True) to see error logs>"
+                rv = "<failed to serialize, use init(debug=True) to see error logs>"
+            else:
+                rv = None
 
-            return None
+            if out is not None:
+                del out[start:]
+                out.append(_encode_json_value(rv))
+            del deferred[deferred_start:]
+            return rv
         finally:
             if segment is not None:
                 path.pop()
                 del meta_stack[len(path) + 1 :]
 
+    def _serialize_deferred(serialized_event):
+        # type: (Any) -> None
+        """Serializes the nodes held back by `_serialize_node` for as long
+        as they fit into the byte budget.  Nodes with a higher
+        `trim_priority` go first and, within the same priority, later ones
+        (the innermost frames, the latest breadcrumbs) do.
+
+        The budget includes the `_meta` known up to this point, but not the
+        annotations made while the held back nodes are serialized, so the
+        final event can be slightly larger than `max_event_bytes`.
+        """
+        if out is not None:
+            size = len("".join(out))
+        else:
+            size = len(_encode_json_value(serialized_event))
+        if meta_stack:
+            size += len(',"_meta":') + len(_encode_json_value(meta_stack[0]))
+        remaining = max_event_bytes - size  # type: ignore
+
+        defer_trimmable[0] = False
+        for _, _, obj, node_path, node_kwargs, node_state, index in sorted(
+            deferred, key=lambda node: (-node[0], -node[1])
+        ):
+            path[:] = node_path
+            del meta_stack[1:]
+
+            if remaining > 0:
+                # Both ways of serializing measure the JSON of the node
+                if out is not None:
+                    start = len(out)
+                    _serialize_node(obj, path_state=node_state, **node_kwargs)
+                    encoded = "".join(out[start:])
+                    del out[start:]
+                else:
+                    value = _serialize_node(obj, path_state=node_state, **node_kwargs)
+                    encoded = _encode_json_value(value)
+
+                # the node's value takes the place of a `null`
+                value_size = len(encoded)
+                if value_size - 4 <= remaining:
+                    remaining -= value_size - 4
+                    if out is not None:
+                        out[index] = encoded  # type: ignore
+                    else:
+                        parent = serialized_event
+                        for segment in node_path[:-1]:
+                            parent = parent[segment]
+                        parent[node_path[-1]] = value
+                    continue
+
+            # also forget whatever was annotated while serializing the node
+            _annotate()
+            meta_stack[-1].clear()
+            _annotate(rem=[["!limit", "x"]])
+
+        del path[:]
+        del meta_stack[1:]
+
     def _flatten_annotated(obj):
         # type: (Any) -> Any
         if isinstance(obj, AnnotatedValue):
@@ -268,18 +563,19 @@ def serialize(event, **kwargs):
         should_repr_strings,
         remaining_depth,
         remaining_breadth,
+        path_state,
     ):
-        # type: (Any, Optional[bool], Optional[bool], Optional[bool], Optional[Union[float, int]], Optional[Union[float, int]]) -> Any
+        # type: (Any, Optional[bool], Optional[bool], Optional[bool], Optional[Union[float, int]], Optional[Union[float, int]], _PathState) -> Any
         if isinstance(obj, AnnotatedValue):
             should_repr_strings = False
         if should_repr_strings is None:
-            should_repr_strings = _should_repr_strings()
+            should_repr_strings = path_state.should_repr_strings
 
         if is_databag is None:
-            is_databag = _is_databag()
+            is_databag = path_state.is_databag
 
         if is_request_body is None:
-            is_request_body = _is_request_body()
+            is_request_body = path_state.is_request_body
 
         if is_databag:
             if is_request_body and keep_request_bodies:
@@ -308,40 +604,70 @@ def serialize(event, **kwargs):
                 if result is not NotImplemented:
                     return _flatten_annotated(result)
 
-        sentry_repr = getattr(type(obj), "__sentry_repr__", None)
+        kind = _get_type_kind(type(obj))
 
-        if obj is None or isinstance(obj, (bool, number_types)):
+        if kind == _SCALAR:
             if should_repr_strings or (
                 isinstance(obj, float) and (math.isinf(obj) or math.isnan(obj))
             ):
-                return safe_repr(obj)
+                return _safe_repr(obj)
             else:
                 return obj
 
-        elif callable(sentry_repr):
-            return sentry_repr(obj)
+        elif kind == _SENTRY_REPR:
+            return type(obj).__sentry_repr__(obj)
 
-        elif isinstance(obj, datetime):
+        elif kind == _DATETIME:
             return (
                 text_type(format_timestamp(obj))
                 if not should_repr_strings
-                else safe_repr(obj)
+                else _safe_repr(obj)
             )
 
-        elif isinstance(obj, Mapping):
+        elif kind == _MAPPING:
+            # Frame variables have been cut short when they were captured
+            length = (
+                obj.original_length if isinstance(obj, FrameVars) else None
+            )  # type: Optional[int]
+
             # Create temporary copy here to avoid calling too much code that
             # might mutate our dictionary while we're still iterating over it.
             obj = dict(iteritems(obj))
 
-            rv_dict = {}  # type: Dict[str, Any]
-            i = 0
+            if length is None:
+                length = len(obj)
+            elif length > len(obj):
+                _annotate(len=length)
 
-            for k, v in iteritems(obj):
+            # Keys that stringify to the same value keep the position of the
+            # first and the value of the last one, like they do in a dict.
+            items = []  # type: List[Tuple[str, Any]]
+            positions = {}  # type: Dict[str, int]
+            for i, (k, v) in enumerate(iteritems(obj)):
                 if remaining_breadth is not None and i >= remaining_breadth:
-                    _annotate(len=len(obj))
+                    _annotate(len=length)
                     break
 
                 str_k = text_type(k)
+                if str_k in positions:
+                    items[positions[str_k]] = (str_k, v)
+                else:
+                    positions[str_k] = len(items)
+                    items.append((str_k, v))
+
+            rv_dict = {}  # type: Dict[str, Any]
+
+            if out is not None:
+                out.append("{")
+
+            for i, (str_k, v) in enumerate(items):
+                if out is not None:
+                    if i:
+                        out.append(",")
+                    out.append(encode_basestring_ascii(str_k))
+                    out.append(":")
+
+                value_start = len(out) if out is not None else 0
                 v = _serialize_node(
                     v,
                     segment=str_k,
@@ -352,40 +678,57 @@ def serialize(event, **kwargs):
                         remaining_depth - 1 if remaining_depth is not None else None
                     ),
                     remaining_breadth=remaining_breadth,
+                    path_state=path_state,
                 )
-                rv_dict[str_k] = v
-                i += 1
+                if out is None:
+                    rv_dict[str_k] = v
+                elif not path and str_k == "_meta":
+                    # the event brought its own `_meta`, see below
+                    meta_range[:] = [value_start, len(out)]
+
+            if out is not None:
+                out.append("}")
+                return _WRITTEN
 
             return rv_dict
 
-        elif not isinstance(obj, serializable_str_types) and isinstance(
-            obj, (Set, Sequence)
-        ):
+        elif kind == _SEQUENCE:
             rv_list = []
 
+            if out is not None:
+                out.append("[")
+
             for i, v in enumerate(obj):
                 if remaining_breadth is not None and i >= remaining_breadth:
                     _annotate(len=len(obj))
                     break
 
-                rv_list.append(
-                    _serialize_node(
-                        v,
-                        segment=i,
-                        should_repr_strings=should_repr_strings,
-                        is_databag=is_databag,
-                        is_request_body=is_request_body,
-                        remaining_depth=(
-                            remaining_depth - 1 if remaining_depth is not None else None
-                        ),
-                        remaining_breadth=remaining_breadth,
-                    )
+                if out is not None and i:
+                    out.append(",")
+
+                v = _serialize_node(
+                    v,
+                    segment=i,
+                    should_repr_strings=should_repr_strings,
+                    is_databag=is_databag,
+                    is_request_body=is_request_body,
+                    remaining_depth=(
+                        remaining_depth - 1 if remaining_depth is not None else None
+                    ),
+                    remaining_breadth=remaining_breadth,
+                    path_state=path_state,
                 )
+                if out is None:
+                    rv_list.append(v)
+
+            if out is not None:
+                out.append("]")
+                return _WRITTEN
 
             return rv_list
 
         if should_repr_strings:
-            obj = safe_repr(obj)
+            obj = _safe_repr(obj)
         else:
             if isinstance(obj, bytes) or isinstance(obj, bytearray):
                 obj = obj.decode("utf-8", "replace")
@@ -407,8 +750,24 @@ def serialize(event, **kwargs):
     disable_capture_event.set(True)
     try:
         serialized_event = _serialize_node(event, **kwargs)
-        if meta_stack and isinstance(serialized_event, dict):
-            serialized_event["_meta"] = meta_stack[0]
+        if deferred:
+            _serialize_deferred(serialized_event)
+
+        if meta_stack:
+            if out is None:
+                if isinstance(serialized_event, dict):
+                    serialized_event["_meta"] = meta_stack[0]
+            elif serialized_event is _WRITTEN and meta_range:
+                # replace it like the dict does
+                out[meta_range[0] : meta_range[1]] = [_encode_json_value(meta_stack[0])]
+            elif serialized_event is _WRITTEN and out[0] == "{":
+                # add the meta as last key of the already written event
+                out.pop()
+                if out[-1] != "{":
+                    out.append(",")
+                out.append('"_meta":')
+                out.append(_encode_json_value(meta_stack[0]))
+                out.append("}")
 
         return serialized_event
     finally:
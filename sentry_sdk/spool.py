@@ -0,0 +1,368 @@
+import errno
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+from collections import deque
+
+from sentry_sdk.envelope import Envelope
+from sentry_sdk.utils import capture_internal_exceptions, logger
+from sentry_sdk._types import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from typing import Any
+    from typing import Callable
+    from typing import Deque
+    from typing import List
+    from typing import Optional
+    from typing import Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # type: ignore
+
+
+DEFAULT_SPOOL_MAX_SIZE = 50 * 1024 * 1024
+DEFAULT_SPOOL_SEGMENT_SIZE = 1024 * 1024
+
+SEGMENT_SUFFIX = ".seg"
+
+# Segments are written under a temporary name and only renamed to their
+# final name once they are sealed.  The process writing to a segment keeps
+# it locked, so segments left behind by a process that died can be told
+# apart from segments that are still being written to.
+_CREATING_SUFFIX = ".creating"
+_CLAIMED_SUFFIX = ".claimed"
+
+# Every record in a segment is prefixed with its length.  Segments are
+# preallocated (and therefore zero filled), so a length of zero marks the
+# end of the written data.
+_RECORD_HEADER = struct.Struct(">I")
+
+
+def _lock_file(f, blocking=True):
+    # type: (Any, bool) -> bool
+    """Takes an exclusive lock on `f` that is held until it is closed.
+    Returns whether the lock was acquired.  Without `fcntl` locking is not
+    supported and this always succeeds.
+    """
+    if fcntl is None:
+        return True
+    flags = fcntl.LOCK_EX
+    if not blocking:
+        flags |= fcntl.LOCK_NB
+    try:
+        fcntl.flock(f.fileno(), flags)
+    except (IOError, OSError) as e:
+        if e.errno in (errno.EAGAIN, errno.EACCES, errno.EWOULDBLOCK):
+            return False
+        raise
+    return True
+
+
+def _claim_segment(path):
+    # type: (str) -> Tuple[Optional[str], bool]
+    """Takes ownership of a sealed segment, which may have been written by
+    another spool on the same directory.
+
+    Returns the path the segment was moved to and whether the segment is
+    still being written to.  The path is `None` if the segment was already
+    claimed by somebody else or is still being written to.
+    """
+    try:
+        with open(path, "rb") as f:
+            if not _lock_file(f, blocking=False):
+                return None, True
+
+        # Renaming is atomic, so only one spool can win the segment.
+        claimed_path = "%s.%s%s" % (path, uuid.uuid4().hex, _CLAIMED_SUFFIX)
+        os.rename(path, claimed_path)
+    except (IOError, OSError) as e:
+        if e.errno != errno.ENOENT:
+            raise
+        if path.endswith(_CREATING_SUFFIX):
+            # sealed by its writer in the meantime
+            return _claim_segment(path[: -len(_CREATING_SUFFIX)])
+        return None, False
+    return claimed_path, False
+
+
+def _read_segment(path):
+    # type: (str) -> List[Envelope]
+    rv = []  # type: List[Envelope]
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return rv
+
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            offset = 0
+            while offset + _RECORD_HEADER.size <= size:
+                (length,) = _RECORD_HEADER.unpack_from(data, offset)
+                if not length:
+                    break
+                offset += _RECORD_HEADER.size
+                with capture_internal_exceptions():
+                    rv.append(Envelope.deserialize(data[offset : offset + length]))
+                offset += length
+        finally:
+            data.close()
+
+    return rv
+
+
+class _SegmentWriter(object):
+    def __init__(
+        self,
+        path,  # type: str
+        size,  # type: int
+    ):
+        # type: (...) -> None
+        self.path = path
+        self.creating_path = path + _CREATING_SUFFIX
+        self.size = size
+        self.offset = 0
+
+        fd = os.open(self.creating_path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+        self._file = os.fdopen(fd, "r+b")
+        try:
+            _lock_file(self._file)
+            self._file.truncate(size)
+            self._data = mmap.mmap(self._file.fileno(), size)
+        except Exception:
+            self._file.close()
+            with capture_internal_exceptions():
+                os.remove(self.creating_path)
+            raise
+
+    def has_room(self, length):
+        # type: (int) -> bool
+        return self.offset + _RECORD_HEADER.size + length <= self.size
+
+    def write(self, data):
+        # type: (bytes) -> None
+        start = self.offset + _RECORD_HEADER.size
+        end = start + len(data)
+        _RECORD_HEADER.pack_into(self._data, self.offset, len(data))
+        self._data[start:end] = data
+        self.offset = end
+
+    def close(self):
+        # type: () -> Optional[str]
+        """Seals the segment and returns the path it can be found at, which
+        is `None` if another spool claimed it in the meantime.
+        """
+        self._data.flush()
+        self.detach()
+
+        # Files that are open or mapped cannot be renamed on Windows.
+        try:
+            os.rename(self.creating_path, self.path)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                return None
+            raise
+        return self.path
+
+    def detach(self):
+        # type: () -> None
+        """Closes the segment without writing out pending changes, e.g.
+        in a forked child that does not own it.
+        """
+        self._data.close()
+        self._file.close()
+
+
+class EnvelopeSpool(object):
+    """Persistent on-disk storage for envelopes that could not be sent.
+
+    Envelopes are appended to memory-mapped segment files in `directory`.
+    Segments left over from a previous process are picked up again.  Once
+    the spool grows beyond `max_size` bytes the oldest segments are evicted
+    and `on_evict` is invoked with every envelope that is discarded.
+
+    Several spools, also in different processes, can share a directory:
+    every spool writes to its own segments and a segment is only read by
+    the spool that claims it first.
+    """
+
+    def __init__(
+        self,
+        directory,  # type: str
+        max_size=DEFAULT_SPOOL_MAX_SIZE,  # type: int
+        segment_size=DEFAULT_SPOOL_SEGMENT_SIZE,  # type: int
+        on_evict=None,  # type: Optional[Callable[[Envelope], None]]
+    ):
+        # type: (...) -> None
+        self.directory = directory
+        self.max_size = max_size
+        self.segment_size = segment_size
+        self.on_evict = on_evict
+
+        self._lock = threading.Lock()
+        self._segments = deque()  # type: Deque[Tuple[str, int]]
+        self._active = None  # type: Optional[_SegmentWriter]
+        self._active_for_pid = None  # type: Optional[int]
+        self._next_segment_id = 0
+
+        self._load()
+
+    def _load(self):
+        # type: () -> None
+        try:
+            os.makedirs(self.directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        # Segments that are still being created were either left behind by
+        # a process that died or are locked until their writer seals them.
+        names = sorted(
+            name
+            for name in os.listdir(self.directory)
+            if name.endswith((SEGMENT_SUFFIX, SEGMENT_SUFFIX + _CREATING_SUFFIX))
+        )
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                self._segments.append((path, os.path.getsize(path)))
+            except OSError:
+                # claimed by another spool in the meantime
+                continue
+            try:
+                segment_id = int(name.split("-", 1)[0])
+            except ValueError:
+                continue
+            self._next_segment_id = max(self._next_segment_id, segment_id + 1)
+
+        if names:
+            logger.debug(
+                "Found %s spooled segment(s) in %s", len(names), self.directory
+            )
+
+    @property
+    def size(self):
+        # type: () -> int
+        """The number of bytes currently allocated on disk."""
+        rv = sum(size for _, size in self._segments)
+        if self._active is not None:
+            rv += self._active.size
+        return rv
+
+    def is_empty(self):
+        # type: () -> bool
+        return not self._segments and (self._active is None or not self._active.offset)
+
+    def _check_fork(self):
+        # type: () -> None
+        # A forked child must not write into the segment of its parent.
+        if self._active is not None and self._active_for_pid != os.getpid():
+            with capture_internal_exceptions():
+                self._active.detach()
+            self._active = None
+
+    def _seal_active(self):
+        # type: () -> None
+        if self._active is not None:
+            active, self._active = self._active, None
+            path = active.close()
+            if path is not None:
+                self._segments.append((path, active.size))
+
+    def _claim_oldest(self):
+        # type: () -> Optional[str]
+        """Removes the oldest segment that can be claimed from the spool
+        and returns the path it was moved to.  Segments that another spool
+        is still writing to are skipped and kept.
+        """
+        busy = []  # type: List[Tuple[str, int]]
+        claimed_path = None
+        while self._segments and claimed_path is None:
+            segment = self._segments.popleft()
+            is_busy = False
+            with capture_internal_exceptions():
+                claimed_path, is_busy = _claim_segment(segment[0])
+            if is_busy:
+                busy.append(segment)
+        self._segments.extendleft(reversed(busy))
+        return claimed_path
+
+    def _evict(self, needed):
+        # type: (int) -> None
+        while self.size + needed > self.max_size:
+            path = self._claim_oldest()
+            if path is None:
+                break
+            logger.debug("Spool is full, evicting %s", path)
+            with capture_internal_exceptions():
+                envelopes = _read_segment(path)
+                os.remove(path)
+                if self.on_evict is not None:
+                    for envelope in envelopes:
+                        self.on_evict(envelope)
+
+    def append(
+        self,
+        envelope,  # type: Envelope
+    ):
+        # type: (...) -> None
+        data = envelope.serialize()
+        with self._lock:
+            self._check_fork()
+            if self._active is None or not self._active.has_room(len(data)):
+                self._seal_active()
+                size = max(self.segment_size, len(data) + _RECORD_HEADER.size)
+                self._evict(size)
+                self._active = _SegmentWriter(self._make_segment_path(), size)
+                self._active_for_pid = os.getpid()
+            self._active.write(data)
+
+    def _make_segment_path(self):
+        # type: () -> str
+        # Segments are named after the time they were created at so that
+        # they sort oldest first, also across processes.  The pid and a
+        # random part keep the names of concurrent spools apart.
+        segment_id = max(self._next_segment_id, int(time.time() * 1000000))
+        self._next_segment_id = segment_id + 1
+        return os.path.join(
+            self.directory,
+            "%016d-%d-%s%s"
+            % (segment_id, os.getpid(), uuid.uuid4().hex[:8], SEGMENT_SUFFIX),
+        )
+
+    def pop(self):
+        # type: () -> List[Envelope]
+        """Removes the oldest segment from the spool and returns its
+        envelopes.
+        """
+        with self._lock:
+            self._check_fork()
+            path = self._claim_oldest()
+            if path is None:
+                self._seal_active()
+                path = self._claim_oldest()
+            if path is None:
+                return []
+
+        rv = []  # type: List[Envelope]
+        with capture_internal_exceptions():
+            rv = _read_segment(path)
+            os.remove(path)
+        return rv
+
+    def close(self):
+        # type: () -> None
+        with self._lock:
+            self._check_fork()
+            self._seal_active()
+
+    def __del__(self):
+        # type: () -> Any
+        try:
+            self.close()
+        except Exception:
+            pass
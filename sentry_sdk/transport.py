@@ -1,38 +1,43 @@
 from __future__ import print_function
 
-import io
-import gzip
 import socket
+import threading
 import time
-from datetime import timedelta
-from collections import defaultdict
+from collections import defaultdict, deque
 
 import urllib3
 import certifi
 
 from sentry_sdk.utils import Dsn, logger, capture_internal_exceptions, json_dumps
+from sentry_sdk.utils import now as monotonic_now
 from sentry_sdk.worker import BackgroundWorker
-from sentry_sdk.envelope import Envelope, Item, PayloadRef
-from sentry_sdk._compat import datetime_utcnow
+from sentry_sdk.envelope import STREAM_CHUNK_SIZE, Envelope, Item, PayloadRef
+from sentry_sdk.compression import Codec, GzipCodec, DeflateCodec, get_codec
+from sentry_sdk.spool import (
+    DEFAULT_SPOOL_MAX_SIZE,
+    DEFAULT_SPOOL_SEGMENT_SIZE,
+    EnvelopeSpool,
+)
 from sentry_sdk._types import TYPE_CHECKING
 
 if TYPE_CHECKING:
-    from datetime import datetime
     from typing import Any
     from typing import Callable
     from typing import Dict
     from typing import Iterable
+    from typing import Iterator
     from typing import List
     from typing import Optional
     from typing import Tuple
     from typing import Type
     from typing import Union
     from typing import DefaultDict
+    from typing import Deque
 
     from urllib3.poolmanager import PoolManager
     from urllib3.poolmanager import ProxyManager
 
-    from sentry_sdk._types import Event, EndpointType
+    from sentry_sdk._types import Event, EndpointType, EventDataCategory
 
     DataCategory = Optional[str]
 
@@ -66,7 +71,8 @@ class Transport(object):
     parsed_dsn = None  # type: Optional[Dsn]
 
     def __init__(
-        self, options=None  # type: Optional[Dict[str, Any]]
+        self,
+        options=None,  # type: Optional[Dict[str, Any]]
     ):
         # type: (...) -> None
         self.options = options
@@ -76,7 +82,8 @@ class Transport(object):
             self.parsed_dsn = None
 
     def capture_event(
-        self, event  # type: Event
+        self,
+        event,  # type: Event
     ):
         # type: (...) -> None
         """
@@ -86,7 +93,8 @@ class Transport(object):
         raise NotImplementedError()
 
     def capture_envelope(
-        self, envelope  # type: Envelope
+        self,
+        envelope,  # type: Envelope
     ):
         # type: (...) -> None
         """
@@ -125,6 +133,17 @@ class Transport(object):
         """
         return None
 
+    def is_rate_limited(
+        self,
+        data_category,  # type: EventDataCategory
+    ):
+        # type: (...) -> bool
+        """Returns whether data of `data_category` would currently be
+        discarded because of rate limits.  This is meant to be cheap and
+        can be called from any thread.
+        """
+        return False
+
     def is_healthy(self):
         # type: () -> bool
         return True
@@ -137,26 +156,251 @@ class Transport(object):
             pass
 
 
+def _buffer_chunks(chunks):
+    # type: (Iterable[bytes]) -> Iterator[bytes]
+    """Joins small chunks so that the request is not sent in tiny pieces."""
+    buffer = []  # type: List[bytes]
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= STREAM_CHUNK_SIZE:
+            yield b"".join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+class EnvelopeBody(object):
+    """A request body that serializes (and compresses) an envelope while
+    it is being sent, without ever holding the whole payload in memory.
+
+    The body can be iterated more than once, which lets urllib3 retry the
+    request.
+    """
+
+    def __init__(
+        self,
+        envelope,  # type: Envelope
+        codec=None,  # type: Optional[Codec]
+        level=None,  # type: Optional[int]
+    ):
+        # type: (...) -> None
+        self.envelope = envelope
+        self.codec = codec
+        self.level = level
+
+    def __iter__(self):
+        # type: () -> Iterator[bytes]
+        chunks = self.envelope.serialize_iter()  # type: Iterable[bytes]
+        if self.codec is not None:
+            chunks = self.codec.compress_chunks(chunks, self.level)
+        return _buffer_chunks(chunks)
+
+    def getvalue(self):
+        # type: () -> bytes
+        return b"".join(self)
+
+
+# Backoff for replaying spooled envelopes, in seconds.
+SPOOL_INITIAL_BACKOFF = 1.0
+SPOOL_MAX_BACKOFF = 300.0
+
+# Bodies smaller than this are sent uncompressed by default, as compressing
+# tiny session or client report envelopes costs more than it saves.
+DEFAULT_COMPRESSION_THRESHOLD = 1024
+
+# With adaptive compression the configured level is used while the queue is
+# less than a quarter full.  Beyond that the level is halved, dropped to 1
+# and finally compression is turned off, see `_adapt_compression_level`.
+ADAPTIVE_COMPRESSION_STEPS = (0.25, 0.5, 0.75)
+
+# Budget for a single coalesced envelope when batching is enabled.
+DEFAULT_BATCH_MAX_ITEMS = 100
+DEFAULT_BATCH_MAX_BYTES = 1024 * 1024
+
+# Relay rejects envelopes larger than this.  Bigger envelopes are split up
+# before they are sent, see `_split_envelope`.
+DEFAULT_MAX_ENVELOPE_BYTES = 100 * 1024 * 1024
+
+
+def _split_envelope(envelope, max_bytes):
+    # type: (Envelope, int) -> List[Envelope]
+    """Splits an envelope along item boundaries into envelopes that are at
+    most `max_bytes` big once serialized.
+
+    Every part carries the headers of the original envelope, so that
+    attachments stay bound to their event.  Items are kept in order and an
+    item that exceeds the budget on its own is sent in an envelope of its
+    own.
+    """
+    headers_size = len(json_dumps(envelope.headers)) + 1
+    rv = []  # type: List[Envelope]
+    size = 0
+    for item in envelope.items:
+        item_size = item.get_size()
+        if not rv or (rv[-1].items and size + item_size > max_bytes):
+            rv.append(Envelope(headers=envelope.headers))
+            size = headers_size
+        rv[-1].add_item(item)
+        size += item_size
+    return rv
+
+
+def _coalesce_envelopes(envelopes):
+    # type: (Iterable[Envelope]) -> List[Envelope]
+    """Merges a list of envelopes into as few envelopes as possible.
+
+    Envelopes with headers (events, transactions, check-ins) are bound to
+    their `event_id` and can never share an envelope with each other.
+    Envelopes without headers (sessions, metrics, client reports) only carry
+    detached items, which are moved into the first envelope of the batch.
+    """
+    rv = []  # type: List[Envelope]
+    detached_items = []  # type: List[Item]
+    for envelope in envelopes:
+        if envelope.headers:
+            rv.append(
+                Envelope(headers=dict(envelope.headers), items=list(envelope.items))
+            )
+        else:
+            detached_items.extend(envelope.items)
+
+    if detached_items:
+        if rv:
+            rv[0].items.extend(detached_items)
+        else:
+            rv.append(Envelope(items=detached_items))
+
+    return rv
+
+
+# Worker queue lanes from most to least important.  When the queue is full,
+# jobs from the lower lanes are shed first.
+QUEUE_LANES = ("error", "session", "transaction", "metric")
+
+_LANE_BY_ITEM_TYPE = {
+    "event": "error",
+    "attachment": "error",
+    "check_in": "error",
+    "session": "session",
+    "sessions": "session",
+    "client_report": "session",
+    "transaction": "transaction",
+    "profile": "transaction",
+    "statsd": "metric",
+    "metric_meta": "metric",
+}
+
+
+def _get_priority(envelope):
+    # type: (Envelope) -> int
+    """Returns the index of the most important queue lane of all items in
+    the envelope.
+    """
+    priorities = [
+        QUEUE_LANES.index(_LANE_BY_ITEM_TYPE.get(item.type or "", "transaction"))
+        for item in envelope.items
+    ]
+    return min(priorities) if priorities else QUEUE_LANES.index("transaction")
+
+
+def _get_ordering_key(envelope):
+    # type: (Envelope) -> Optional[str]
+    """Session updates have to arrive in order, everything else may be sent
+    concurrently by multiple sender threads.
+    """
+    for item in envelope.items:
+        if item.type in ("session", "sessions"):
+            return "session"
+    return None
+
+
 def _parse_rate_limits(header, now=None):
-    # type: (Any, Optional[datetime]) -> Iterable[Tuple[DataCategory, datetime]]
+    # type: (Any, Optional[float]) -> Iterable[Tuple[DataCategory, float]]
     if now is None:
-        now = datetime_utcnow()
+        now = monotonic_now()
 
     for limit in header.split(","):
         try:
             retry_after, categories, _ = limit.strip().split(":", 2)
-            retry_after = now + timedelta(seconds=int(retry_after))
+            deadline = now + int(retry_after)
             for category in categories and categories.split(";") or (None,):
-                yield category, retry_after
+                yield category, deadline
         except (LookupError, ValueError):
             continue
 
 
+class _RateLimits(object):
+    """Deadlines on the `monotonic_now` clock until which data categories
+    are rate limited.  `None` stands for all categories.
+
+    Checks never take a lock, updates swap in a new dict instead.  Expired
+    entries are dropped once the earliest deadline has passed, so without
+    active rate limits a check does not even look at the clock.
+    """
+
+    def __init__(self):
+        # type: () -> None
+        self._lock = threading.Lock()
+        self._deadlines = {}  # type: Dict[DataCategory, float]
+        self._earliest_expiry = float("inf")
+
+    def __iter__(self):
+        # type: () -> Iterator[DataCategory]
+        return iter(self._deadlines)
+
+    def _set(self, deadlines):
+        # type: (Dict[DataCategory, float]) -> None
+        self._deadlines = deadlines
+        self._earliest_expiry = min(deadlines.values()) if deadlines else float("inf")
+
+    def update(self, deadlines):
+        # type: (Iterable[Tuple[DataCategory, float]]) -> None
+        with self._lock:
+            rv = dict(self._deadlines)
+            rv.update(deadlines)
+            self._set(rv)
+
+    def _get_active(self):
+        # type: () -> Tuple[Dict[DataCategory, float], float]
+        now = monotonic_now()
+        if now < self._earliest_expiry:
+            return self._deadlines, now
+
+        with self._lock:
+            self._set(
+                dict(
+                    (category, deadline)
+                    for category, deadline in self._deadlines.items()
+                    if deadline > now
+                )
+            )
+            return self._deadlines, now
+
+    def is_limited(self, category):
+        # type: (DataCategory) -> bool
+        """Checks whether `category` or everything is rate limited."""
+        if not self._deadlines:
+            return False
+        deadlines, now = self._get_active()
+        return deadlines.get(category, now) > now or deadlines.get(None, now) > now
+
+    def is_any_limited(self):
+        # type: () -> bool
+        if not self._deadlines:
+            return False
+        deadlines, now = self._get_active()
+        return any(deadline > now for deadline in deadlines.values())
+
+
 class HttpTransport(Transport):
     """The default HTTP transport."""
 
     def __init__(
-        self, options  # type: Dict[str, Any]
+        self,
+        options,  # type: Dict[str, Any]
     ):
         # type: (...) -> None
         from sentry_sdk.consts import VERSION
@@ -164,9 +408,19 @@ class HttpTransport(Transport):
         Transport.__init__(self, options)
         assert self.parsed_dsn is not None
         self.options = options  # type: Dict[str, Any]
-        self._worker = BackgroundWorker(queue_size=options["transport_queue_size"])
+        num_workers = options.get("_experiments", {}).get("transport_num_workers")
+        self._num_workers = 1 if num_workers is None else max(1, int(num_workers))
+        queue_size = options["transport_queue_size"]
+        lane_sizes = options.get("_experiments", {}).get("transport_queue_lane_sizes")
+        self._worker = BackgroundWorker(
+            queue_size=queue_size,
+            num_threads=self._num_workers,
+            lane_sizes=[
+                int((lane_sizes or {}).get(lane, queue_size)) for lane in QUEUE_LANES
+            ],
+        )
         self._auth = self.parsed_dsn.to_auth("sentry.python/%s" % VERSION)
-        self._disabled_until = {}  # type: Dict[DataCategory, datetime]
+        self._disabled_until = _RateLimits()
         self._retry = urllib3.util.Retry()
         self._discarded_events = defaultdict(
             int
@@ -177,10 +431,77 @@ class HttpTransport(Transport):
             "transport_zlib_compression_level"
         )
         self._compresslevel = 9 if compresslevel is None else int(compresslevel)
+        self._codec = self._get_codec(
+            options.get("_experiments", {}).get("transport_compression_algo")
+        )
 
         num_pools = options.get("_experiments", {}).get("transport_num_pools")
         self._num_pools = 2 if num_pools is None else int(num_pools)
 
+        experiments = options.get("_experiments", {})
+        compression_threshold = experiments.get("transport_compression_threshold")
+        self._compression_threshold = (
+            DEFAULT_COMPRESSION_THRESHOLD
+            if compression_threshold is None
+            else int(compression_threshold)
+        )
+        self._compression_levels = dict(
+            experiments.get("transport_compression_levels") or {}
+        )  # type: Dict[str, int]
+
+        self._adaptive_compression = bool(
+            experiments.get("transport_adaptive_compression", False)
+        )
+        # how often every compression level was picked, `None` meaning
+        # uncompressed.  Only kept for debugging.
+        self._compression_stats = defaultdict(
+            int
+        )  # type: DefaultDict[Optional[int], int]
+
+        self._batching = bool(experiments.get("transport_batching", False))
+        batch_max_items = experiments.get("transport_batch_max_items")
+        self._batch_max_items = (
+            DEFAULT_BATCH_MAX_ITEMS if batch_max_items is None else int(batch_max_items)
+        )
+        batch_max_bytes = experiments.get("transport_batch_max_bytes")
+        self._batch_max_bytes = (
+            DEFAULT_BATCH_MAX_BYTES if batch_max_bytes is None else int(batch_max_bytes)
+        )
+        max_envelope_bytes = experiments.get("transport_max_envelope_bytes")
+        self._max_envelope_bytes = (
+            DEFAULT_MAX_ENVELOPE_BYTES
+            if max_envelope_bytes is None
+            else int(max_envelope_bytes)
+        )
+        self._pending_envelopes = deque()  # type: Deque[Envelope]
+        self._pending_lock = threading.Lock()
+
+        self._spool = None  # type: Optional[EnvelopeSpool]
+        spool_dir = experiments.get("transport_spool_dir")
+        if spool_dir:
+            spool_max_size = experiments.get("transport_spool_max_size")
+            try:
+                self._spool = EnvelopeSpool(
+                    spool_dir,
+                    max_size=(
+                        DEFAULT_SPOOL_MAX_SIZE
+                        if spool_max_size is None
+                        else int(spool_max_size)
+                    ),
+                    segment_size=DEFAULT_SPOOL_SEGMENT_SIZE,
+                    on_evict=self._on_spool_evict,
+                )
+            except Exception:
+                logger.warning(
+                    "Could not set up the envelope spool in %s",
+                    spool_dir,
+                    exc_info=True,
+                )
+        self._spool_backoff = SPOOL_INITIAL_BACKOFF
+        self._spool_retry_at = 0.0
+        self._spool_timer = None  # type: Optional[threading.Timer]
+        self._spool_timer_lock = threading.Lock()
+
         self._pool = self._make_pool(
             self.parsed_dsn,
             http_proxy=options["http_proxy"],
@@ -209,7 +530,7 @@ class HttpTransport(Transport):
             if data_category == "attachment":
                 # quantity of 0 is actually 1 as we do not want to count
                 # empty attachments as actually empty.
-                quantity = len(item.get_bytes()) or 1
+                quantity = item.payload.get_size() or 1
         elif data_category is None:
             raise TypeError("data category not provided")
 
@@ -230,64 +551,283 @@ class HttpTransport(Transport):
         # sentries if a proxy in front wants to globally slow things down.
         elif response.status == 429:
             logger.warning("Rate-limited via 429")
-            self._disabled_until[None] = datetime_utcnow() + timedelta(
-                seconds=self._retry.get_retry_after(response) or 60
+            self._disabled_until.update(
+                [
+                    (
+                        None,
+                        monotonic_now() + (self._retry.get_retry_after(response) or 60),
+                    )
+                ]
             )
 
-    def _send_request(
+    def _get_codec(
         self,
-        body,  # type: bytes
-        headers,  # type: Dict[str, str]
-        endpoint_type="store",  # type: EndpointType
-        envelope=None,  # type: Optional[Envelope]
+        algo,  # type: Optional[Union[str, List[str]]]
     ):
-        # type: (...) -> None
+        # type: (...) -> Optional[Codec]
+        if self._compresslevel == 0:
+            return None
 
-        def record_loss(reason):
-            # type: (str) -> None
-            if envelope is None:
-                self.record_lost_event(reason, data_category="error")
+        codec = get_codec(algo or "gzip")
+        if codec is None:
+            logger.warning(
+                "None of the compression algorithms %r are available, falling back to gzip.",
+                algo,
+            )
+            codec = get_codec("gzip")
+        return codec
+
+    def _get_compression_level(
+        self,
+        size,  # type: int
+        data_category,  # type: Optional[str]
+    ):
+        # type: (...) -> Optional[int]
+        """Returns the level to compress a body of `size` bytes with, or
+        `None` if it should be sent uncompressed.  `data_category` is the
+        category making up most of the body.
+        """
+        if self._codec is None or size < self._compression_threshold:
+            return None
+
+        level = self._compression_levels.get(data_category)  # type: ignore
+        if level is None:
+            if isinstance(self._codec, (GzipCodec, DeflateCodec)):
+                level = self._compresslevel
             else:
-                for item in envelope.items:
-                    self.record_lost_event(reason, item=item)
+                level = self._codec.default_level
+        if level and self._adaptive_compression:
+            level = self._adapt_compression_level(level)
+        level = level or None
+        self._compression_stats[level] += 1
+        return level
+
+    def _get_queue_load(self):
+        # type: () -> float
+        return self._worker.load()
+
+    def _adapt_compression_level(
+        self,
+        level,  # type: int
+    ):
+        # type: (...) -> Optional[int]
+        """Lowers the compression level as the queue fills up, trading
+        bandwidth for sending fast enough to keep up.
+        """
+        load = self._get_queue_load()
+        rv = level  # type: Optional[int]
+        if load >= ADAPTIVE_COMPRESSION_STEPS[2]:
+            rv = None
+        elif load >= ADAPTIVE_COMPRESSION_STEPS[1]:
+            rv = 1
+        elif load >= ADAPTIVE_COMPRESSION_STEPS[0]:
+            rv = max(1, level // 2)
+
+        if rv != level:
+            logger.debug(
+                "Queue is %d%% full, lowering compression level from %s to %s",
+                load * 100,
+                level,
+                rv,
+            )
+        return rv
+
+    def _get_content_encoding(self):
+        # type: () -> str
+        assert self._codec is not None and self._codec.name is not None
+        return self._codec.name
+
+    def _record_request_loss(
+        self,
+        reason,  # type: str
+        envelope=None,  # type: Optional[Envelope]
+    ):
+        # type: (...) -> None
+        if envelope is None:
+            self.record_lost_event(reason, data_category="error")
+        else:
+            for item in envelope.items:
+                self.record_lost_event(reason, item=item)
 
+    def _get_request_headers(
+        self,
+        headers,  # type: Dict[str, str]
+    ):
+        # type: (...) -> Dict[str, str]
         headers.update(
             {
                 "User-Agent": str(self._auth.client),
                 "X-Sentry-Auth": str(self._auth.to_header()),
             }
         )
+        return headers
+
+    def _on_spool_evict(
+        self,
+        envelope,  # type: Envelope
+    ):
+        # type: (...) -> None
+        for item in envelope.items:
+            self.record_lost_event("cache_overflow", item=item)
+
+    def _spool_envelope(
+        self,
+        envelope,  # type: Optional[Envelope]
+    ):
+        # type: (...) -> bool
+        """Writes an envelope that could not be sent to the spool, if one is
+        configured.  Returns whether the envelope was spooled.
+        """
+        if self._spool is None or envelope is None:
+            return False
+
+        with capture_internal_exceptions():
+            self._spool.append(envelope)
+            self._schedule_spool_replay()
+            return True
+
+        return False
+
+    def _schedule_spool_replay(self):
+        # type: () -> None
+        """Makes sure that a replay is attempted once `_spool_retry_at`
+        expires, even if nothing else is sent until then.
+        """
+        with self._spool_timer_lock:
+            if self._spool_timer is not None and self._spool_timer.is_alive():
+                return
+            timer = threading.Timer(
+                max(self._spool_retry_at - time.time(), 0.0), self._on_spool_timer
+            )
+            timer.daemon = True
+            timer.start()
+            self._spool_timer = timer
+
+    def _on_spool_timer(self):
+        # type: () -> None
+        with self._spool_timer_lock:
+            self._spool_timer = None
+
+        # The transport was killed, or this is a forked child that has not
+        # sent anything yet.
+        if not self._worker.is_alive:
+            return
+
+        if not self._worker.submit(
+            self._replay_spool,
+            # never shed actual data for this
+            priority=len(QUEUE_LANES) - 1,
+        ):
+            self._postpone_spool_replay()
+
+    def _postpone_spool_replay(self):
+        # type: () -> None
+        # backs off just like after a failed request
+        self._on_upstream_failure()
+        self._schedule_spool_replay()
+
+    def _replay_spool(self):
+        # type: () -> None
+        """Replays the oldest spooled segment once the backoff since the
+        last upstream failure or replay has expired.
+        """
+        if self._spool is None or self._spool.is_empty():
+            return
+
+        # Replayed envelopes would only be dropped again while rate limited
+        # and spooled again while the queue is full.
+        if self._is_rate_limited() or self._is_worker_full():
+            self._postpone_spool_replay()
+            return
+
+        if self._spool_retry_at > time.time():
+            self._schedule_spool_replay()
+            return
+
+        # Replay one segment at a time so that a recovering upstream is not
+        # flooded with everything that piled up during the outage.
+        self._spool_retry_at = time.time() + self._spool_backoff
+        envelopes = self._spool.pop()
+        logger.debug("Replaying %s spooled envelope(s)", len(envelopes))
+        for envelope in envelopes:
+            self.capture_envelope(envelope)
+        if not self._spool.is_empty():
+            self._schedule_spool_replay()
+
+    def _on_upstream_failure(self):
+        # type: () -> None
+        self._spool_retry_at = time.time() + self._spool_backoff
+        self._spool_backoff = min(self._spool_backoff * 2, SPOOL_MAX_BACKOFF)
+
+    def _on_upstream_success(self):
+        # type: () -> None
+        self._spool_backoff = SPOOL_INITIAL_BACKOFF
+        self._replay_spool()
+
+    def _handle_request_error(
+        self,
+        envelope=None,  # type: Optional[Envelope]
+    ):
+        # type: (...) -> None
+        self._on_upstream_failure()
+        if not self._spool_envelope(envelope):
+            self.on_dropped_event("network")
+            self._record_request_loss("network_error", envelope)
+
+    def _handle_response(
+        self,
+        response,  # type: urllib3.BaseHTTPResponse
+        envelope=None,  # type: Optional[Envelope]
+    ):
+        # type: (...) -> None
+        self._update_rate_limits(response)
+
+        if response.status == 429:
+            # if we hit a 429.  Something was rate limited but we already
+            # acted on this in `self._update_rate_limits`.  Note that we
+            # do not want to record event loss here as we will have recorded
+            # an outcome in relay already.
+            self.on_dropped_event("status_429")
+            pass
+
+        elif response.status >= 300 or response.status < 200:
+            logger.error(
+                "Unexpected status code: %s (body: %s)",
+                response.status,
+                response.data,
+            )
+            if response.status >= 500:
+                self._on_upstream_failure()
+                if self._spool_envelope(envelope):
+                    return
+            self.on_dropped_event("status_{}".format(response.status))
+            self._record_request_loss("network_error", envelope)
+
+        if 200 <= response.status < 300:
+            self._on_upstream_success()
+
+    def _send_request(
+        self,
+        body,  # type: Union[bytes, EnvelopeBody]
+        headers,  # type: Dict[str, str]
+        endpoint_type="store",  # type: EndpointType
+        envelope=None,  # type: Optional[Envelope]
+    ):
+        # type: (...) -> None
         try:
             response = self._pool.request(
                 "POST",
                 str(self._auth.get_api_url(endpoint_type)),
                 body=body,
-                headers=headers,
+                headers=self._get_request_headers(headers),
+                chunked=not isinstance(body, bytes),
             )
         except Exception:
-            self.on_dropped_event("network")
-            record_loss("network_error")
+            self._handle_request_error(envelope)
             raise
 
         try:
-            self._update_rate_limits(response)
-
-            if response.status == 429:
-                # if we hit a 429.  Something was rate limited but we already
-                # acted on this in `self._update_rate_limits`.  Note that we
-                # do not want to record event loss here as we will have recorded
-                # an outcome in relay already.
-                self.on_dropped_event("status_429")
-                pass
-
-            elif response.status >= 300 or response.status < 200:
-                logger.error(
-                    "Unexpected status code: %s (body: %s)",
-                    response.status,
-                    response.data,
-                )
-                self.on_dropped_event("status_{}".format(response.status))
-                record_loss("network_error")
+            self._handle_response(response, envelope)
         finally:
             response.close()
 
@@ -332,18 +872,20 @@ class HttpTransport(Transport):
         if client_report is not None:
             self.capture_envelope(Envelope(items=[client_report]))
 
+    def is_rate_limited(
+        self,
+        data_category,  # type: EventDataCategory
+    ):
+        # type: (...) -> bool
+        return self._check_disabled(data_category)
+
     def _check_disabled(self, category):
         # type: (str) -> bool
-        def _disabled(bucket):
-            # type: (Any) -> bool
-            ts = self._disabled_until.get(bucket)
-            return ts is not None and ts > datetime_utcnow()
-
-        return _disabled(category) or _disabled(None)
+        return self._disabled_until.is_limited(category)
 
     def _is_rate_limited(self):
         # type: () -> bool
-        return any(ts > datetime_utcnow() for ts in self._disabled_until.values())
+        return self._disabled_until.is_any_limited()
 
     def _is_worker_full(self):
         # type: () -> bool
@@ -353,24 +895,24 @@ class HttpTransport(Transport):
         # type: () -> bool
         return not (self._is_worker_full() or self._is_rate_limited())
 
-    def _send_event(
-        self, event  # type: Event
+    def _serialize_event(
+        self,
+        event,  # type: Event
     ):
-        # type: (...) -> None
-
+        # type: (...) -> Optional[Tuple[bytes, Dict[str, str]]]
+        """Returns the request body and headers for an event, or `None` if
+        the event was dropped because of rate limits.
+        """
         if self._check_disabled("error"):
             self.on_dropped_event("self_rate_limits")
             self.record_lost_event("ratelimit_backoff", data_category="error")
             return None
 
-        body = io.BytesIO()
-        if self._compresslevel == 0:
-            body.write(json_dumps(event))
-        else:
-            with gzip.GzipFile(
-                fileobj=body, mode="w", compresslevel=self._compresslevel
-            ) as f:
-                f.write(json_dumps(event))
+        body = json_dumps(event)
+        level = self._get_compression_level(len(body), "error")
+        if level is not None:
+            assert self._codec is not None
+            body = self._codec.compress(body, level)
 
         assert self.parsed_dsn is not None
         logger.debug(
@@ -387,17 +929,36 @@ class HttpTransport(Transport):
         headers = {
             "Content-Type": "application/json",
         }
-        if self._compresslevel > 0:
-            headers["Content-Encoding"] = "gzip"
+        if level is not None:
+            headers["Content-Encoding"] = self._get_content_encoding()
 
-        self._send_request(body.getvalue(), headers=headers)
-        return None
+        return body, headers
 
-    def _send_envelope(
-        self, envelope  # type: Envelope
+    def _send_event(
+        self,
+        event,  # type: Event
     ):
         # type: (...) -> None
+        request = self._serialize_event(event)
+        if request is None:
+            return None
+
+        body, headers = request
+        self._send_request(body, headers=headers)
+        return None
 
+    def _prepare_envelopes(
+        self,
+        envelope,  # type: Envelope
+    ):
+        # type: (...) -> List[Envelope]
+        """Returns the envelopes that are actually sent for `envelope`.
+
+        Items that are over quota are removed and envelopes that are too
+        big are split up.  A pending client report is attached to the last
+        envelope.  The list is empty if no items are left after applying
+        rate limits.
+        """
         # remove all items from the envelope which are over quota
         new_items = []
         for item in envelope.items:
@@ -408,12 +969,8 @@ class HttpTransport(Transport):
             else:
                 new_items.append(item)
 
-        # Since we're modifying the envelope here make a copy so that others
-        # that hold references do not see their envelope modified.
-        envelope = Envelope(headers=envelope.headers, items=new_items)
-
-        if not envelope.items:
-            return None
+        if not new_items:
+            return []
 
         # since we're already in the business of sending out an envelope here
         # check if we have one pending for the stats session envelopes so we
@@ -422,16 +979,39 @@ class HttpTransport(Transport):
         # session update.
         client_report_item = self._fetch_pending_client_report(interval=30)
         if client_report_item is not None:
-            envelope.items.append(client_report_item)
+            new_items.append(client_report_item)
 
-        body = io.BytesIO()
-        if self._compresslevel == 0:
-            envelope.serialize_into(body)
-        else:
-            with gzip.GzipFile(
-                fileobj=body, mode="w", compresslevel=self._compresslevel
-            ) as f:
-                envelope.serialize_into(f)
+        # Since we're modifying the envelope here make a copy so that others
+        # that hold references do not see their envelope modified.
+        envelope = Envelope(headers=envelope.headers, items=new_items)
+        if envelope.get_size() <= self._max_envelope_bytes:
+            return [envelope]
+
+        envelopes = _split_envelope(envelope, self._max_envelope_bytes)
+        logger.debug(
+            "Splitting envelope of %s bytes into %s envelopes",
+            envelope.get_size(),
+            len(envelopes),
+        )
+        return envelopes
+
+    def _serialize_envelope(
+        self,
+        envelope,  # type: Envelope
+    ):
+        # type: (...) -> Tuple[EnvelopeBody, Dict[str, str]]
+        """Returns the request body and headers for an envelope returned
+        by `_prepare_envelopes`.
+        """
+        item_sizes = [
+            (item.payload.get_size(), item.data_category) for item in envelope.items
+        ]
+        level = self._get_compression_level(
+            sum(size for size, _ in item_sizes), max(item_sizes)[1]
+        )
+        body = EnvelopeBody(
+            envelope, codec=self._codec if level is not None else None, level=level
+        )
 
         assert self.parsed_dsn is not None
         logger.debug(
@@ -444,21 +1024,92 @@ class HttpTransport(Transport):
         headers = {
             "Content-Type": "application/x-sentry-envelope",
         }
-        if self._compresslevel > 0:
-            headers["Content-Encoding"] = "gzip"
-
-        self._send_request(
-            body.getvalue(),
-            headers=headers,
-            endpoint_type="envelope",
-            envelope=envelope,
-        )
+        if level is not None:
+            headers["Content-Encoding"] = self._get_content_encoding()
+
+        return body, headers
+
+    def _send_envelope(
+        self,
+        envelope,  # type: Envelope
+    ):
+        # type: (...) -> None
+        parts = self._prepare_envelopes(envelope)
+        sent = 0
+        try:
+            for part in parts:
+                body, headers = self._serialize_envelope(part)
+                sent += 1
+                self._send_request(
+                    body,
+                    headers=headers,
+                    endpoint_type="envelope",
+                    envelope=part,
+                )
+        except Exception:
+            self._handle_unsent_envelopes(parts[sent:])
+            raise
         return None
 
+    def _handle_unsent_envelopes(
+        self,
+        envelopes,  # type: List[Envelope]
+    ):
+        # type: (...) -> None
+        """Spools, or records as lost, the parts of a split envelope that
+        were not sent because sending an earlier part failed.  The part that
+        failed is taken care of by `_send_request`.
+        """
+        for envelope in envelopes:
+            if not self._spool_envelope(envelope):
+                self._record_request_loss("network_error", envelope)
+
+    def _take_pending_envelopes(self):
+        # type: () -> List[Envelope]
+        """Pops as many pending envelopes as fit into the batch budget.
+
+        At least one envelope is returned if any are pending, even if it
+        exceeds the budget on its own.
+        """
+        rv = []  # type: List[Envelope]
+        num_items = 0
+        num_bytes = 0
+        with self._pending_lock:
+            while self._pending_envelopes:
+                envelope = self._pending_envelopes[0]
+                envelope_bytes = envelope.get_size()
+                if rv and (
+                    num_items + len(envelope.items) > self._batch_max_items
+                    or num_bytes + envelope_bytes > self._batch_max_bytes
+                ):
+                    break
+                self._pending_envelopes.popleft()
+                rv.append(envelope)
+                num_items += len(envelope.items)
+                num_bytes += envelope_bytes
+        return rv
+
+    def _send_pending_envelopes(self):
+        # type: () -> None
+        for envelope in _coalesce_envelopes(self._take_pending_envelopes()):
+            self._send_envelope(envelope)
+
+    def _discard_pending_envelope(self, envelope):
+        # type: (Envelope) -> bool
+        with self._pending_lock:
+            try:
+                self._pending_envelopes.remove(envelope)
+            except ValueError:
+                # already picked up by a batch
+                return False
+        return True
+
     def _get_pool_options(self, ca_certs):
         # type: (Optional[Any]) -> Dict[str, Any]
         options = {
             "num_pools": self._num_pools,
+            # one connection per sender thread
+            "maxsize": self._num_workers,
             "cert_reqs": "CERT_REQUIRED",
             "ca_certs": ca_certs or certifi.where(),
         }
@@ -493,15 +1144,13 @@ class HttpTransport(Transport):
                 return True
         return False
 
-    def _make_pool(
+    def _get_proxy(
         self,
         parsed_dsn,  # type: Dsn
         http_proxy,  # type: Optional[str]
         https_proxy,  # type: Optional[str]
-        ca_certs,  # type: Optional[Any]
-        proxy_headers,  # type: Optional[Dict[str, str]]
     ):
-        # type: (...) -> Union[PoolManager, ProxyManager]
+        # type: (...) -> Optional[str]
         proxy = None
         no_proxy = self._in_no_proxy(parsed_dsn)
 
@@ -513,6 +1162,18 @@ class HttpTransport(Transport):
         if not proxy and (http_proxy != ""):
             proxy = http_proxy or (not no_proxy and getproxies().get("http"))
 
+        return proxy or None
+
+    def _make_pool(
+        self,
+        parsed_dsn,  # type: Dsn
+        http_proxy,  # type: Optional[str]
+        https_proxy,  # type: Optional[str]
+        ca_certs,  # type: Optional[Any]
+        proxy_headers,  # type: Optional[Dict[str, str]]
+    ):
+        # type: (...) -> Union[PoolManager, ProxyManager]
+        proxy = self._get_proxy(parsed_dsn, http_proxy, https_proxy)
         opts = self._get_pool_options(ca_certs)
 
         if proxy:
@@ -541,7 +1202,8 @@ class HttpTransport(Transport):
             return urllib3.PoolManager(**opts)
 
     def capture_event(
-        self, event  # type: Event
+        self,
+        event,  # type: Event
     ):
         # type: (...) -> None
         hub = self.hub_cls.current
@@ -553,27 +1215,76 @@ class HttpTransport(Transport):
                     self._send_event(event)
                     self._flush_client_reports()
 
-        if not self._worker.submit(send_event_wrapper):
+        def on_drop():
+            # type: () -> None
             self.on_dropped_event("full_queue")
             self.record_lost_event("queue_overflow", data_category="error")
 
+        if not self._worker.submit(
+            send_event_wrapper,
+            priority=QUEUE_LANES.index("error"),
+            on_drop=on_drop,
+        ):
+            on_drop()
+
     def capture_envelope(
-        self, envelope  # type: Envelope
+        self,
+        envelope,  # type: Envelope
     ):
         # type: (...) -> None
         hub = self.hub_cls.current
 
-        def send_envelope_wrapper():
+        if self._batching:
+            # Every queued envelope gets its own job so that queue limits and
+            # `flush` keep working as before, but whichever job runs first
+            # sends out everything that is pending at that point.
+            with self._pending_lock:
+                self._pending_envelopes.append(envelope)
+
+            def send_envelope_wrapper():
+                # type: () -> None
+                with hub:
+                    with capture_internal_exceptions():
+                        self._send_pending_envelopes()
+                        self._flush_client_reports()
+
+        else:
+
+            def send_envelope_wrapper():
+                # type: () -> None
+                with hub:
+                    with capture_internal_exceptions():
+                        self._send_envelope(envelope)
+                        self._flush_client_reports()
+
+        def on_drop():
             # type: () -> None
-            with hub:
-                with capture_internal_exceptions():
-                    self._send_envelope(envelope)
-                    self._flush_client_reports()
+            if self._batching and not self._discard_pending_envelope(envelope):
+                # already sent out by another job
+                return
+            self._on_queue_overflow(envelope)
+
+        if not self._worker.submit(
+            send_envelope_wrapper,
+            # a single worker thread runs everything in order anyway
+            ordering_key=(
+                _get_ordering_key(envelope) if self._num_workers > 1 else None
+            ),
+            priority=_get_priority(envelope),
+            on_drop=on_drop,
+        ):
+            on_drop()
 
-        if not self._worker.submit(send_envelope_wrapper):
-            self.on_dropped_event("full_queue")
-            for item in envelope.items:
-                self.record_lost_event("queue_overflow", item=item)
+    def _on_queue_overflow(
+        self,
+        envelope,  # type: Envelope
+    ):
+        # type: (...) -> None
+        if self._spool_envelope(envelope):
+            return
+        self.on_dropped_event("full_queue")
+        for item in envelope.items:
+            self.record_lost_event("queue_overflow", item=item)
 
     def flush(
         self,
@@ -584,25 +1295,43 @@ class HttpTransport(Transport):
         logger.debug("Flushing HTTP transport")
 
         if timeout > 0:
-            self._worker.submit(lambda: self._flush_client_reports(force=True))
+            if self._spool is not None:
+                self._worker.submit(
+                    self._replay_spool,
+                    # never shed actual data for this
+                    priority=len(QUEUE_LANES) - 1,
+                )
+            self._worker.submit(
+                lambda: self._flush_client_reports(force=True),
+                # never shed actual data for this
+                priority=len(QUEUE_LANES) - 1,
+            )
             self._worker.flush(timeout, callback)
 
     def kill(self):
         # type: () -> None
         logger.debug("Killing HTTP transport")
         self._worker.kill()
+        with self._spool_timer_lock:
+            if self._spool_timer is not None:
+                self._spool_timer.cancel()
+                self._spool_timer = None
+        if self._spool is not None:
+            self._spool.close()
 
 
 class _FunctionTransport(Transport):
     def __init__(
-        self, func  # type: Callable[[Event], None]
+        self,
+        func,  # type: Callable[[Event], None]
     ):
         # type: (...) -> None
         Transport.__init__(self)
         self._func = func
 
     def capture_event(
-        self, event  # type: Event
+        self,
+        event,  # type: Event
     ):
         # type: (...) -> None
         self._func(event)
@@ -11,7 +11,6 @@ import sys
 import threading
 import time
 from collections import namedtuple
-from copy import copy
 from decimal import Decimal
 from numbers import Real
 
@@ -46,6 +45,7 @@ except ImportError:
 
 from datetime import datetime
 from functools import partial
+from itertools import islice
 
 try:
     from functools import partialmethod
@@ -55,7 +55,15 @@ except ImportError:
     _PARTIALMETHOD_AVAILABLE = False
 
 import sentry_sdk
-from sentry_sdk._compat import PY2, PY33, PY37, implements_str, text_type, urlparse
+from sentry_sdk._compat import (
+    PY2,
+    PY33,
+    PY37,
+    implements_str,
+    iteritems,
+    text_type,
+    urlparse,
+)
 from sentry_sdk._types import TYPE_CHECKING
 from sentry_sdk.consts import DEFAULT_MAX_VALUE_LENGTH
 
@@ -90,10 +98,176 @@ BASE64_ALPHABET = re.compile(r"^[a-zA-Z0-9/+=]*$")
 SENSITIVE_DATA_SUBSTITUTE = "[Filtered]"
 
 
+class JsonBackend(object):
+    """Encodes and decodes JSON with the standard library.
+
+    The other backends use a faster library.  For the data the SDK sends
+    they produce the same JSON, apart from not escaping non-ASCII text.
+    Whatever the library fails on is handed to the standard library, so
+    errors are the same no matter the backend.  Only orjson and msgspec
+    write NaN and infinity as `null` where the standard library refuses
+    them, and msgspec writes datetimes as strings.
+    """
+
+    name = "json"
+
+    def dumps(self, data):
+        # type: (Any) -> bytes
+        return json.dumps(data, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data):
+        # type: (Union[bytes, text_type]) -> Any
+        # on some python 3 versions this needs to be bytes
+        if not PY2 and isinstance(data, bytes):
+            data = data.decode("utf-8", "replace")
+        return json.loads(data)
+
+
+class _OrjsonBackend(JsonBackend):
+    name = "orjson"
+
+    def __init__(self):
+        # type: () -> None
+        import orjson
+
+        self._dumps = orjson.dumps
+        self._loads = orjson.loads
+        # datetimes are left to the standard library, which refuses them
+        self._options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(self, data):
+        # type: (Any) -> bytes
+        try:
+            return self._dumps(data, option=self._options)
+        except Exception:
+            return JsonBackend.dumps(self, data)
+
+    def loads(self, data):
+        # type: (Union[bytes, text_type]) -> Any
+        try:
+            return self._loads(data)
+        except Exception:
+            return JsonBackend.loads(self, data)
+
+
+class _MsgspecBackend(JsonBackend):
+    name = "msgspec"
+
+    def __init__(self):
+        # type: () -> None
+        import msgspec  # type: ignore
+
+        self._encode = msgspec.json.Encoder().encode
+        self._decode = msgspec.json.Decoder().decode
+
+    def dumps(self, data):
+        # type: (Any) -> bytes
+        try:
+            return self._encode(data)
+        except Exception:
+            return JsonBackend.dumps(self, data)
+
+    def loads(self, data):
+        # type: (Union[bytes, text_type]) -> Any
+        try:
+            return self._decode(data)
+        except Exception:
+            return JsonBackend.loads(self, data)
+
+
+class _UjsonBackend(JsonBackend):
+    name = "ujson"
+
+    def __init__(self):
+        # type: () -> None
+        import ujson  # type: ignore
+
+        # Older versions don't know `allow_nan` and write NaN as is
+        try:
+            ujson.dumps(
+                None,
+                ensure_ascii=False,
+                escape_forward_slashes=False,
+                allow_nan=False,
+            )
+        except TypeError:
+            raise ImportError("ujson is too old, allow_nan is not supported")
+
+        self._ujson = ujson
+
+    def dumps(self, data):
+        # type: (Any) -> bytes
+        try:
+            return self._ujson.dumps(
+                data,
+                ensure_ascii=False,
+                escape_forward_slashes=False,
+                allow_nan=False,
+            ).encode("utf-8")
+        except Exception:
+            return JsonBackend.dumps(self, data)
+
+    def loads(self, data):
+        # type: (Union[bytes, text_type]) -> Any
+        try:
+            return self._ujson.loads(data)
+        except Exception:
+            return JsonBackend.loads(self, data)
+
+
+JSON_BACKENDS = {
+    "json": JsonBackend,
+    "orjson": _OrjsonBackend,
+    "msgspec": _MsgspecBackend,
+    "ujson": _UjsonBackend,
+}  # type: Dict[str, Type[JsonBackend]]
+
+# The order in which "auto" looks for a backend
+_AUTO_JSON_BACKENDS = ("orjson", "msgspec", "ujson")
+
+_json_backend = JsonBackend()
+
+
+def set_json_backend(name):
+    # type: (Optional[str]) -> JsonBackend
+    """Makes `json_dumps` and `json_loads` use the backend with the given
+    name, or the first one installed if the name is "auto".  Falls back to
+    the standard library.
+    """
+    global _json_backend
+
+    if name == "auto":
+        candidates = _AUTO_JSON_BACKENDS  # type: Tuple[str, ...]
+    elif name:
+        candidates = (name,)
+    else:
+        candidates = ()
+
+    backend = JsonBackend()
+    for candidate in candidates:
+        try:
+            backend = JSON_BACKENDS[candidate]()
+        except KeyError:
+            logger.warning("Unknown JSON backend: %s", candidate)
+        except Exception:
+            # the backend's library isn't installed (or too old)
+            logger.debug("JSON backend %s is not available", candidate)
+            continue
+        break
+
+    _json_backend = backend
+    return backend
+
+
 def json_dumps(data):
     # type: (Any) -> bytes
     """Serialize data into a compact JSON representation encoded as UTF-8."""
-    return json.dumps(data, allow_nan=False, separators=(",", ":")).encode("utf-8")
+    return _json_backend.dumps(data)
+
+
+def json_loads(data):
+    # type: (Union[bytes, text_type]) -> Any
+    return _json_backend.loads(data)
 
 
 def _get_debug_hub():
@@ -345,7 +519,8 @@ class Auth(object):
         return self.get_api_url(type="store")
 
     def get_api_url(
-        self, type="store"  # type: EndpointType
+        self,
+        type="store",  # type: EndpointType
     ):
         # type: (...) -> str
         """Returns the API url for storing events."""
@@ -628,6 +803,21 @@ def filename_for_module(module, abs_path):
         return abs_path
 
 
+class FrameVars(dict):  # type: ignore[type-arg]
+    """A snapshot of the first few local variables of a frame.
+
+    Only as many variables as the serializer is going to send are copied
+    when the frame is captured, and nothing is repr'd until the event is
+    serialized.  `original_length` is the number of variables the frame
+    actually had.
+    """
+
+    def __init__(self, f_locals, max_vars):
+        # type: (Dict[str, Any], int) -> None
+        dict.__init__(self, islice(iteritems(f_locals), max_vars))
+        self.original_length = len(f_locals)
+
+
 def serialize_frame(
     frame,
     tb_lineno=None,
@@ -665,7 +855,10 @@ def serialize_frame(
         )
 
     if include_local_variables:
-        rv["vars"] = copy(frame.f_locals)
+        # The serializer imports from here
+        from sentry_sdk.serializer import MAX_DATABAG_BREADTH
+
+        rv["vars"] = FrameVars(frame.f_locals, MAX_DATABAG_BREADTH)
 
     return rv
 
@@ -1,6 +1,7 @@
 import os
 import threading
 
+from collections import deque
 from time import sleep, time
 from sentry_sdk._queue import Queue, FullError
 from sentry_sdk.utils import logger
@@ -10,29 +11,133 @@ from sentry_sdk._types import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from typing import Any
+    from typing import Deque
+    from typing import Dict
+    from typing import List
     from typing import Optional
     from typing import Callable
+    from typing import Sequence
+    from typing import Tuple
 
 
 _TERMINATOR = object()
 
 
-class BackgroundWorker(object):
-    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE):
+class _Job(object):
+    __slots__ = ("callback", "priority", "on_drop", "ordering_key")
+
+    def __init__(
+        self,
+        callback,  # type: Optional[Callable[[], None]]
+        priority=0,  # type: int
+        on_drop=None,  # type: Optional[Callable[[], None]]
+        ordering_key=None,  # type: Optional[str]
+    ):
+        # type: (...) -> None
+        self.callback = callback
+        self.priority = priority
+        self.on_drop = on_drop
+        # Jobs with an ordering key have to run in order with all other jobs
+        # submitted under the same key.  Their queue entry is only a marker,
+        # the callbacks are kept in `BackgroundWorker._ordered_jobs`.
+        self.ordering_key = ordering_key
+
+
+class _LaneQueue(Queue):
+    """A queue with one lane per priority, lower numbers being more
+    important.  Every lane has its own capacity and the queue as a whole is
+    bounded by `maxsize`.  If the queue is full, a new job displaces the
+    newest job of the least important lane below its own priority.
+    """
+
+    def __init__(self, maxsize, lane_sizes):
+        # type: (int, Sequence[int]) -> None
+        self.lane_sizes = list(lane_sizes)
+        Queue.__init__(self, maxsize)
+
+    def _init(self, maxsize):
         # type: (int) -> None
-        self._queue = Queue(queue_size)  # type: Queue
+        self.lanes = [deque() for _ in self.lane_sizes]  # type: List[Deque[_Job]]
+        # terminators are only picked up once all jobs are done
+        self.queue = deque()
+
+    def _qsize(self):
+        # type: () -> int
+        return len(self.queue) + sum(len(lane) for lane in self.lanes)
+
+    def _put(self, item):
+        # type: (Any) -> None
+        if isinstance(item, _Job):
+            self.lanes[item.priority].append(item)
+        else:
+            self.queue.append(item)
+
+    def _get(self):
+        # type: () -> Any
+        for lane in self.lanes:
+            if lane:
+                return lane.popleft()
+        return self.queue.popleft()
+
+    def put_job(self, job):
+        # type: (_Job) -> Optional[_Job]
+        """Enqueues a job without blocking and returns the job that had to
+        be shed to make room for it, if any.  Raises `FullError` if there is
+        no room.
+        """
+        with self.mutex:
+            if len(self.lanes[job.priority]) >= self.lane_sizes[job.priority]:
+                raise FullError()
+
+            shed = None
+            if 0 < self.maxsize <= self._qsize():
+                for lane in reversed(self.lanes[job.priority + 1 :]):
+                    if lane:
+                        shed = lane.pop()
+                        break
+                else:
+                    raise FullError()
+                # the shed job is never going to be processed
+                self.unfinished_tasks -= 1
+
+            self._put(job)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+            return shed
+
+
+class BackgroundWorker(object):
+    def __init__(
+        self,
+        queue_size=DEFAULT_QUEUE_SIZE,  # type: int
+        num_threads=1,  # type: int
+        lane_sizes=None,  # type: Optional[Sequence[int]]
+    ):
+        # type: (...) -> None
+        if lane_sizes is None:
+            lane_sizes = (queue_size,)
+        self._queue = _LaneQueue(queue_size, lane_sizes)  # type: _LaneQueue
         self._lock = threading.Lock()
-        self._thread = None  # type: Optional[threading.Thread]
+        self._num_threads = max(1, num_threads)
+        self._threads = []  # type: List[threading.Thread]
         self._thread_for_pid = None  # type: Optional[int]
 
+        # Jobs with an ordering key are kept here in submission order and
+        # only represented by a marker in the queue.  Whichever thread picks
+        # up a marker runs the oldest job for that key, holding the key's
+        # lock, so jobs with the same key never run concurrently or out of
+        # order even with multiple threads.
+        self._ordered_jobs_lock = threading.Lock()
+        self._ordered_jobs = {}  # type: Dict[str, Tuple[threading.Lock, Deque[_Job]]]
+
     @property
     def is_alive(self):
         # type: () -> bool
         if self._thread_for_pid != os.getpid():
             return False
-        if not self._thread:
+        if not self._threads:
             return False
-        return self._thread.is_alive()
+        return all(thread.is_alive() for thread in self._threads)
 
     def _ensure_thread(self):
         # type: () -> None
@@ -60,36 +165,52 @@ class BackgroundWorker(object):
     def start(self):
         # type: () -> None
         with self._lock:
-            if not self.is_alive:
-                self._thread = threading.Thread(
+            if self.is_alive:
+                return
+
+            if self._thread_for_pid != os.getpid():
+                # Locks might have been held by threads that did not survive
+                # a fork.
+                self._threads = []
+                with self._ordered_jobs_lock:
+                    for key, (_, jobs) in list(self._ordered_jobs.items()):
+                        self._ordered_jobs[key] = (threading.Lock(), jobs)
+
+            threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(threads) < self._num_threads:
+                thread = threading.Thread(
                     target=self._target, name="raven-sentry.BackgroundWorker"
                 )
-                self._thread.daemon = True
+                thread.daemon = True
                 try:
-                    self._thread.start()
-                    self._thread_for_pid = os.getpid()
+                    thread.start()
                 except RuntimeError:
                     # At this point we can no longer start because the interpreter
                     # is already shutting down.  Sadly at this point we can no longer
                     # send out events.
-                    self._thread = None
+                    break
+                threads.append(thread)
+
+            self._threads = threads
+            self._thread_for_pid = os.getpid() if threads else None
 
     def kill(self):
         # type: () -> None
         """
-        Kill worker thread. Returns immediately. Not useful for
+        Kill worker threads. Returns immediately. Not useful for
         waiting on shutdown for events, use `flush` for that.
         """
         logger.debug("background worker got kill request")
         with self._lock:
-            if self._thread:
+            for _ in self._threads:
                 try:
                     self._queue.put_nowait(_TERMINATOR)
                 except FullError:
                     logger.debug("background worker queue full, kill failed")
+                    break
 
-                self._thread = None
-                self._thread_for_pid = None
+            self._threads = []
+            self._thread_for_pid = None
 
     def flush(self, timeout, callback=None):
         # type: (float, Optional[Any]) -> None
@@ -103,6 +224,13 @@ class BackgroundWorker(object):
         # type: () -> bool
         return self._queue.full()
 
+    def load(self):
+        # type: () -> float
+        """Returns the fraction of the queue capacity that is in use."""
+        if self._queue.maxsize <= 0:
+            return 0.0
+        return min(1.0, float(self._queue.qsize()) / self._queue.maxsize)
+
     def _wait_flush(self, timeout, callback):
         # type: (float, Optional[Any]) -> None
         initial_timeout = min(0.1, timeout)
@@ -116,24 +244,88 @@ class BackgroundWorker(object):
                 pending = self._queue.qsize() + 1
                 logger.error("flush timed out, dropped %s events", pending)
 
-    def submit(self, callback):
-        # type: (Callable[[], None]) -> bool
+    def submit(
+        self,
+        callback,  # type: Callable[[], None]
+        ordering_key=None,  # type: Optional[str]
+        priority=0,  # type: int
+        on_drop=None,  # type: Optional[Callable[[], None]]
+    ):
+        # type: (...) -> bool
+        """Queues a job.  Jobs submitted with the same `ordering_key` are
+        guaranteed to run one after another in submission order and should
+        share the same `priority`.
+
+        If the queue is full, a queued job of a lower priority is shed to
+        make room and its `on_drop` callback is invoked.  Returns `False` if
+        the job itself could not be queued.
+        """
         self._ensure_thread()
+
+        job = _Job(callback, priority, on_drop, ordering_key)
+        if ordering_key is None:
+            entry = job
+        else:
+            with self._ordered_jobs_lock:
+                if ordering_key not in self._ordered_jobs:
+                    self._ordered_jobs[ordering_key] = (threading.Lock(), deque())
+                self._ordered_jobs[ordering_key][1].append(job)
+            entry = _Job(None, priority, None, ordering_key)
+
         try:
-            self._queue.put_nowait(callback)
-            return True
+            shed = self._queue.put_job(entry)
         except FullError:
+            if ordering_key is not None:
+                with self._ordered_jobs_lock:
+                    self._ordered_jobs[ordering_key][1].remove(job)
             return False
 
+        if shed is not None:
+            self._on_shed(shed)
+        return True
+
+    def _on_shed(self, job):
+        # type: (_Job) -> None
+        if job.ordering_key is not None:
+            # All markers of a key are alike, drop the newest job so that the
+            # remaining ones still run in order.
+            with self._ordered_jobs_lock:
+                jobs = self._ordered_jobs[job.ordering_key][1]
+                if not jobs:
+                    return
+                job = jobs.pop()
+
+        logger.debug("background worker queue full, shedding a job")
+        if job.on_drop is not None:
+            try:
+                job.on_drop()
+            except Exception:
+                logger.error("Failed dropping job", exc_info=True)
+
+    def _run_ordered_job(self, ordering_key):
+        # type: (str) -> None
+        with self._ordered_jobs_lock:
+            lock, jobs = self._ordered_jobs[ordering_key]
+
+        with lock:
+            with self._ordered_jobs_lock:
+                if not jobs:
+                    return
+                job = jobs.popleft()
+            job.callback()  # type: ignore
+
     def _target(self):
         # type: () -> None
         while True:
-            callback = self._queue.get()
+            job = self._queue.get()
             try:
-                if callback is _TERMINATOR:
+                if job is _TERMINATOR:
                     break
                 try:
-                    callback()
+                    if job.ordering_key is not None:
+                        self._run_ordered_job(job.ordering_key)
+                    else:
+                        job.callback()
                 except Exception:
                     logger.error("Failed processing job", exc_info=True)
             finally:
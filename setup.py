@@ -46,6 +46,7 @@ setup(
     extras_require={
         "aiohttp": ["aiohttp>=3.5"],
         "arq": ["arq>=0.23"],
+        "asyncio": ["httpcore[asyncio]==1.*"],
         "asyncpg": ["asyncpg>=0.23"],
         "beam": ["apache-beam>=2.12"],
         "bottle": ["bottle>=0.12.13"],
@@ -1,5 +1,7 @@
 # coding: utf-8
+import gc
 import sys
+import weakref
 
 import pytest
 import logging
@@ -232,3 +234,58 @@ def test_ignore_logger_wildcard(sentry_init, capture_events):
 
     (event,) = events
     assert event["logentry"]["message"] == "hi"
+
+
+def test_breadcrumb_message_formatted_with_current_args(sentry_init, capture_events):
+    sentry_init(integrations=[LoggingIntegration()], default_integrations=False)
+    events = capture_events()
+
+    items = ["a"]
+    logger.info("immutable %s %d", "bread", 42)
+    logger.info("mutable %s", items)
+    items.append("b")
+    logger.critical("lol")
+
+    (event,) = events
+    messages = [crumb["message"] for crumb in event["breadcrumbs"]["values"]]
+    assert "immutable bread 42" in messages
+    assert "mutable ['a']" in messages
+
+
+def test_breadcrumbs_do_not_keep_log_records_alive(sentry_init, capture_events):
+    sentry_init(integrations=[LoggingIntegration()], default_integrations=False)
+    events = capture_events()
+
+    # pytest's own handlers keep the records they see
+    logger = logging.getLogger("testalive")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+
+    class Local(object):
+        pass
+
+    def log_exception():
+        local = Local()  # noqa: F841
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logger.info("division by %s", 0, exc_info=True)
+        return weakref.ref(local)
+
+    local_ref = log_exception()
+
+    record = logger.makeRecord(
+        logger.name, logging.INFO, "x.py", 1, "hi %s", ("you",), None
+    )
+    logger.handle(record)
+    record_ref = weakref.ref(record)
+    del record
+
+    gc.collect()
+    assert local_ref() is None
+    assert record_ref() is None
+
+    logger.critical("lol")
+    (event,) = events
+    messages = [crumb["message"] for crumb in event["breadcrumbs"]["values"]]
+    assert messages == ["division by 0", "hi you"]
@@ -1,7 +1,9 @@
+import gc
 import logging
 import os
 import sys
 import time
+import weakref
 
 import pytest
 
@@ -435,6 +437,8 @@ def test_attachments(sentry_init, capture_envelopes):
     assert pyfile.payload.bytes is None
     with open(this_file, "rb") as f:
         assert pyfile.payload.get_bytes() == f.read()
+    # the file contents are not kept around
+    assert pyfile.payload.bytes is None
 
 
 def test_integration_scoping(sentry_init, capture_events):
@@ -592,6 +596,55 @@ def test_event_processor_drop_records_client_report(
     global_event_processors.pop()
 
 
+def test_global_event_processor_event_types(sentry_init, capture_events):
+    sentry_init(traces_sample_rate=1.0)
+    events = capture_events()
+
+    seen = []
+
+    def error_processor(event, hint):
+        seen.append(("error", event.get("type")))
+        return event
+
+    def any_processor(event, hint):
+        seen.append(("any", event.get("type")))
+        return event
+
+    add_global_event_processor(error_processor, event_types=("error",))
+    add_global_event_processor(any_processor)
+    try:
+        capture_message("hello")
+        with start_transaction(name="hello"):
+            pass
+    finally:
+        global_event_processors.remove(error_processor)
+        global_event_processors.remove(any_processor)
+
+    assert len(events) == 2
+    assert seen == [("error", None), ("any", None), ("any", "transaction")]
+
+    # processors removed from the list do not run anymore
+    del seen[:]
+    capture_message("hello")
+    assert not seen
+
+
+def test_removed_global_event_processors_are_forgotten(sentry_init):
+    sentry_init()
+
+    def error_processor(event, hint):
+        return event
+
+    add_global_event_processor(error_processor, event_types=("error",))
+    processor_ref = weakref.ref(error_processor)
+    global_event_processors.remove(error_processor)
+    del error_processor
+
+    capture_message("hello")
+    gc.collect()
+    assert processor_ref() is None
+
+
 @pytest.mark.parametrize(
     "installed_integrations, expected_name",
     [
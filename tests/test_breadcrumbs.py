@@ -0,0 +1,104 @@
+import copy
+from datetime import datetime
+
+import pytest
+
+from sentry_sdk.breadcrumbs import BreadcrumbBuffer, DeferredValue
+
+
+def test_keeps_the_latest_breadcrumbs():
+    breadcrumbs = BreadcrumbBuffer(maxlen=3)
+    assert not breadcrumbs
+
+    for i in range(5):
+        breadcrumbs.append({"message": str(i)})
+
+    assert len(breadcrumbs) == 3
+    assert [crumb["message"] for crumb in breadcrumbs] == ["2", "3", "4"]
+
+    breadcrumbs.clear()
+    assert not breadcrumbs
+    assert list(breadcrumbs) == []
+
+
+def test_completes_breadcrumbs_when_read():
+    breadcrumbs = BreadcrumbBuffer()
+    crumb = {"message": "hello"}
+    breadcrumbs.append(crumb, timestamp=0.0)
+    breadcrumbs.append({"message": "done", "timestamp": "now", "type": "http"}, 0.0)
+    breadcrumbs.append({"message": "as is"})
+
+    # nothing happens until the breadcrumbs are read
+    assert crumb == {"message": "hello"}
+
+    first, second, third = breadcrumbs
+    # scopes share the stored breadcrumb, so it is completed in a copy
+    assert crumb == {"message": "hello"}
+    assert first["message"] == "hello"
+    assert first["type"] == "default"
+    assert isinstance(first["timestamp"], datetime)
+    assert first["timestamp"].year == 1970
+    assert second == {"message": "done", "timestamp": "now", "type": "http"}
+    assert third == {"message": "as is"}
+
+
+def test_resize():
+    breadcrumbs = BreadcrumbBuffer(maxlen=4)
+    for i in range(6):
+        breadcrumbs.append({"message": str(i)})
+
+    breadcrumbs.resize(2)
+    assert [crumb["message"] for crumb in breadcrumbs] == ["4", "5"]
+
+    breadcrumbs.resize(3)
+    breadcrumbs.append({"message": "6"})
+    breadcrumbs.append({"message": "7"})
+    assert [crumb["message"] for crumb in breadcrumbs] == ["5", "6", "7"]
+
+    breadcrumbs.resize(0)
+    breadcrumbs.append({"message": "8"})
+    assert not breadcrumbs
+
+
+def test_copy_and_extend():
+    breadcrumbs = BreadcrumbBuffer(maxlen=3)
+    breadcrumbs.append({"message": "a"}, timestamp=0.0)
+    breadcrumbs.append({"message": "b"})
+
+    other = copy.copy(breadcrumbs)
+    other.append({"message": "c"})
+    other.append({"message": "d"})
+    assert [crumb["message"] for crumb in breadcrumbs] == ["a", "b"]
+    assert [crumb["message"] for crumb in other] == ["b", "c", "d"]
+
+    breadcrumbs.extend(other)
+    breadcrumbs.extend([{"message": "e"}])
+    assert [crumb["message"] for crumb in breadcrumbs] == ["c", "d", "e"]
+
+
+@pytest.mark.tests_internal_exceptions
+def test_resolves_deferred_values_when_read():
+    calls = []
+
+    def format_message(msg, arg):
+        calls.append(arg)
+        return msg % arg
+
+    def fail():
+        raise ValueError("broken")
+
+    breadcrumbs = BreadcrumbBuffer()
+    breadcrumbs.append(
+        {"message": DeferredValue(format_message, "hello %s", "world")}, 0.0
+    )
+    breadcrumbs.append({"message": "ok", "data": DeferredValue(fail)}, 0.0)
+    assert calls == []
+
+    first, second = breadcrumbs
+    assert first["message"] == "hello world"
+    assert second["data"] is None
+    assert calls == ["world"]
+
+    # the stored breadcrumbs keep their deferred values
+    list(breadcrumbs)
+    assert calls == ["world", "world"]
@@ -7,6 +7,7 @@ import sys
 import time
 from textwrap import dedent
 
+import sentry_sdk.client
 from sentry_sdk import (
     Hub,
     Client,
@@ -22,7 +23,7 @@ from sentry_sdk.integrations.executing import ExecutingIntegration
 from sentry_sdk.transport import Transport
 from sentry_sdk._compat import text_type, PY2
 from sentry_sdk.utils import HAS_CHAINED_EXCEPTIONS
-from sentry_sdk.utils import logger
+from sentry_sdk.utils import logger, _get_installed_modules
 from sentry_sdk.serializer import MAX_DATABAG_BREADTH
 from sentry_sdk.consts import DEFAULT_MAX_BREADCRUMBS, DEFAULT_MAX_VALUE_LENGTH
 from sentry_sdk._types import TYPE_CHECKING
@@ -791,6 +792,34 @@ def test_databag_string_stripping(sentry_init, capture_events, benchmark):
         assert len(json.dumps(event)) < 10000
 
 
+def test_frame_vars_breadth_stripping(sentry_init, capture_events):
+    sentry_init()
+    events = capture_events()
+
+    namespace = {}
+    exec(
+        "def many_locals():\n"
+        + "".join("    v{} = {}\n".format(i, i) for i in range(MAX_DATABAG_BREADTH + 5))
+        + "    1 / 0\n",
+        namespace,
+    )
+
+    try:
+        namespace["many_locals"]()
+    except Exception:
+        capture_exception()
+
+    (event,) = events
+    frame = event["exception"]["values"][0]["stacktrace"]["frames"][-1]
+    assert frame["function"] == "many_locals"
+    assert frame["vars"] == {
+        "v{}".format(i): "{}".format(i) for i in range(MAX_DATABAG_BREADTH)
+    }
+
+    meta = event["_meta"]["exception"]["values"]["0"]["stacktrace"]["frames"]
+    assert meta["1"]["vars"] == {"": {"len": MAX_DATABAG_BREADTH + 5}}
+
+
 def test_databag_breadth_stripping(sentry_init, capture_events, benchmark):
     sentry_init()
     events = capture_events()
@@ -1105,6 +1134,100 @@ def test_sending_events_with_no_tracing():
     assert not events
 
 
+@pytest.mark.parametrize("before_send", (None, lambda event, hint: event))
+def test_events_are_serialized_to_json_without_before_send(before_send):
+    envelopes = []
+    seen_by_before_send = []
+
+    class CustomTransport(Transport):
+        def capture_envelope(self, envelope):
+            envelopes.append(envelope)
+
+    def wrapped_before_send(event, hint):
+        seen_by_before_send.append(event)
+        return before_send(event, hint)
+
+    client = Client(
+        enable_tracing=True,
+        transport=CustomTransport(),
+        before_send=wrapped_before_send if before_send else None,
+    )
+    with Hub(client):
+        capture_message("hello", extras={"foo": "x" * 2000})
+
+    (envelope,) = envelopes
+    (item,) = envelope.items
+    if before_send is None:
+        # written straight to JSON, parsed again only on demand
+        assert item.payload.bytes is not None
+        assert not seen_by_before_send
+    else:
+        assert isinstance(seen_by_before_send[0], dict)
+
+    event = item.get_event()
+    assert event["message"] == "hello"
+    assert len(event["extra"]["foo"]) == DEFAULT_MAX_VALUE_LENGTH
+    assert event["_meta"]["extra"]["foo"][""]["len"] == 2000
+    assert "_meta" in json.loads(item.get_bytes())
+
+
+def test_static_fragments_are_encoded_once(monkeypatch):
+    envelopes = []
+
+    class CustomTransport(Transport):
+        def capture_envelope(self, envelope):
+            envelopes.append(envelope)
+
+    client = Client(
+        release="1.0",
+        environment="production",
+        server_name="web-1",
+        enable_tracing=True,
+        transport=CustomTransport(),
+    )
+
+    encode = mock.Mock(wraps=sentry_sdk.client.encode_static_fragments)
+    monkeypatch.setattr(sentry_sdk.client, "encode_static_fragments", encode)
+
+    with Hub(client):
+        capture_message("one")
+        capture_message("two")
+
+    assert encode.call_count == 1
+    (fragments,) = encode.call_args[0]
+    assert sorted(fragments) == [
+        "environment",
+        "modules",
+        "platform",
+        "release",
+        "sdk",
+        "server_name",
+    ]
+
+    for envelope in envelopes:
+        event = envelope.get_event()
+        assert event["release"] == "1.0"
+        assert event["environment"] == "production"
+        assert event["server_name"] == "web-1"
+        assert event["platform"] == "python"
+        assert event["sdk"] == client._get_sdk_info()
+        assert event["modules"] == _get_installed_modules()
+
+
+@pytest.mark.parametrize("enable_tracing", (False, True))
+def test_max_event_bytes(sentry_init, capture_envelopes, enable_tracing):
+    sentry_init(enable_tracing=enable_tracing, _experiments={"max_event_bytes": 10000})
+    envelopes = capture_envelopes()
+
+    capture_message("small", extras={"foo": "bar"})
+    capture_message("big", extras={"foo%s" % i: "x" * 1000 for i in range(10)})
+
+    small, big = [envelope.get_event() for envelope in envelopes]
+    assert small["extra"]["foo"] == "bar"
+    assert big["extra"] is None
+    assert big["_meta"]["extra"] == {"": {"rem": [["!limit", "x"]]}}
+
+
 @pytest.mark.parametrize(
     "sdk_options, expected_breadcrumbs",
     [({}, DEFAULT_MAX_BREADCRUMBS), ({"max_breadcrumbs": 50}, 50)],
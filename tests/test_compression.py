@@ -0,0 +1,47 @@
+import zlib
+
+import pytest
+
+from sentry_sdk.compression import (
+    DeflateCodec,
+    GzipCodec,
+    available_codecs,
+    get_codec,
+)
+
+DATA = b'{"message": "hello world", "extra": {"foo": "bar"}}' * 100
+
+
+@pytest.mark.parametrize(
+    "codec,decompress",
+    [
+        (GzipCodec(), lambda data: zlib.decompress(data, 16 + zlib.MAX_WBITS)),
+        (DeflateCodec(), zlib.decompress),
+    ],
+)
+def test_zlib_codecs_roundtrip(codec, decompress):
+    assert decompress(codec.compress(DATA)) == DATA
+    assert (
+        decompress(b"".join(codec.compress_chunks([DATA[:10], DATA[10:]], 1))) == DATA
+    )
+
+
+def test_zstd_codec_roundtrip():
+    zstandard = pytest.importorskip("zstandard")
+    codec = get_codec("zstd")
+    decompressor = zstandard.ZstdDecompressor()
+    assert decompressor.decompressobj().decompress(codec.compress(DATA)) == DATA
+
+
+def test_brotli_codec_roundtrip():
+    brotli = pytest.importorskip("brotli")
+    codec = get_codec("br")
+    assert brotli.decompress(codec.compress(DATA)) == DATA
+
+
+def test_get_codec_picks_first_available():
+    assert get_codec("gzip").name == "gzip"
+    assert get_codec(["unknown", "deflate", "gzip"]).name == "deflate"
+    assert get_codec(["unknown"]) is None
+    assert "gzip" in available_codecs()
+    assert "deflate" in available_codecs()
@@ -1,7 +1,23 @@
-from sentry_sdk.envelope import Envelope
+import io
+import mmap
+import socket
+import zlib
+
+import pytest
+
+from sentry_sdk.envelope import (
+    STREAM_CHUNK_SIZE,
+    Envelope,
+    EnvelopeReader,
+    Item,
+    PayloadRef,
+)
+from sentry_sdk.compression import GzipCodec
+from sentry_sdk.transport import EnvelopeBody
 from sentry_sdk.session import Session
 from sentry_sdk import capture_event
 import sentry_sdk.client
+import sentry_sdk.envelope
 
 
 def generate_transaction_item():
@@ -241,3 +257,170 @@ def test_envelope_without_headers():
 
     assert len(items) == 1
     assert items[0].payload.get_bytes() == b'{"started": "2020-02-07T14:16:00Z"}'
+
+
+def test_serialize_iter_streams_file_payloads(tmpdir):
+    attachment = tmpdir.join("attachment.bin")
+    data = b"x" * (STREAM_CHUNK_SIZE * 2 + 10)
+    attachment.write_binary(data)
+
+    envelope = Envelope(headers={"event_id": "1"})
+    envelope.add_item(Item(PayloadRef(path=str(attachment)), type="attachment"))
+
+    chunks = list(envelope.serialize_iter())
+
+    # the file is neither read at once nor cached on the payload
+    assert max(len(chunk) for chunk in chunks) == STREAM_CHUNK_SIZE
+    assert envelope.items[0].payload.bytes is None
+
+    parsed = Envelope.deserialize(b"".join(chunks))
+    assert parsed.items[0].get_bytes() == data
+    assert parsed.items[0].headers["length"] == len(data)
+
+
+def test_envelope_get_size(tmpdir):
+    attachment = tmpdir.join("attachment.bin")
+    attachment.write_binary(b"x" * 1000)
+
+    envelope = Envelope(headers={"event_id": "1"})
+    envelope.add_event({"message": "hello"})
+    envelope.add_item(Item(PayloadRef(path=str(attachment)), type="attachment"))
+    assert envelope.get_size() == len(envelope.serialize())
+
+    # the attachment was never read to figure out its size
+    assert envelope.items[1].payload.bytes is None
+
+    envelope.add_session({"sid": "1", "status": "ok"})
+    assert envelope.get_size() == len(envelope.serialize())
+
+
+def test_envelope_body_is_gzip_compressed_incrementally():
+    envelope = Envelope(headers={"event_id": "1"})
+    envelope.add_event({"message": "hello", "extra": {"x": "y" * 100000}})
+
+    body = EnvelopeBody(envelope, codec=GzipCodec(), level=9)
+    chunks = list(body)
+
+    assert (
+        zlib.decompress(b"".join(chunks), 16 + zlib.MAX_WBITS) == envelope.serialize()
+    )
+    # the body can be iterated again, e.g. on retries
+    assert b"".join(body) == b"".join(chunks)
+    assert EnvelopeBody(envelope).getvalue() == envelope.serialize()
+
+
+def _make_envelope_bytes():
+    envelope = Envelope(headers={"event_id": "9ec79c33ec9942ab8353589fcb2e04dc"})
+    envelope.add_event({"message": "hello", "level": "error"})
+    envelope.add_item(Item(payload=b"\x00\x01binary\n", type="attachment"))
+    envelope.add_session({"sid": "abc", "status": "ok"})
+    return envelope.serialize()
+
+
+def _check_items(items):
+    event, attachment, session = items
+    assert event.get_event() == {"message": "hello", "level": "error"}
+    assert attachment.type == "attachment"
+    assert attachment.get_bytes() == b"\x00\x01binary\n"
+    assert session.type == "session"
+    assert session.payload.json is None
+    assert session.get_bytes() == b'{"sid":"abc","status":"ok"}'
+
+
+@pytest.mark.parametrize("source", ["bytes", "bytearray", "file", "mmap", "socket"])
+def test_envelope_reader(tmpdir, source):
+    data = _make_envelope_bytes()
+
+    if source == "bytes":
+        reader = EnvelopeReader(data)
+    elif source == "bytearray":
+        reader = EnvelopeReader(bytearray(data))
+    elif source in ("file", "mmap"):
+        path = str(tmpdir.join("envelope"))
+        with open(path, "wb") as f:
+            f.write(data)
+        f = open(path, "rb")
+        if source == "mmap":
+            f = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        reader = EnvelopeReader(f)
+    else:
+        sender, receiver = socket.socketpair()
+        sender.sendall(data)
+        sender.close()
+        reader = EnvelopeReader(receiver.makefile("rb"))
+
+    assert reader.headers == {"event_id": "9ec79c33ec9942ab8353589fcb2e04dc"}
+
+    items = list(reader)
+    if source in ("bytes", "bytearray", "mmap"):
+        # payloads are views of the buffer until they are needed as bytes
+        for item in items:
+            assert item.payload.view.obj is reader._buffer
+
+    _check_items(items)
+    assert Envelope(headers=reader.headers, items=items).serialize() == data
+
+    if source == "mmap":
+        # the mmap can only be closed once nothing refers to it anymore
+        del items, item, reader
+        f.close()
+
+
+def test_envelope_reader_is_lazy(monkeypatch):
+    parsed = []
+    parse_json = sentry_sdk.envelope.parse_json
+
+    def counting_parse_json(data):
+        parsed.append(data)
+        return parse_json(data)
+
+    monkeypatch.setattr(sentry_sdk.envelope, "parse_json", counting_parse_json)
+
+    data = _make_envelope_bytes()
+    reader = EnvelopeReader(io.BytesIO(data + b"not json\n"))
+    items = iter(reader)
+
+    # only the headers
+    assert len(parsed) == 1
+    event = next(items)
+    assert len(parsed) == 2
+    assert event.get_event()["message"] == "hello"
+    assert len(parsed) == 3
+
+    next(items)
+    next(items)
+    # the broken item is only read once it is asked for
+    with pytest.raises(ValueError):
+        next(items)
+
+
+def test_changes_to_serialized_json_payloads_are_sent():
+    envelope = Envelope()
+    envelope.add_event(b'{"message": "hello"}')
+    envelope.get_event()["message"] = "changed"
+    envelope.add_transaction(b'{"transaction": "a"}')
+    envelope.items[1].payload.json = {"transaction": "b"}
+
+    event, transaction = EnvelopeReader(envelope.serialize())
+    assert event.get_event() == {"message": "changed"}
+    assert transaction.get_transaction_event() == {"transaction": "b"}
+
+
+def test_changes_to_read_payloads_are_sent():
+    envelope = Envelope()
+    envelope.add_event({"message": "hello"})
+    envelope.add_transaction({"transaction": "a"})
+    envelope.add_item(Item(b"short", type="attachment"))
+
+    event, transaction, attachment = EnvelopeReader(envelope.serialize())
+    event.get_event()["message"] = "changed"
+    transaction.payload.json = {"transaction": "b"}
+    attachment.payload.bytes = b"a lot longer"
+    assert attachment.payload.get_size() == len(b"a lot longer")
+
+    event, transaction, attachment = EnvelopeReader(
+        Envelope(items=[event, transaction, attachment]).serialize()
+    )
+    assert event.get_event() == {"message": "changed"}
+    assert transaction.get_transaction_event() == {"transaction": "b"}
+    assert attachment.get_bytes() == b"a lot longer"
@@ -1,8 +1,9 @@
 import copy
 import os
 import pytest
-from sentry_sdk import capture_exception
+from sentry_sdk import Client, capture_exception
 from sentry_sdk.scope import Scope
+from sentry_sdk.tracing import Transaction
 
 try:
     from unittest import mock  # python 3.3 and above
@@ -25,6 +26,63 @@ def test_copying():
     assert s1._fingerprint is s2._fingerprint
 
 
+def test_copies_share_containers_until_modified():
+    client = mock.Mock(options={"before_breadcrumb": None, "max_breadcrumbs": 100})
+    s1 = Scope()
+    s1.set_tag("foo", "bar")
+    s1.add_breadcrumb({"message": "first"}, client=client)
+
+    s2 = copy.copy(s1)
+    assert s2._tags is s1._tags
+    assert s2._breadcrumbs is s1._breadcrumbs
+    assert s2._event_processors is s1._event_processors
+
+    s2.set_tag("bam", "baz")
+    s2.add_breadcrumb({"message": "second"}, client=client)
+    assert s1._tags == {"foo": "bar"}
+    assert s2._tags == {"foo": "bar", "bam": "baz"}
+    assert [crumb["message"] for crumb in s1._breadcrumbs] == ["first"]
+    assert [crumb["message"] for crumb in s2._breadcrumbs] == ["first", "second"]
+
+    # the original has to copy the containers it shares as well
+    s1.set_extra("k", "v")
+    s1.add_event_processor(lambda event, hint: event)
+    s1.add_attachment(bytes=b"hello", filename="hello.txt")
+    assert s1._extras == {"k": "v"}
+    assert s2._extras == {}
+    assert len(s1._event_processors) == 1
+    assert not s2._event_processors
+    assert not s2._attachments
+
+    # containers that were copied once are modified in place
+    tags = s2._tags
+    s2.remove_tag("foo")
+    assert s2._tags is tags
+
+    s1.clear()
+    assert s2._tags == {"bam": "baz"}
+    assert len(s2._breadcrumbs) == 2
+
+
+def test_span_setter_does_not_change_shared_transaction_info():
+    s1 = Scope()
+    s2 = copy.copy(s1)
+
+    s2.span = Transaction(name="foo", source="route")
+    assert s2._transaction_info == {"source": "route"}
+    assert s1._transaction_info == {}
+
+
+def test_applied_transaction_info_does_not_change_with_the_scope():
+    scope = Scope()
+    scope.set_transaction_name("foo", source="route")
+    event = scope.apply_to_event({}, {})
+
+    scope.set_transaction_name("bar", source="url")
+    copy.copy(scope).set_transaction_name("baz", source="view")
+    assert event["transaction_info"] == {"source": "route"}
+
+
 def test_merging(sentry_init, capture_events):
     sentry_init()
 
@@ -157,3 +215,54 @@ def test_load_trace_data_from_env(env, excepted_value):
         s = Scope()
         incoming_trace_data = s._load_trace_data_from_env()
         assert incoming_trace_data == excepted_value
+
+
+def test_apply_plan_is_cached_until_the_scope_changes():
+    scope = Scope()
+    scope.set_tag("foo", "bar")
+
+    event = scope.apply_to_event({}, {})
+    assert event["tags"] == {"foo": "bar"}
+    assert "level" not in event and "extra" not in event
+    plan = scope._apply_plan
+    assert plan is not None
+
+    scope.apply_to_event({}, {})
+    assert scope._apply_plan is plan
+
+    # breadcrumbs and the like are not part of the plan
+    scope.add_breadcrumb({"message": "hello"}, client=Client())
+    scope.add_event_processor(lambda event, hint: event)
+    scope.add_attachment(bytes=b"hello", filename="hello.txt")
+    assert scope._apply_plan is plan
+
+    scope.set_level("warning")
+    scope.set_extra("k", "v")
+    assert scope._apply_plan is None
+    event = scope.apply_to_event({}, {})
+    assert event["level"] == "warning"
+    assert event["extra"] == {"k": "v"}
+
+    scope.clear()
+    event = scope.apply_to_event({}, {})
+    assert "tags" not in event and "level" not in event
+
+
+def test_apply_plan_merges_tags_and_extra_once():
+    scope = Scope()
+    scope.set_tag("foo", "bar")
+    scope.set_extra("k", "v")
+
+    first = scope.apply_to_event({}, {})
+    second = scope.apply_to_event({"tags": {"own": "tag", "foo": "baz"}}, {})
+    assert first["tags"] == {"foo": "bar"}
+    assert first["extra"] == {"k": "v"}
+    assert second["tags"] == {"own": "tag", "foo": "bar"}
+
+    # every event gets its own dicts
+    first["tags"]["changed"] = "yes"
+    assert scope.apply_to_event({}, {})["tags"] == {"foo": "bar"}
+    assert scope._tags == {"foo": "bar"}
+
+    scope.set_tag("foo", "qux")
+    assert scope.apply_to_event({}, {})["tags"] == {"foo": "qux"}
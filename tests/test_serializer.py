@@ -1,8 +1,25 @@
+import json
 import re
 import sys
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
 import pytest
 
-from sentry_sdk.serializer import MAX_DATABAG_BREADTH, MAX_DATABAG_DEPTH, serialize
+from sentry_sdk.serializer import (
+    MAX_DATABAG_BREADTH,
+    MAX_DATABAG_DEPTH,
+    _ROOT_PATH_STATE,
+    _get_type_kind,
+    _classify_type,
+    _type_kinds,
+    MAX_TYPE_KIND_CACHE_SIZE,
+    encode_static_fragments,
+    serialize,
+    serialize_to_json,
+)
+from sentry_sdk import serializer as serializer_module
+from sentry_sdk.utils import json_dumps
 
 try:
     from hypothesis import given
@@ -161,3 +178,406 @@ def test_max_value_length(body_normalizer):
     result = body_normalizer(data, max_value_length=max_value_length)
 
     assert len(result["key"]) == max_value_length
+
+
+class Unrepresentable(object):
+    def __repr__(self):
+        raise ValueError("no")
+
+
+@pytest.mark.parametrize(
+    "event",
+    [
+        {},
+        {"message": "hello", "level": "error", "extra": {}},
+        {"extra": {"foo": list(range(20)), "bar": {"a": {"b": {"c": {"d": 1}}}}}},
+        {"extra": {"foo": "\xe9\u4e2d", "bytes": b"abc", "none": None}},
+        {"extra": {"foo": [1.5, True, False, 10**20, {1, 2}]}},
+        {"extra": {"foo": float("inf"), "bar": Unrepresentable()}},
+        {"extra": {1: "a", "1": "b", "2": {2: "c", "2": "d", "3": "e"}}},
+        {"request": {"data": "x" * 2000}},
+        {
+            "exception": {
+                "values": [
+                    {
+                        "stacktrace": {
+                            "frames": [{"vars": {"a": "b", "c": 1, "d": [1, "x"]}}]
+                        }
+                    }
+                ]
+            }
+        },
+    ],
+)
+def test_serialize_to_json(event):
+    assert serialize_to_json(event) == json_dumps(serialize(event))
+
+
+def test_serialize_to_json_cycles():
+    foo = {}
+    foo["foo"] = foo
+    assert serialize_to_json({"extra": foo}) == json_dumps(serialize({"extra": foo}))
+
+
+def _legacy_should_repr_strings(path):
+    try:
+        p0 = path[0]
+        if p0 == "stacktrace" and path[1] == "frames" and path[3] == "vars":
+            return True
+
+        if (
+            p0 in ("threads", "exception")
+            and path[1] == "values"
+            and path[3] == "stacktrace"
+            and path[4] == "frames"
+            and path[6] == "vars"
+        ):
+            return True
+    except IndexError:
+        return None
+
+    return False
+
+
+def _legacy_is_request_body(path):
+    try:
+        if path[0] == "request" and path[1] == "data":
+            return True
+    except IndexError:
+        return None
+
+    return False
+
+
+def _legacy_is_databag(path):
+    try:
+        rv = _legacy_should_repr_strings(path)
+        if rv in (True, None):
+            return rv
+
+        rv = _legacy_is_request_body(path)
+        if rv in (True, None):
+            return rv
+
+        p0 = path[0]
+        if p0 == "breadcrumbs" and path[1] == "values":
+            path[2]
+            return True
+
+        if p0 == "extra":
+            return True
+
+    except IndexError:
+        return None
+
+    return False
+
+
+def _legacy_path_verdicts(path):
+    """How the serializer used to classify nodes by inspecting their path."""
+    return (
+        _legacy_should_repr_strings(path),
+        _legacy_is_databag(path),
+        _legacy_is_request_body(path),
+    )
+
+
+def _make_deep_exception_event():
+    frames = [
+        {
+            "function": "f%s" % i,
+            "vars": {"a": i, "b": [1, 2, {"c": "d"}], "e": {"f": {"g": "h"}}},
+        }
+        for i in range(30)
+    ]
+    return {
+        "exception": {"values": [{"stacktrace": {"frames": frames}}]},
+        "threads": {"values": [{"stacktrace": {"frames": frames}}]},
+        "stacktrace": {"frames": frames},
+        "breadcrumbs": {"values": [{"data": {"foo": [1, 2]}}] * 20},
+        "request": {"data": {"foo": {"bar": "baz"}}, "headers": {"a": "b"}},
+        "extra": {"foo": {"bar": [1, 2, 3]}},
+        "contexts": {"trace": {"op": "foo"}},
+    }
+
+
+def _collect_paths(obj, path=()):
+    yield path
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            for p in _collect_paths(v, path + (k,)):
+                yield p
+    elif isinstance(obj, list):
+        for i, v in enumerate(obj):
+            for p in _collect_paths(v, path + (i,)):
+                yield p
+
+
+def _path_state_verdicts(path):
+    state = _ROOT_PATH_STATE
+    for segment in path:
+        state = state.next(segment)
+    return state.should_repr_strings, state.is_databag, state.is_request_body
+
+
+def test_path_states_match_path_inspection():
+    paths = list(_collect_paths(_make_deep_exception_event()))
+    paths += [
+        ("stacktrace", "frames"),
+        ("exception", "values", 0, "stacktrace", "frames", 0, "other"),
+        ("breadcrumbs", "other"),
+        ("request", "other", "data"),
+        ("threads", "other"),
+    ]
+
+    for path in paths:
+        assert _path_state_verdicts(path) == _legacy_path_verdicts(list(path)), path
+
+
+def test_type_dispatch_handles_subclasses(extra_normalizer):
+    class MyInt(int):
+        pass
+
+    class MyList(list):
+        pass
+
+    Point = namedtuple("Point", ["x", "y"])
+
+    assert extra_normalizer(MyInt(3)) == 3
+    assert extra_normalizer(MyList([1, 2])) == [1, 2]
+    assert extra_normalizer(Point(1, 2)) == [1, 2]
+    assert extra_normalizer(OrderedDict([("a", 1)])) == {"a": 1}
+    assert extra_normalizer(datetime(2020, 1, 1)) == "2020-01-01T00:00:00.000000Z"
+    assert extra_normalizer(bytearray(b"abc")) == "abc"
+
+
+def test_type_dispatch_prefers_sentry_repr(extra_normalizer):
+    class Foo(dict):
+        def __sentry_repr__(self):
+            return "custom"
+
+    assert extra_normalizer(Foo(a=1)) == "custom"
+
+
+def test_type_kind_cache_is_bounded():
+    for _ in range(MAX_TYPE_KIND_CACHE_SIZE + 1):
+        _get_type_kind(type("Foo", (object,), {}))
+
+    assert len(_type_kinds) <= MAX_TYPE_KIND_CACHE_SIZE
+    assert _get_type_kind(dict) == _classify_type(dict)
+
+
+def test_reprs_are_memoized_per_event(monkeypatch):
+    calls = []
+
+    def safe_repr(value):
+        calls.append(value)
+        return repr(value)
+
+    monkeypatch.setattr(serializer_module, "safe_repr", safe_repr)
+
+    frame_vars = {"a": "foo", "b": "foo", "c": 1, "d": True, "e": 0.0, "f": -0.0}
+    event = {
+        "stacktrace": {"frames": [{"vars": frame_vars}, {"vars": dict(frame_vars)}]}
+    }
+
+    result = serialize(event)
+    for frame in result["stacktrace"]["frames"]:
+        assert frame["vars"] == {
+            "a": "'foo'",
+            "b": "'foo'",
+            "c": "1",
+            "d": "True",
+            "e": "0.0",
+            "f": "-0.0",
+        }
+
+    # floats are only memoized per object, both frames share them here
+    assert sorted(map(repr, calls)) == sorted(["'foo'", "1", "True", "0.0", "-0.0"])
+
+    del calls[:]
+    serialize(event)
+    assert len(calls) == 5
+
+
+def test_reprs_of_the_same_object_are_memoized(monkeypatch):
+    calls = []
+
+    def safe_repr(value):
+        calls.append(value)
+        return repr(value)
+
+    monkeypatch.setattr(serializer_module, "safe_repr", safe_repr)
+
+    class Foo(object):
+        def __repr__(self):
+            return "<Foo>"
+
+    foo = Foo()
+    frames = [{"vars": {"self": foo, "other": Foo()}} for _ in range(3)]
+    result = serialize({"stacktrace": {"frames": frames}})
+
+    assert [frame["vars"]["self"] for frame in result["stacktrace"]["frames"]] == [
+        "<Foo>"
+    ] * 3
+    assert len([value for value in calls if value is foo]) == 1
+    assert len(calls) == 4
+
+
+def _make_budget_event():
+    return {
+        "message": "hi",
+        "exception": {
+            "values": [
+                {
+                    "stacktrace": {
+                        "frames": [
+                            {"function": "outer", "vars": {"a": "x" * 100}},
+                            {"function": "inner", "vars": {"b": "y" * 100}},
+                        ]
+                    }
+                }
+            ]
+        },
+        "breadcrumbs": {"values": [{"message": "crumb", "data": {"c": "z" * 100}}]},
+        "extra": {"d": "w" * 100},
+    }
+
+
+@pytest.mark.parametrize("to_json", [False, True])
+@pytest.mark.parametrize(
+    "extra_bytes,kept",
+    [
+        (10000, ["extra", "breadcrumb", "inner", "outer"]),
+        (320, ["extra", "breadcrumb", "inner"]),
+        (210, ["extra", "breadcrumb"]),
+        (110, ["extra"]),
+        (0, []),
+    ],
+)
+def test_byte_budget_trims_in_priority_order(to_json, extra_bytes, kept):
+    event = _make_budget_event()
+    untrimmed = serialize(event)
+
+    # the size of the event without any of the trimmable data
+    skeleton = serialize(event)
+    for frame in skeleton["exception"]["values"][0]["stacktrace"]["frames"]:
+        frame["vars"] = None
+    skeleton["breadcrumbs"]["values"][0]["data"] = None
+    skeleton["extra"] = None
+    max_event_bytes = len(json_dumps(skeleton)) + extra_bytes
+
+    if to_json:
+        data = serialize_to_json(event, max_event_bytes=max_event_bytes)
+        result = json.loads(data.decode("utf-8"))
+        assert data == json_dumps(serialize(event, max_event_bytes=max_event_bytes))
+    else:
+        result = serialize(event, max_event_bytes=max_event_bytes)
+
+    meta = result.pop("_meta", {})
+    assert len(json_dumps(result)) <= max_event_bytes
+
+    outer, inner = result["exception"]["values"][0]["stacktrace"]["frames"]
+    frames_meta = (
+        meta.get("exception", {})
+        .get("values", {})
+        .get("0", {})
+        .get("stacktrace", {})
+        .get("frames", {})
+    )
+    removed = {"": {"rem": [["!limit", "x"]]}}
+    for name, value, value_meta, expected in [
+        (
+            "outer",
+            outer["vars"],
+            frames_meta.get("0", {}).get("vars"),
+            {"a": "'%s'" % ("x" * 100)},
+        ),
+        (
+            "inner",
+            inner["vars"],
+            frames_meta.get("1", {}).get("vars"),
+            {"b": "'%s'" % ("y" * 100)},
+        ),
+        (
+            "breadcrumb",
+            result["breadcrumbs"]["values"][0]["data"],
+            meta.get("breadcrumbs", {}).get("values", {}).get("0", {}).get("data"),
+            {"c": "z" * 100},
+        ),
+        ("extra", result["extra"], meta.get("extra"), {"d": "w" * 100}),
+    ]:
+        if name in kept:
+            assert value == expected
+            assert value_meta is None
+        else:
+            assert value is None
+            assert value_meta == removed
+
+    if extra_bytes == 10000:
+        assert result == untrimmed
+
+
+@pytest.mark.parametrize("max_event_bytes", range(200, 3000, 100))
+def test_byte_budget_trims_the_same_nodes_in_both_paths(max_event_bytes):
+    event = _make_budget_event()
+    event["breadcrumbs"]["values"] *= 10
+    event["extra"][1] = "\u00e9" * 30
+    # e.g. an event that has been serialized once before
+    event["_meta"] = {"message": {"": {"len": 2}}}
+
+    assert serialize_to_json(event, max_event_bytes=max_event_bytes) == json_dumps(
+        serialize(event, max_event_bytes=max_event_bytes)
+    )
+
+
+def test_byte_budget_forgets_meta_of_removed_nodes():
+    event = {"extra": {"foo": "x" * 2000}}
+
+    result = serialize(event, max_event_bytes=100)
+    assert result["extra"] is None
+    assert result["_meta"] == {"extra": {"": {"rem": [["!limit", "x"]]}}}
+
+    result = serialize(event, max_event_bytes=10000)
+    assert result["_meta"] == {
+        "extra": {"foo": {"": {"len": 2000, "rem": [["!limit", "x", 1021, 1024]]}}}
+    }
+
+
+def test_static_fragments_are_spliced_in():
+    modules = {"foo": "1.0", "bar": "2.0"}
+    fragments = encode_static_fragments(
+        {
+            "modules": modules,
+            "sdk": {"name": "sentry.python", "integrations": ["a", "b"]},
+            "release": "x" * 2000,
+        },
+        max_value_length=100,
+    )
+    # too long, would need _meta
+    assert "release" not in fragments
+    assert fragments["modules"] == (modules, '{"foo":"1.0","bar":"2.0"}')
+
+    fragments["modules"] = (modules, '"spliced"')
+    event = {
+        "message": "hi",
+        "modules": modules,
+        "sdk": {"name": "sentry.python", "integrations": ["a", "b"]},
+        "extra": {"modules": modules},
+    }
+    data = serialize_to_json(event, static_fragments=fragments, max_value_length=100)
+
+    result = json.loads(data.decode("utf-8"))
+    # only top level values are spliced in, equal values are too
+    assert result["modules"] == "spliced"
+    assert result["extra"]["modules"] == modules
+    assert result["sdk"] == event["sdk"]
+
+    # other values are serialized as usual
+    event["modules"] = {"foo": "1.0"}
+    event["sdk"] = {"name": "sentry.python", "integrations": [True, "b"]}
+    data = serialize_to_json(event, static_fragments=fragments, max_value_length=100)
+    assert data == json_dumps(serialize(event, max_value_length=100))
+
+    # dicts don't have encoded values to splice in
+    assert serialize(event, static_fragments=fragments)["modules"] == {"foo": "1.0"}
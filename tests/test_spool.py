@@ -0,0 +1,174 @@
+import os
+
+import pytest
+
+from sentry_sdk.envelope import Envelope, parse_json
+from sentry_sdk.spool import EnvelopeSpool
+
+
+def make_envelope(sid):
+    envelope = Envelope()
+    envelope.add_session({"sid": sid, "status": "ok"})
+    return envelope
+
+
+def get_sids(envelopes):
+    return [parse_json(envelope.items[0].get_bytes())["sid"] for envelope in envelopes]
+
+
+def test_append_and_pop(tmpdir):
+    spool = EnvelopeSpool(str(tmpdir))
+    assert spool.is_empty()
+
+    spool.append(make_envelope("a"))
+    spool.append(make_envelope("b"))
+    assert not spool.is_empty()
+
+    envelopes = spool.pop()
+    assert [envelope.items[0].type for envelope in envelopes] == [
+        "session",
+        "session",
+    ]
+    assert spool.is_empty()
+    assert spool.pop() == []
+    assert not tmpdir.listdir()
+
+
+def test_segments_are_popped_oldest_first(tmpdir):
+    envelope_size = len(make_envelope("a").serialize())
+    spool = EnvelopeSpool(str(tmpdir), segment_size=envelope_size * 2 + 8)
+
+    for sid in "abcde":
+        spool.append(make_envelope(sid))
+
+    assert len(tmpdir.listdir()) == 3
+    assert get_sids(spool.pop()) == ["a", "b"]
+    assert get_sids(spool.pop()) == ["c", "d"]
+    assert get_sids(spool.pop()) == ["e"]
+
+
+def test_survives_restart(tmpdir):
+    spool = EnvelopeSpool(str(tmpdir))
+    spool.append(make_envelope("a"))
+    spool.close()
+
+    spool = EnvelopeSpool(str(tmpdir))
+    spool.append(make_envelope("b"))
+    assert get_sids(spool.pop()) == ["a"]
+    assert get_sids(spool.pop()) == ["b"]
+
+
+def test_evicts_oldest_segments(tmpdir):
+    evicted = []
+    envelope_size = len(make_envelope("a").serialize())
+    segment_size = envelope_size + 4
+    spool = EnvelopeSpool(
+        str(tmpdir),
+        max_size=segment_size * 2,
+        segment_size=segment_size,
+        on_evict=evicted.append,
+    )
+
+    for sid in "abcd":
+        spool.append(make_envelope(sid))
+
+    assert get_sids(evicted) == ["a", "b"]
+    assert spool.size <= segment_size * 2
+    assert get_sids(spool.pop()) == ["c"]
+    assert get_sids(spool.pop()) == ["d"]
+
+
+def test_spools_sharing_a_directory(tmpdir):
+    first = EnvelopeSpool(str(tmpdir))
+    second = EnvelopeSpool(str(tmpdir))
+
+    first.append(make_envelope("a"))
+    second.append(make_envelope("b"))
+    first.append(make_envelope("c"))
+    second.append(make_envelope("d"))
+
+    assert get_sids(first.pop()) == ["a", "c"]
+    assert get_sids(second.pop()) == ["b", "d"]
+
+    # segments are only handed out once, also to spools created later
+    first.append(make_envelope("e"))
+    second.append(make_envelope("f"))
+    first.close()
+    second.close()
+    third = EnvelopeSpool(str(tmpdir))
+    fourth = EnvelopeSpool(str(tmpdir))
+    popped = []
+    for _ in range(2):
+        popped += get_sids(third.pop()) + get_sids(fourth.pop())
+    assert sorted(popped) == ["e", "f"]
+    assert not tmpdir.listdir()
+
+
+def test_does_not_pop_segments_that_are_written_to(tmpdir):
+    writer = EnvelopeSpool(str(tmpdir))
+    writer.append(make_envelope("a"))
+
+    reader = EnvelopeSpool(str(tmpdir))
+    assert reader.pop() == []
+
+    writer.append(make_envelope("b"))
+    writer.close()
+    assert get_sids(reader.pop()) == ["a", "b"]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork")
+def test_forked_child_does_not_write_into_parent_segment(tmpdir):
+    spool = EnvelopeSpool(str(tmpdir))
+    spool.append(make_envelope("parent"))
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            spool.append(make_envelope("child"))
+            spool.close()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+
+    spool.append(make_envelope("parent again"))
+    spool.close()
+
+    spool = EnvelopeSpool(str(tmpdir))
+    assert get_sids(spool.pop()) == ["parent", "parent again"]
+    assert get_sids(spool.pop()) == ["child"]
+
+
+def test_segments_are_renamed_once_closed(tmpdir, monkeypatch):
+    spool = EnvelopeSpool(str(tmpdir))
+    spool.append(make_envelope("a"))
+    writer = spool._active
+    assert [path.basename for path in tmpdir.listdir()] == [
+        os.path.basename(writer.creating_path)
+    ]
+
+    renamed = []
+    rename = os.rename
+
+    def checked_rename(src, dst):
+        renamed.append((src, writer._file.closed, writer._data.closed))
+        rename(src, dst)
+
+    monkeypatch.setattr(os, "rename", checked_rename)
+    spool.close()
+
+    assert renamed == [(writer.creating_path, True, True)]
+    assert [path.basename for path in tmpdir.listdir()] == [
+        os.path.basename(writer.path)
+    ]
+
+
+def test_recovers_segments_of_dead_writers(tmpdir):
+    spool = EnvelopeSpool(str(tmpdir))
+    spool.append(make_envelope("a"))
+    # the process dies without sealing its segment
+    spool._active.detach()
+    spool._active = None
+
+    spool = EnvelopeSpool(str(tmpdir))
+    assert get_sids(spool.pop()) == ["a"]
+    assert not tmpdir.listdir()
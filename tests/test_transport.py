@@ -4,8 +4,9 @@ import pickle
 import gzip
 import io
 import socket
+import time
+import zlib
 from collections import namedtuple
-from datetime import datetime, timedelta
 
 import pytest
 from pytest_localserver.http import WSGIServer
@@ -13,8 +14,15 @@ from werkzeug.wrappers import Request, Response
 
 from sentry_sdk import Hub, Client, add_breadcrumb, capture_message, Scope
 from sentry_sdk._compat import datetime_utcnow
-from sentry_sdk.transport import KEEP_ALIVE_SOCKET_OPTIONS, _parse_rate_limits
-from sentry_sdk.envelope import Envelope, parse_json
+from sentry_sdk.transport import (
+    KEEP_ALIVE_SOCKET_OPTIONS,
+    _coalesce_envelopes,
+    _parse_rate_limits,
+    _split_envelope,
+    _RateLimits,
+)
+from sentry_sdk.attachments import Attachment
+from sentry_sdk.envelope import Envelope, Item, parse_json
 from sentry_sdk.integrations.logging import LoggingIntegration
 
 try:
@@ -49,6 +57,9 @@ class CapturingServer(WSGIServer):
         if request.headers.get("content-encoding") == "gzip":
             rdr = gzip.GzipFile(fileobj=io.BytesIO(request.data))
             compressed = True
+        elif request.headers.get("content-encoding") == "deflate":
+            rdr = io.BytesIO(zlib.decompress(request.data))
+            compressed = True
         else:
             rdr = io.BytesIO(request.data)
             compressed = False
@@ -154,6 +165,60 @@ def test_transport_num_pools(make_client, num_pools, expected_num_pools):
     assert options["num_pools"] == expected_num_pools
 
 
+def test_queue_sheds_lower_priority_envelopes(make_client, monkeypatch):
+    client = make_client(transport_queue_size=2)
+    # keep everything in the queue
+    monkeypatch.setattr(client.transport._worker, "_ensure_thread", lambda: None)
+
+    captured_outcomes = []
+
+    def record_lost_event(reason, data_category=None, item=None):
+        if data_category is None:
+            data_category = item.data_category
+        captured_outcomes.append((reason, data_category))
+
+    monkeypatch.setattr(client.transport, "record_lost_event", record_lost_event)
+
+    client.capture_event({"type": "transaction"})
+    client.capture_event({"type": "transaction"})
+    assert not captured_outcomes
+
+    client.capture_event({"message": "hello"})
+    assert captured_outcomes == [("queue_overflow", "transaction")]
+
+    client.capture_event({"message": "hello"})
+    client.capture_event({"message": "hello"})
+    assert captured_outcomes == [
+        ("queue_overflow", "transaction"),
+        ("queue_overflow", "transaction"),
+        ("queue_overflow", "error"),
+    ]
+
+    client.capture_event({"type": "transaction"})
+    assert captured_outcomes[-1] == ("queue_overflow", "transaction")
+
+
+def test_queue_lane_sizes(make_client, monkeypatch):
+    client = make_client(
+        transport_queue_size=10,
+        _experiments={"transport_queue_lane_sizes": {"metric": 1}},
+    )
+    assert client.transport._worker._queue.lane_sizes == [10, 10, 10, 1]
+
+
+@pytest.mark.parametrize("num_workers", (None, 4))
+def test_transport_num_workers(make_client, num_workers):
+    _experiments = {}
+    if num_workers is not None:
+        _experiments["transport_num_workers"] = num_workers
+
+    client = make_client(_experiments=_experiments)
+
+    expected = num_workers or 1
+    assert client.transport._worker._num_threads == expected
+    assert client.transport._get_pool_options([])["maxsize"] == expected
+
+
 def test_socket_options(make_client):
     socket_options = [
         (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
@@ -256,7 +321,7 @@ def test_transport_no_thread_on_shutdown_no_errors(capturing_server, make_client
     assert len(capturing_server.captured) == 0
 
 
-NOW = datetime(2014, 6, 2)
+NOW = 1000.0
 
 
 @pytest.mark.parametrize(
@@ -269,20 +334,20 @@ NOW = datetime(2014, 6, 2)
         (
             "42::organization, invalid, 4711:foobar;transaction;security:project",
             {
-                None: NOW + timedelta(seconds=42),
-                "transaction": NOW + timedelta(seconds=4711),
-                "security": NOW + timedelta(seconds=4711),
+                None: NOW + 42,
+                "transaction": NOW + 4711,
+                "security": NOW + 4711,
                 # Unknown data categories
-                "foobar": NOW + timedelta(seconds=4711),
+                "foobar": NOW + 4711,
             },
         ),
         (
             "4711:foobar;;transaction:organization",
             {
-                "transaction": NOW + timedelta(seconds=4711),
+                "transaction": NOW + 4711,
                 # Unknown data categories
-                "foobar": NOW + timedelta(seconds=4711),
-                "": NOW + timedelta(seconds=4711),
+                "foobar": NOW + 4711,
+                "": NOW + 4711,
             },
         ),
     ],
@@ -291,6 +356,30 @@ def test_parse_rate_limits(input, expected):
     assert dict(_parse_rate_limits(input, now=NOW)) == expected
 
 
+def test_rate_limits_expire(monkeypatch):
+    now = [NOW]
+    monkeypatch.setattr("sentry_sdk.transport.monotonic_now", lambda: now[0])
+    rate_limits = _RateLimits()
+
+    assert not rate_limits.is_limited("transaction")
+    assert not rate_limits.is_any_limited()
+
+    rate_limits.update(_parse_rate_limits("10:transaction:organization, 20::org"))
+    assert set(rate_limits) == set(["transaction", None])
+    assert rate_limits.is_limited("transaction")
+    assert rate_limits.is_limited("error")
+
+    now[0] += 15
+    assert rate_limits.is_limited("transaction")
+    # the expired transaction limit has been pruned
+    assert set(rate_limits) == set([None])
+
+    now[0] += 10
+    assert not rate_limits.is_limited("transaction")
+    assert not rate_limits.is_any_limited()
+    assert not set(rate_limits)
+
+
 def test_simple_rate_limits(capturing_server, make_client):
     client = make_client()
     capturing_server.respond_with(code=429, headers={"Retry-After": "4"})
@@ -382,7 +471,9 @@ def test_data_category_limits_reporting(
         client.transport, "_fetch_pending_client_report", intercepting_fetch
     )
     # get rid of threading making things hard to track
-    monkeypatch.setattr(client.transport._worker, "submit", lambda x: x() or True)
+    monkeypatch.setattr(
+        client.transport._worker, "submit", lambda x, **kwargs: x() or True
+    )
 
     client.capture_event({"type": "transaction"})
     client.flush()
@@ -466,3 +557,441 @@ def test_complex_limits_without_data_category(
     client.flush()
 
     assert len(capturing_server.captured) == 0
+
+
+def test_batching_coalesces_pending_envelopes(capturing_server, make_client):
+    client = make_client(_experiments={"transport_batching": True})
+
+    # hold back the jobs so that everything queues up like during a burst
+    jobs = []
+    client.transport._worker.submit = lambda job, **kwargs: jobs.append(job) or True
+
+    client.capture_event({"type": "transaction"})
+    client.capture_event({"type": "transaction"})
+    session_envelope = Envelope()
+    session_envelope.add_session({"sid": "1", "status": "ok", "init": True})
+    client.transport.capture_envelope(session_envelope)
+
+    assert len(jobs) == 3
+    for job in jobs:
+        job()
+
+    # the session is merged into the first transaction's envelope
+    assert len(capturing_server.captured) == 2
+    first, second = [captured.envelope for captured in capturing_server.captured]
+    assert [item.type for item in first.items] == ["transaction", "session"]
+    assert [item.type for item in second.items] == ["transaction"]
+    assert not client.transport._pending_envelopes
+
+
+def test_coalescing_does_not_change_the_pending_envelopes():
+    event_envelope = Envelope(headers={"event_id": "a"})
+    event_envelope.add_transaction({"type": "transaction"})
+    session_envelope = Envelope()
+    session_envelope.add_session({"sid": "1", "status": "ok"})
+
+    (coalesced,) = _coalesce_envelopes([event_envelope, session_envelope])
+    assert [item.type for item in coalesced.items] == ["transaction", "session"]
+    coalesced.headers["sent_at"] = "now"
+
+    # a retry or spool of the original envelope must not carry the session
+    assert [item.type for item in event_envelope.items] == ["transaction"]
+    assert event_envelope.headers == {"event_id": "a"}
+
+
+def test_batching_respects_item_budget(capturing_server, make_client):
+    client = make_client(
+        _experiments={"transport_batching": True, "transport_batch_max_items": 2}
+    )
+
+    jobs = []
+    client.transport._worker.submit = lambda job, **kwargs: jobs.append(job) or True
+
+    for _ in range(3):
+        envelope = Envelope()
+        envelope.add_session({"sid": "1", "status": "ok"})
+        client.transport.capture_envelope(envelope)
+
+    jobs[0]()
+    assert len(capturing_server.captured) == 1
+    assert len(capturing_server.captured[0].envelope.items) == 2
+
+    jobs[1]()
+    jobs[2]()
+    assert len(capturing_server.captured) == 2
+    assert len(capturing_server.captured[1].envelope.items) == 1
+
+
+def test_batching_records_queue_overflow(make_client, monkeypatch):
+    client = make_client(_experiments={"transport_batching": True})
+
+    captured_outcomes = []
+
+    def record_lost_event(reason, data_category=None, item=None):
+        captured_outcomes.append((reason, item.data_category))
+
+    monkeypatch.setattr(client.transport, "record_lost_event", record_lost_event)
+    monkeypatch.setattr(client.transport._worker, "submit", lambda job, **kwargs: False)
+
+    client.capture_event({"type": "transaction"})
+
+    assert captured_outcomes == [("queue_overflow", "transaction")]
+    assert not client.transport._pending_envelopes
+
+
+def test_split_envelope():
+    envelope = Envelope(headers={"event_id": "1", "trace": {"trace_id": "2"}})
+    envelope.add_event({"message": "hello"})
+    for payload in (b"a" * 100, b"b" * 500, b"c" * 100, b"d" * 100):
+        envelope.add_item(Item(payload, type="attachment"))
+    max_bytes = envelope.items[2].get_size() + 100
+
+    parts = _split_envelope(envelope, max_bytes)
+
+    # the oversized attachment goes out on its own
+    assert [[item.get_bytes()[:1] for item in part.items] for part in parts] == [
+        [b"{", b"a"],
+        [b"b"],
+        [b"c", b"d"],
+    ]
+    for part in parts:
+        assert part.headers == envelope.headers
+        assert part.headers is not envelope.headers
+        if len(part.items) > 1:
+            assert len(part.serialize()) <= max_bytes
+
+
+def test_splits_oversized_envelopes(capturing_server, make_client, monkeypatch):
+    client = make_client(
+        send_client_reports=True,
+        _experiments={"transport_max_envelope_bytes": 2000},
+    )
+    monkeypatch.setattr(
+        client.transport._worker, "submit", lambda x, **kwargs: x() or True
+    )
+    client.transport.record_lost_event("queue_overflow", data_category="error")
+    client.transport._last_client_report_sent = 0
+
+    scope = Scope()
+    scope.add_attachment(bytes=b"x" * 1500, filename="one.txt")
+    scope.add_attachment(bytes=b"y" * 1500, filename="two.txt")
+    client.capture_event({"message": "x" * 1000}, scope=scope)
+    client.flush()
+
+    # the client report is attached to the remainder
+    envelopes = [captured.envelope for captured in capturing_server.captured]
+    assert [[item.type for item in envelope.items] for envelope in envelopes] == [
+        ["event"],
+        ["attachment"],
+        ["attachment", "client_report"],
+    ]
+    event_id = envelopes[0].items[0].payload.json["event_id"]
+    assert all(envelope.headers["event_id"] == event_id for envelope in envelopes)
+
+
+@pytest.mark.tests_internal_exceptions
+def test_records_unsent_parts_of_split_envelopes(make_client, monkeypatch):
+    client = make_client(
+        send_client_reports=True,
+        _experiments={"transport_max_envelope_bytes": 2000},
+    )
+    monkeypatch.setattr(
+        client.transport._worker, "submit", lambda x, **kwargs: x() or True
+    )
+
+    def request(*args, **kwargs):
+        raise socket.error("connection refused")
+
+    monkeypatch.setattr(client.transport._pool, "request", request)
+
+    scope = Scope()
+    scope.add_attachment(bytes=b"x" * 1500, filename="one.txt")
+    scope.add_attachment(bytes=b"y" * 1500, filename="two.txt")
+    client.capture_event({"message": "x" * 1000}, scope=scope)
+
+    assert dict(client.transport._discarded_events) == {
+        ("error", "network_error"): 1,
+        ("attachment", "network_error"): 3000,
+    }
+
+
+def test_drops_attachments_over_size_limit(
+    capturing_server, make_client, monkeypatch, tmpdir
+):
+    client = make_client(
+        send_client_reports=True, _experiments={"max_attachment_bytes": 1000}
+    )
+    monkeypatch.setattr(
+        client.transport._worker, "submit", lambda x, **kwargs: x() or True
+    )
+    core = tmpdir.join("core")
+    core.write_binary(b"x" * 5000)
+
+    scope = Scope()
+    scope.add_attachment(bytes=b"small", filename="small.txt")
+    scope.add_attachment(path=str(core))
+    client.capture_event({"message": "hello"}, scope=scope)
+    client.transport._flush_client_reports(force=True)
+    client.flush()
+
+    event, report = [captured.envelope for captured in capturing_server.captured]
+    assert [item.type for item in event.items] == ["event", "attachment"]
+    assert event.items[1].headers["filename"] == "small.txt"
+    assert [item.type for item in report.items] == ["client_report"]
+    report = parse_json(report.items[0].get_bytes())
+    assert report["discarded_events"] == [
+        {"category": "attachment", "reason": "too_large", "quantity": 5000}
+    ]
+
+
+def test_spools_envelopes_until_upstream_recovers(
+    capturing_server, make_client, tmpdir
+):
+    client = make_client(_experiments={"transport_spool_dir": str(tmpdir)})
+    capturing_server.respond_with(code=503)
+
+    client.capture_event({"type": "transaction"})
+    client.flush()
+
+    assert len(capturing_server.captured) == 1
+    assert not client.transport._spool.is_empty()
+    capturing_server.clear_captured()
+
+    capturing_server.respond_with(code=200)
+    client.transport._spool_retry_at = 0
+    client.capture_event({"type": "transaction"})
+    client.flush()
+    client.flush()
+
+    # the new transaction plus the one replayed from the spool
+    assert len(capturing_server.captured) == 2
+    assert client.transport._spool.is_empty()
+
+
+def test_replays_spool_when_backoff_expires(
+    capturing_server, make_client, tmpdir, monkeypatch
+):
+    monkeypatch.setattr("sentry_sdk.transport.SPOOL_INITIAL_BACKOFF", 0.05)
+    client = make_client(_experiments={"transport_spool_dir": str(tmpdir)})
+    capturing_server.respond_with(code=503)
+    client.capture_event({"type": "transaction"})
+    client.flush()
+    capturing_server.clear_captured()
+
+    # nothing else is sent, the spool drains nonetheless
+    capturing_server.respond_with(code=200)
+    for _ in range(100):
+        if client.transport._spool.is_empty():
+            break
+        time.sleep(0.05)
+    client.flush()
+
+    assert len(capturing_server.captured) == 1
+    assert client.transport._spool.is_empty()
+
+
+def test_flush_replays_spool(capturing_server, make_client, tmpdir, monkeypatch):
+    monkeypatch.setattr("sentry_sdk.transport.SPOOL_INITIAL_BACKOFF", 60.0)
+    client = make_client(_experiments={"transport_spool_dir": str(tmpdir)})
+    capturing_server.respond_with(code=503)
+    client.capture_event({"type": "transaction"})
+    client.flush()
+    capturing_server.clear_captured()
+
+    capturing_server.respond_with(code=200)
+    client.transport._spool_retry_at = 0
+    client.flush()
+    client.flush()
+
+    assert len(capturing_server.captured) == 1
+    assert client.transport._spool.is_empty()
+
+
+def test_does_not_replay_spool_while_rate_limited(
+    capturing_server, make_client, tmpdir
+):
+    client = make_client(_experiments={"transport_spool_dir": str(tmpdir)})
+    capturing_server.respond_with(code=503)
+    client.capture_event({"type": "transaction"})
+    client.flush()
+    capturing_server.clear_captured()
+
+    capturing_server.respond_with(code=429, headers={"Retry-After": "60"})
+    client.transport._spool_retry_at = 0
+    client.transport.capture_envelope(Envelope(items=[Item(b"{}", type="session")]))
+    client.flush()
+
+    assert len(capturing_server.captured) == 1
+    assert not client.transport._spool.is_empty()
+
+    # a success response while still rate limited does not replay either
+    capturing_server.respond_with(code=200)
+    client.transport._on_upstream_success()
+    assert not client.transport._spool.is_empty()
+
+
+def test_spools_queue_overflow(make_client, tmpdir, monkeypatch):
+    client = make_client(_experiments={"transport_spool_dir": str(tmpdir)})
+    monkeypatch.setattr(client.transport._worker, "submit", lambda job, **kwargs: False)
+
+    client.capture_event({"type": "transaction"})
+
+    envelopes = client.transport._spool.pop()
+    assert [envelope.items[0].type for envelope in envelopes] == ["transaction"]
+
+
+@pytest.mark.parametrize(
+    "threshold,compressed",
+    [
+        (None, False),
+        (0, True),
+    ],
+)
+def test_compression_threshold(capturing_server, make_client, threshold, compressed):
+    _experiments = {}
+    if threshold is not None:
+        _experiments["transport_compression_threshold"] = threshold
+    client = make_client(_experiments=_experiments)
+
+    # a session envelope is far below the default threshold
+    envelope = Envelope()
+    envelope.add_session({"sid": "1", "status": "ok"})
+    client.transport.capture_envelope(envelope)
+    client.flush()
+
+    assert len(capturing_server.captured) == 1
+    assert capturing_server.captured[0].compressed == compressed
+
+
+def test_compression_algo(capturing_server, make_client):
+    client = make_client(
+        _experiments={
+            "transport_compression_algo": ["unknown", "deflate"],
+            "transport_compression_threshold": 0,
+        }
+    )
+
+    client.capture_event({"type": "transaction"})
+    client.flush()
+
+    assert len(capturing_server.captured) == 1
+    assert capturing_server.captured[0].compressed
+    assert capturing_server.captured[0].envelope.items[0].type == "transaction"
+
+
+def test_compression_levels_by_data_category(make_client):
+    client = make_client(
+        _experiments={"transport_compression_levels": {"profile": 1, "session": 0}}
+    )
+    transport = client.transport
+
+    assert transport._get_compression_level(100, "transaction") is None
+    assert transport._get_compression_level(10000, "transaction") == 9
+    assert transport._get_compression_level(10000, "profile") == 1
+    assert transport._get_compression_level(10000, "session") is None
+
+
+@pytest.mark.parametrize(
+    "load,level",
+    [(0.0, 9), (0.2, 9), (0.3, 4), (0.6, 1), (0.8, None), (1.0, None)],
+)
+def test_adaptive_compression(make_client, monkeypatch, load, level):
+    client = make_client(_experiments={"transport_adaptive_compression": True})
+    transport = client.transport
+    monkeypatch.setattr(transport._worker, "load", lambda: load)
+
+    assert transport._get_compression_level(10000, "error") == level
+    assert transport._compression_stats == {level: 1}
+
+
+def test_adaptive_compression_uses_queue_depth(make_client, monkeypatch):
+    client = make_client(
+        transport_queue_size=4, _experiments={"transport_adaptive_compression": True}
+    )
+    transport = client.transport
+    # keep everything in the queue
+    monkeypatch.setattr(transport._worker, "_ensure_thread", lambda: None)
+
+    assert transport._get_compression_level(10000, "error") == 9
+    for _ in range(3):
+        client.capture_event({"message": "hello"})
+    assert transport._worker.load() == 0.75
+    assert transport._get_compression_level(10000, "error") is None
+    assert transport._compression_stats == {9: 1, None: 1}
+
+
+def test_rate_limited_events_are_dropped_before_processing(
+    capturing_server, make_client, monkeypatch
+):
+    processed = []
+
+    def before_send(event, hint):
+        processed.append(event)
+        return event
+
+    client = make_client(before_send=before_send, before_send_transaction=before_send)
+
+    captured_outcomes = []
+
+    def record_lost_event(reason, data_category=None, item=None):
+        if data_category is None:
+            data_category = item.data_category
+        captured_outcomes.append((reason, data_category))
+
+    monkeypatch.setattr(client.transport, "record_lost_event", record_lost_event)
+
+    capturing_server.respond_with(
+        code=429, headers={"X-Sentry-Rate-Limits": "4711:transaction:organization"}
+    )
+    client.capture_event({"type": "transaction"})
+    client.flush()
+    assert len(processed) == 1
+    assert set(client.transport._disabled_until) == set(["transaction"])
+
+    # the event is dropped, but callers still get its id like before
+    event_id = client.capture_event({"type": "transaction", "event_id": "a" * 32})
+    assert event_id == "a" * 32
+    assert len(processed) == 1
+    assert captured_outcomes == [("ratelimit_backoff", "transaction")]
+
+    # not rate limited
+    assert client.capture_event({"message": "hello"}) is not None
+    assert len(processed) == 2
+    client.flush()
+
+
+def test_rate_limited_event_with_attachment_is_kept(
+    capturing_server, make_client, monkeypatch
+):
+    client = make_client()
+    client.transport._disabled_until.update([("error", float("inf"))])
+
+    captured_outcomes = []
+
+    def record_lost_event(reason, data_category=None, item=None):
+        if data_category is None:
+            data_category = item.data_category
+        captured_outcomes.append((reason, data_category))
+
+    monkeypatch.setattr(client.transport, "record_lost_event", record_lost_event)
+
+    hint = {"attachments": [Attachment(bytes=b"hello", filename="hello.txt")]}
+    assert client.capture_event({"message": "hello"}, hint=hint) is not None
+    client.flush()
+
+    # only the error is dropped by the transport, the attachment is sent
+    assert captured_outcomes == [("ratelimit_backoff", "error")]
+    assert len(capturing_server.captured) == 1
+    assert capturing_server.captured[0].envelope.items[0].type == "attachment"
+
+    client.transport._disabled_until.update([("attachment", float("inf"))])
+    capturing_server.clear_captured()
+    del captured_outcomes[:]
+
+    assert client.capture_event({"message": "hello"}, hint=hint) is not None
+    client.flush()
+    assert not capturing_server.captured
+    assert captured_outcomes == [
+        ("ratelimit_backoff", "error"),
+        ("ratelimit_backoff", "attachment"),
+    ]
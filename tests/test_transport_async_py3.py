@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+
+from sentry_sdk import Client
+
+from tests.test_transport import CapturingServer
+
+pytest.importorskip("httpcore")
+
+from sentry_sdk.async_transport import AsyncHttpTransport  # noqa: E402
+
+
+@pytest.fixture
+def capturing_server(request):
+    server = CapturingServer()
+    server.start()
+    request.addfinalizer(server.stop)
+    return server
+
+
+@pytest.fixture
+def make_client(request, capturing_server):
+    def inner(**kwargs):
+        return Client(
+            "http://foobar@{}/132".format(capturing_server.url[len("http://") :]),
+            transport=AsyncHttpTransport,
+            **kwargs
+        )
+
+    return inner
+
+
+@pytest.mark.asyncio
+async def test_sends_on_event_loop(capturing_server, make_client):
+    client = make_client()
+
+    client.capture_event({"type": "transaction"})
+    client.capture_event({"message": "hello"})
+    await client.flush_async(2.0)
+
+    assert not client.transport._worker.is_alive
+    assert sorted(captured.path for captured in capturing_server.captured) == [
+        "/api/132/envelope/",
+        "/api/132/store/",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_rate_limits(capturing_server, make_client, monkeypatch):
+    client = make_client(send_client_reports=False)
+
+    captured_outcomes = []
+
+    def record_lost_event(reason, data_category=None, item=None):
+        if data_category is None:
+            data_category = item.data_category
+        captured_outcomes.append((reason, data_category))
+
+    monkeypatch.setattr(client.transport, "record_lost_event", record_lost_event)
+
+    capturing_server.respond_with(
+        code=429, headers={"X-Sentry-Rate-Limits": "4711:transaction:organization"}
+    )
+
+    client.capture_event({"type": "transaction"})
+    await client.flush_async(2.0)
+
+    assert len(capturing_server.captured) == 1
+    assert set(client.transport._disabled_until) == set(["transaction"])
+    capturing_server.clear_captured()
+
+    client.capture_event({"type": "transaction"})
+    await client.flush_async(2.0)
+
+    assert not capturing_server.captured
+    assert captured_outcomes == [("ratelimit_backoff", "transaction")]
+
+
+@pytest.mark.asyncio
+async def test_queue_overflow(make_client, monkeypatch):
+    client = make_client(transport_queue_size=1)
+
+    captured_outcomes = []
+
+    def record_lost_event(reason, data_category=None, item=None):
+        captured_outcomes.append((reason, item.data_category))
+
+    monkeypatch.setattr(client.transport, "record_lost_event", record_lost_event)
+
+    client.capture_event({"type": "transaction"})
+    client.capture_event({"type": "transaction"})
+    await client.flush_async(2.0)
+
+    assert captured_outcomes == [("queue_overflow", "transaction")]
+
+
+def test_flush_from_other_thread(capturing_server, make_client):
+    client = make_client()
+
+    async def capture():
+        client.capture_event({"type": "transaction"})
+        loop = asyncio.get_running_loop()
+        # a blocking flush from a thread outside of the event loop
+        await loop.run_in_executor(None, client.flush)
+
+    asyncio.run(capture())
+
+    assert len(capturing_server.captured) == 1
+
+
+def test_falls_back_to_thread_without_event_loop(capturing_server, make_client):
+    client = make_client()
+
+    client.capture_event({"type": "transaction"})
+    client.flush()
+
+    assert client.transport._worker.is_alive
+    assert len(capturing_server.captured) == 1
+
+
+@pytest.mark.asyncio
+async def test_close_lets_pending_sends_finish(capturing_server, make_client):
+    client = make_client()
+    transport = client.transport
+
+    client.capture_event({"type": "transaction"})
+    client.capture_event({"type": "transaction"})
+    # close() cannot wait on the event loop it is called from
+    client.close()
+    assert transport._tasks
+
+    while transport._tasks:
+        await asyncio.sleep(0.01)
+
+    assert len(capturing_server.captured) == 2
+
+
+def test_flush_async_without_async_transport(capturing_server):
+    client = Client(
+        "http://foobar@{}/132".format(capturing_server.url[len("http://") :])
+    )
+
+    async def capture():
+        client.capture_event({"type": "transaction"})
+        await client.flush_async()
+
+    asyncio.run(capture())
+
+    assert len(capturing_server.captured) == 1
@@ -1,19 +1,24 @@
+import json
 import pytest
 import re
 import sys
 import threading
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 from sentry_sdk._compat import duration_in_milliseconds
 from sentry_sdk._queue import Queue
 from sentry_sdk.utils import (
+    JSON_BACKENDS,
     Components,
     Dsn,
+    JsonBackend,
     get_current_thread_meta,
     get_default_release,
     get_error_message,
     get_git_revision,
     is_valid_sample_rate,
+    json_dumps,
+    json_loads,
     logger,
     match_regex_list,
     parse_url,
@@ -21,6 +26,7 @@ from sentry_sdk.utils import (
     safe_str,
     sanitize_url,
     serialize_frame,
+    set_json_backend,
     is_sentry_url,
     _get_installed_modules,
 )
@@ -405,6 +411,18 @@ def test_include_source_context_when_serializing_frame(include_source_context):
     assert include_source_context ^ ("post_context" in result) ^ True
 
 
+def test_serialize_frame_captures_first_local_variables():
+    def inner():
+        a, b, c, d = 1, 2, 3, 4  # noqa
+        return serialize_frame(sys._getframe())
+
+    with mock.patch("sentry_sdk.serializer.MAX_DATABAG_BREADTH", 2):
+        result = inner()
+
+    assert result["vars"] == {"a": 1, "b": 2}
+    assert result["vars"].original_length == 4
+
+
 @pytest.mark.parametrize(
     "item,regex_list,expected_result",
     [
@@ -750,3 +768,104 @@ def test_get_current_thread_meta_failed_to_get_main_thread():
     thread.start()
     thread.join()
     assert (main_thread.ident, main_thread.name) == results.get(timeout=1)
+
+
+@pytest.fixture(params=sorted(JSON_BACKENDS))
+def json_backend(request):
+    if request.param != "json":
+        pytest.importorskip(request.param)
+
+    backend = set_json_backend(request.param)
+    assert backend.name == request.param
+    yield backend
+    set_json_backend(None)
+
+
+JSON_COMPATIBILITY_DATA = [
+    None,
+    {},
+    [],
+    {"message": "hello", "level": "error", "extra": {"foo": [1, 2.5, True, None]}},
+    {"sent_at": "2024-01-01T00:00:00.000000Z", "event_id": "a" * 32},
+    {"big": 2**70, "negative": -(2**63), "small": 1e-07, "float": 0.1},
+    {"text": "\u00fc\u00f1\u00ee\u00e7\u00f8d\u00e9 \u2603 \U0001f600"},
+    {"escapes": '"quoted" back\\slash / \n\t\x00 \u2028\u2029'},
+    {"\u00fcnicode key": ["\u00e9"]},
+]
+
+
+@pytest.mark.parametrize("data", JSON_COMPATIBILITY_DATA)
+def test_json_backends_match_stdlib(json_backend, data):
+    stdlib = JsonBackend()
+
+    encoded = json_dumps(data)
+    assert json.loads(encoded.decode("utf-8")) == json.loads(stdlib.dumps(data))
+    assert json_loads(stdlib.dumps(data)) == data
+    assert json_loads(stdlib.dumps(data).decode("utf-8")) == data
+
+
+def test_json_backends_reject_datetimes(json_backend):
+    data = {"timestamp": datetime(2024, 1, 1)}
+
+    if json_backend.name == "msgspec":
+        assert json_loads(json_dumps(data)) == {"timestamp": "2024-01-01T00:00:00"}
+    else:
+        with pytest.raises(TypeError):
+            json_dumps(data)
+
+
+@pytest.mark.parametrize("value", [float("nan"), float("inf"), float("-inf")])
+def test_json_backends_nan_handling(json_backend, value):
+    if json_backend.name in ("orjson", "msgspec"):
+        assert json_dumps({"value": value}) == b'{"value":null}'
+    else:
+        with pytest.raises(ValueError):
+            json_dumps({"value": value})
+
+
+def test_json_backends_decode_like_stdlib(json_backend):
+    # invalid UTF-8 and the non-standard NaN literal
+    assert json_loads(b'{"a":"\xff"}') == {"a": "\ufffd"}
+    assert json_loads(b'{"a":NaN}')["a"] != json_loads(b'{"a":NaN}')["a"]
+
+    with pytest.raises(ValueError):
+        json_loads(b"{")
+
+
+def test_set_json_backend_falls_back_to_stdlib():
+    try:
+        assert set_json_backend("unknown").name == "json"
+        assert set_json_backend(None).name == "json"
+
+        with mock.patch.dict(sys.modules, {"orjson": None}):
+            assert set_json_backend("orjson").name == "json"
+
+        assert set_json_backend("auto").name in JSON_BACKENDS
+    finally:
+        set_json_backend(None)
+
+
+def test_set_json_backend_skips_old_ujson():
+    def dumps(obj, ensure_ascii=True, escape_forward_slashes=True):
+        return json.dumps(obj)
+
+    old_ujson = mock.Mock(dumps=dumps)
+
+    try:
+        with mock.patch.dict(sys.modules, {"ujson": old_ujson}):
+            assert set_json_backend("ujson").name == "json"
+    finally:
+        set_json_backend(None)
+
+
+def test_json_backend_option(sentry_init):
+    pytest.importorskip("orjson")
+
+    try:
+        sentry_init(_experiments={"json_backend": "orjson"})
+        assert json_dumps({"a": "\u00e9"}) == '{"a":"\u00e9"}'.encode("utf-8")
+
+        sentry_init()
+        assert json_dumps({"a": "\u00e9"}) == b'{"a":"\\u00e9"}'
+    finally:
+        set_json_backend(None)
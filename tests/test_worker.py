@@ -0,0 +1,136 @@
+import random
+import threading
+import time
+
+from sentry_sdk.worker import BackgroundWorker
+
+
+def test_jobs_run_on_multiple_threads():
+    worker = BackgroundWorker(num_threads=3)
+    started = []
+    release = threading.Event()
+
+    def job():
+        started.append(threading.current_thread().ident)
+        release.wait(5)
+
+    for _ in range(3):
+        assert worker.submit(job)
+
+    deadline = time.time() + 5
+    while len(started) < 3 and time.time() < deadline:
+        time.sleep(0.01)
+
+    # all jobs are in flight at the same time
+    assert len(set(started)) == 3
+    release.set()
+    worker.flush(5)
+    worker.kill()
+
+
+def test_ordering_key_keeps_submission_order():
+    worker = BackgroundWorker(num_threads=4)
+    results = []
+    running = []
+
+    def make_job(i):
+        def job():
+            running.append(i)
+            assert len(running) == 1
+            time.sleep(random.random() / 1000)
+            results.append(i)
+            running.remove(i)
+
+        return job
+
+    for i in range(30):
+        assert worker.submit(make_job(i), ordering_key="session")
+
+    worker.flush(5)
+    assert results == list(range(30))
+    worker.kill()
+
+
+def test_flush_and_kill_cover_all_threads():
+    worker = BackgroundWorker(num_threads=2)
+    results = []
+
+    for i in range(10):
+        worker.submit(lambda i=i: results.append(i))
+
+    worker.flush(5)
+    assert sorted(results) == list(range(10))
+    assert len(worker._threads) == 2
+
+    threads = list(worker._threads)
+    worker.kill()
+    for thread in threads:
+        thread.join(5)
+        assert not thread.is_alive()
+    assert not worker.is_alive
+
+
+def test_ordered_job_is_discarded_when_queue_is_full():
+    worker = BackgroundWorker(queue_size=1)
+    release = threading.Event()
+    worker.submit(lambda: release.wait(5))
+    # wait for the worker to pick up the blocking job
+    deadline = time.time() + 5
+    while worker._queue.qsize() and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert worker.submit(lambda: None, ordering_key="session")
+    assert not worker.submit(lambda: None, ordering_key="session")
+    assert len(worker._ordered_jobs["session"][1]) == 1
+
+    release.set()
+    worker.flush(5)
+    assert not worker._ordered_jobs["session"][1]
+    worker.kill()
+
+
+def test_lower_priority_jobs_are_shed_first():
+    worker = BackgroundWorker(queue_size=3, lane_sizes=(3, 3, 3))
+    # keep the jobs in the queue
+    worker._ensure_thread = lambda: None
+
+    dropped = []
+    for i in range(3):
+        assert worker.submit(
+            lambda: None, priority=i, on_drop=lambda i=i: dropped.append(i)
+        )
+
+    assert worker.submit(lambda: None, priority=0)
+    assert dropped == [2]
+    # nothing of lower priority left to shed
+    assert not worker.submit(lambda: None, priority=1)
+    assert not worker.submit(lambda: None, priority=2)
+    assert worker.submit(lambda: None, priority=0)
+    assert dropped == [2, 1]
+    assert not worker.submit(lambda: None, priority=0)
+    assert worker._queue.qsize() == 3
+    assert worker._queue.unfinished_tasks == 3
+
+
+def test_lane_capacity():
+    worker = BackgroundWorker(queue_size=10, lane_sizes=(10, 1))
+    worker._ensure_thread = lambda: None
+
+    assert worker.submit(lambda: None, priority=1)
+    assert not worker.submit(lambda: None, priority=1)
+    assert worker.submit(lambda: None, priority=0)
+
+
+def test_jobs_run_by_priority():
+    worker = BackgroundWorker(lane_sizes=(10, 10, 10))
+    results = []
+    release = threading.Event()
+
+    worker.submit(lambda: release.wait(5))
+    for i in (2, 1, 0, 2, 0):
+        worker.submit(lambda i=i: results.append(i), priority=i)
+    release.set()
+
+    worker.flush(5)
+    assert results == [0, 0, 1, 2, 2]
+    worker.kill()
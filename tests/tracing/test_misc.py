@@ -7,7 +7,7 @@ import sentry_sdk
 from sentry_sdk import Hub, start_span, start_transaction, set_measurement, push_scope
 from sentry_sdk.consts import MATCH_ALL
 from sentry_sdk.tracing import Span, Transaction
-from sentry_sdk.tracing_utils import should_propagate_trace
+from sentry_sdk.tracing_utils import record_sql_queries, should_propagate_trace
 from sentry_sdk.utils import Dsn
 
 try:
@@ -186,6 +186,20 @@ def test_circular_references(monkeypatch, sentry_init, request):
             return_value=None,
         ),
     )
+    monkeypatch.setattr(
+        sentry_sdk.client,
+        "serialize_to_json",
+        mock.Mock(
+            return_value=b"{}",
+        ),
+    )
+    monkeypatch.setattr(
+        sentry_sdk.client,
+        "encode_static_fragments",
+        mock.Mock(
+            return_value={},
+        ),
+    )
 
     # In certain versions of python, in some environments (specifically, python
     # 3.4 when run in GH Actions), we run into a `ctypes` bug which creates
@@ -366,3 +380,33 @@ def test_start_transaction_updates_scope_name_source(sentry_init):
         with start_transaction(name="foobar", source="route"):
             assert scope._transaction == "foobar"
             assert scope._transaction_info == {"source": "route"}
+
+
+class ClosingCursor(object):
+    class connection(object):
+        encoding = "utf-8"
+
+    closed = False
+
+    def mogrify(self, sql):
+        if self.closed:
+            raise ValueError("cursor already closed")
+        return ("%s -- formatted" % sql).encode("utf-8")
+
+
+def test_sql_breadcrumbs_are_formatted_while_the_cursor_is_open(
+    sentry_init, capture_events
+):
+    sentry_init()
+    events = capture_events()
+
+    cursor = ClosingCursor()
+    with record_sql_queries(Hub.current, cursor, "SELECT 1", None, None, False):
+        pass
+    cursor.closed = True
+
+    sentry_sdk.capture_message("hi")
+
+    (event,) = events
+    (crumb,) = event["breadcrumbs"]["values"]
+    assert crumb["message"] == "SELECT 1 -- formatted"